@@ -1,191 +1,74 @@
-import base64
 import hashlib
 import hmac
 import os
 import re
-import secrets
-import sqlite3
-import string
 import time
-from contextlib import contextmanager
 from datetime import datetime
-
-import bleach
-import markdown
-from cachetools import TTLCache
-from cryptography.fernet import Fernet
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
-from flask import Flask, abort, flash, g, jsonify, make_response, redirect, render_template, request, session, url_for
+from pathlib import Path
+
+from flask import (
+    Flask,
+    Response,
+    abort,
+    flash,
+    g,
+    jsonify,
+    make_response,
+    redirect,
+    render_template,
+    request,
+    session,
+    url_for,
+)
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from markupsafe import Markup, escape
 from werkzeug.middleware.proxy_fix import ProxyFix
 
+from backup import BackupScheduler, list_snapshots
+from config import Config
+from db import Database
+from delta import PatchError, PatchMismatch, apply_patch, utf16_length
+from encryption import DECRYPT_FAILED, decrypt_content, encrypt_content, key_manager
+from events import DELETED, UPDATED, EventHub, format_sse, make_event
+from export import EXPORT_FORMATS, MAX_ARCHIVE_NOTES, iter_export, iter_zip
+from keypool import KeyAllocator
+from metrics import ENDPOINT_ENVIRON, MetricsMiddleware, create_store, format_metrics, registry
+from migrations import apply_migrations
+from notes import is_blank, load_note_content
+from passwords import PasswordBusy, password_hasher
+from profiling import RequestProfiler
+from rendering import render_cache, render_markdown_blocks, render_markdown_safe, renderer_pool
+from revisions import revision_store
+from search import search_index
+from sessions import SQLiteSessionInterface
+from shared_state import LoginAttempts, Sweeper
+
 app = Flask(__name__)
 
 # 配置 ProxyFix 中间件，正确处理反向代理的 HTTPS 信息
 app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+# 按端点统计请求数与耗时；启用 /metrics 时各进程定期把统计写入 METRICS_DIR
+metrics_store = create_store(Config)
+app.wsgi_app = MetricsMiddleware(app.wsgi_app, metrics_store)
+registry.register_collector(
+    lambda: [
+        ("yonote_render_cache_hits_total", {}, render_cache.hits),
+        ("yonote_render_cache_misses_total", {}, render_cache.misses),
+        ("yonote_keys_allocated_total", {}, key_allocator.allocated),
+        ("yonote_key_collisions_total", {}, key_allocator.collisions),
+    ]
+)
 
 # 配置 URL scheme 为 https（生产环境）
 app.config["PREFERRED_URL_SCHEME"] = os.environ.get("PREFERRED_URL_SCHEME", "https")
 app.secret_key = os.environ.get("SECRET_KEY", "dev_key_please_change")
+app.permanent_session_lifetime = Config.PERMANENT_SESSION_LIFETIME
 DB_PATH = "data/notes.db"
 
-# 添加访问速率限制
-limiter = Limiter(
-    key_func=get_remote_address,  # 使用 key_func 而不是直接传递函数
-    app=app,
-    default_limits=["2000000 per day", "50000 per hour"],
-    storage_uri="memory://",
-)
 # 密码错误相关常量
 MAX_PASSWORD_ATTEMPTS = 5  # 最大密码尝试次数
 PASSWORD_LOCKOUT_TIME = 30 * 60  # 锁定时间（秒）
-# 密码错误计数器 - 使用 TTL 缓存自动清理过期条目，防止内存泄漏
-password_attempts = TTLCache(maxsize=10000, ttl=PASSWORD_LOCKOUT_TIME)
-
-# 加密相关
-ENCRYPTION_KEY = os.environ.get("ENCRYPTION_KEY", "this_is_a_secret_key_please_change_in_production")
-SALT = os.environ.get("ENCRYPTION_SALT", "static_salt_change_this").encode()
-
-# Markdown HTML 清理配置 - 防止 XSS 攻击
-ALLOWED_TAGS = [
-    "p",
-    "br",
-    "hr",
-    "h1",
-    "h2",
-    "h3",
-    "h4",
-    "h5",
-    "h6",
-    "ul",
-    "ol",
-    "li",
-    "code",
-    "pre",
-    "blockquote",
-    "table",
-    "thead",
-    "tbody",
-    "tr",
-    "th",
-    "td",
-    "a",
-    "strong",
-    "em",
-    "b",
-    "i",
-    "u",
-    "s",
-    "del",
-    "ins",
-    "img",
-    "figure",
-    "figcaption",
-    "div",
-    "span",
-    "sup",
-    "sub",
-    "dl",
-    "dt",
-    "dd",
-    "abbr",
-    "cite",
-    "mark",
-    "small",
-    # pymdown-extensions 新增标签
-    "input",  # 任务列表 checkbox
-    "label",  # 任务列表 label
-    "section",  # 脚注容器
-]
-ALLOWED_ATTRS = {
-    "a": ["href", "title", "target", "rel"],
-    "img": ["src", "alt", "title", "width", "height"],
-    "abbr": ["title"],
-    "td": ["colspan", "rowspan"],
-    "th": ["colspan", "rowspan", "scope"],
-    "code": ["class"],  # 用于代码高亮
-    "pre": ["class"],
-    "div": ["class", "id"],  # 脚注需要 id
-    "span": ["class", "id"],
-    # pymdown-extensions 新增属性
-    "input": ["type", "checked", "disabled"],  # 任务列表
-    "li": ["class"],  # 任务列表项
-    "section": ["class"],  # 脚注容器
-    "sup": ["id", "class"],  # 脚注引用
-}
-
-
-def get_encryption_key():
-    """从环境变量生成加密密钥"""
-    kdf = PBKDF2HMAC(
-        algorithm=hashes.SHA256(),
-        length=32,
-        salt=SALT,
-        iterations=100000,
-    )
-    key = base64.urlsafe_b64encode(kdf.derive(ENCRYPTION_KEY.encode()))
-    return key
-
-
-def encrypt_content(content):
-    """加密笔记内容"""
-    if not content:
-        return ""
-
-    f = Fernet(get_encryption_key())
-    encrypted = f.encrypt(content.encode())
-    return encrypted.decode()
-
-
-def decrypt_content(encrypted_content):
-    """解密笔记内容"""
-    if not encrypted_content:
-        return ""
-
-    try:
-        f = Fernet(get_encryption_key())
-        decrypted = f.decrypt(encrypted_content.encode())
-        return decrypted.decode()
-    except Exception as e:
-        print(f"解密错误: {e}")
-        return "[解密失败]"
-
-
-def sanitize_html(html):
-    """清理 HTML 内容，移除危险标签和属性，防止 XSS 攻击"""
-    return bleach.clean(html, tags=ALLOWED_TAGS, attributes=ALLOWED_ATTRS, strip=True)
-
-
-def render_markdown_safe(content):
-    """安全地渲染 Markdown 为 HTML"""
-    if not content:
-        return ""
-    # 配置 Markdown 扩展
-    extensions = [
-        "markdown.extensions.extra",
-        "markdown.extensions.codehilite",
-        "markdown.extensions.nl2br",
-        "markdown.extensions.sane_lists",
-        "markdown.extensions.tables",
-        "markdown.extensions.toc",
-        "markdown.extensions.footnotes",  # 脚注
-        "pymdownx.tasklist",  # 任务列表
-        "pymdownx.caret",  # 上标 ^text^
-        "pymdownx.tilde",  # 下标 ~text~, 删除线
-        "pymdownx.mark",  # 高亮 ==text==
-        "pymdownx.superfences",  # 增强代码块
-    ]
-    extension_configs = {
-        "pymdownx.tasklist": {
-            "custom_checkbox": False,
-            "clickable_checkbox": False,
-        },
-    }
-    html = markdown.markdown(content, extensions=extensions, extension_configs=extension_configs, output_format="html")
-    return sanitize_html(html)
 
 
 # 添加nl2br过滤器
@@ -230,76 +113,137 @@ def time_ago_filter(timestamp):
         return "未知时间"
 
 
-@contextmanager
+# 模板内容的摘要，计入页面 ETag，部署新模板后旧缓存自动失效
+TEMPLATES_VERSION = hashlib.sha256(
+    b"".join(path.read_bytes() for path in sorted(Path(app.root_path, app.template_folder).glob("*.html")))
+).hexdigest()[:12]
+
+# 进程内 SQLite 连接池，PRAGMA 与锁冲突重试策略见 config.Config；
+# 数据库迁移在第一次借出连接时执行，导入本模块不访问数据库
+db = Database(DB_PATH, Config, setup=apply_migrations)
+# 笔记 key 分配器
+key_allocator = KeyAllocator(db)
+# 服务端会话：cookie 只保存会话 ID，过期时间在 SESSION_REFRESH_INTERVAL 后才顺延
+SERVER_SESSIONS = Config.SESSION_BACKEND == "sqlite"
+if SERVER_SESSIONS:
+    app.session_interface = SQLiteSessionInterface(db)
+
+
 def get_db_connection():
-    """数据库连接 context manager，确保连接被正确关闭"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    try:
-        yield conn
-    finally:
-        conn.close()
+    """从连接池借出数据库连接（context manager），退出时自动归还"""
+    return db.connection()
 
 
-def init_db():
-    with get_db_connection() as conn:
-        conn.execute("""
-        CREATE TABLE IF NOT EXISTS notes (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            key TEXT UNIQUE NOT NULL,
-            content TEXT NOT NULL,
-            password TEXT,
-            public BOOLEAN DEFAULT 0,
-            created_at INTEGER NOT NULL,
-            updated_at INTEGER NOT NULL,
-            encrypted BOOLEAN DEFAULT 1
-        )
-        """)
-        # 添加锁定表
-        conn.execute("""
-        CREATE TABLE IF NOT EXISTS lockouts (
-            key TEXT PRIMARY KEY,
-            ip_address TEXT NOT NULL,
-            locked_until INTEGER NOT NULL
-        )
-        """)
-        conn.commit()
+def write_note_content(conn, sql, params, note, content, previous=None, coalesce=True):
+    """执行写入笔记正文的语句，在同一事务中记录修订、增量更新关键词索引（分别开启时）
 
+    note 为写入前读取的笔记行；previous 为已解密的旧正文（没有时由修订记录自行解密）。
+    """
+    key = note["key"]
+    # 分词、摘要与补丁在获取写锁之前计算
+    digests = search_index.digests(content) if search_index.enabled else None
+    pending = revision_store.prepare(note, content, previous) if revision_store.enabled else None
 
-with app.app_context():
-    init_db()
+    def write(c):
+        cursor = c.execute(sql, params)
+        if cursor.rowcount:
+            if digests is not None:
+                search_index.update(c, key, digests)
+            if pending is not None:
+                revision_store.record(c, pending, coalesce)
+        return cursor
 
+    return db.run_write(conn, write)
 
-def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
 
+def init_db():
+    """立即执行数据库迁移（否则在第一次借出连接时执行）"""
+    with get_db_connection():
+        pass
 
-def generate_word_key(min_length=3, max_length=7):
-    """生成一个3-7字符的英文单词作为key"""
-    chars = string.ascii_lowercase
-    while True:
-        length = secrets.randbelow(max_length - min_length + 1) + min_length
-        key = "".join(secrets.choice(chars) for _ in range(length))
 
-        # 检查是否已存在
-        with get_db_connection() as conn:
-            existing = conn.execute("SELECT key FROM notes WHERE key = ?", (key,)).fetchone()
+def warm_up():
+    """预热：执行迁移、派生加密密钥、导入并初始化 Markdown 渲染器
+
+    pre-fork 服务器在 fork worker 之前调用（见 gunicorn.conf.py），加载的模块和
+    对象由各 worker 以写时复制方式共享，worker 处理第一个请求时不再有冷启动开销。
+    """
+    init_db()
+    key_manager.warm_up()
+    renderer_pool.warm_up()
+    # fork 之后不能继续使用父进程的连接，关闭后由各 worker 自行创建
+    db.close_all()
+    # 预热产生的计时不属于任何 worker，避免被每个 worker 重复上报
+    registry.clear()
+
 
-        if not existing:
-            return key
+# 添加访问速率限制，计数保存在所有 worker 共用的存储中（默认即笔记数据库），
+# 每个进程每 RATELIMIT_FLUSH_INTERVAL 秒把两条限制的计数合并写入一次
+limiter = Limiter(
+    key_func=get_remote_address,  # 使用 key_func 而不是直接传递函数
+    app=app,
+    default_limits=["2000000 per day", "50000 per hour"],
+    storage_uri=Config.RATELIMIT_STORAGE_URI,
+    storage_options={"database": db} if Config.RATELIMIT_STORAGE_URI == "sqlite://" else {},
+)
+# 密码错误次数与锁定，跨进程共享，最后一次错误后 PASSWORD_LOCKOUT_TIME 秒过期
+login_attempts = LoginAttempts(db, MAX_PASSWORD_ATTEMPTS, PASSWORD_LOCKOUT_TIME)
+# 定期清理过期的速率限制计数、密码错误记录与会话
+state_sweeper = Sweeper(db)
+# 定时在线备份（BACKUP_INTERVAL 为 0 时不启动），多个 worker 中每个间隔只有一个执行
+backup_scheduler = BackupScheduler(DB_PATH)
+# 笔记变更通知
+note_events = EventHub(db)
+# asgi.py 转发变更通知请求时设置的 environ 标记，客户端无法通过请求头伪造
+ASYNC_EVENTS_ENVIRON = "yonote.async_events"
+# 请求性能剖析（默认关闭），剖析文件中的笔记 key 以 SECRET_KEY 做 HMAC
+request_profiler = RequestProfiler(app.secret_key)
+# 长轮询在视图中等待，耗时不代表性能问题，不做剖析
+PROFILE_EXCLUDED_ENDPOINTS = {"note_event_stream"}
+
+
+def check_note_password(note, password):
+    """验证笔记密码；旧格式或成本参数已变化的哈希在验证成功后重新计算并保存"""
+    stored = note["password"]
+    if not password_hasher.verify(password, stored):
+        return False
+    if password_hasher.needs_rehash(stored):
+        try:
+            upgraded = password_hasher.hash(password)
+        except PasswordBusy:
+            # 繁忙时不影响本次验证，下次验证成功时再升级
+            return True
+        with get_db_connection() as conn:
+            # 期间密码被修改时不覆盖
+            db.execute_write(
+                conn, "UPDATE notes SET password = ? WHERE key = ? AND password = ?", (upgraded, note["key"], stored)
+            )
+    return True
 
 
 # 会话管理函数
+# authenticated_keys: {笔记 key: 最近使用时间}，旧会话中的值为 True
 def is_authenticated(key):
     """检查用户是否已经通过了特定笔记的密码验证"""
     auth_keys = session.get("authenticated_keys", {})
-    return auth_keys.get(key, False)
+    last_used = auth_keys.get(key)
+    if last_used is None:
+        return False
+    # 记录最近使用时间供 LRU 淘汰；按间隔更新，避免每次访问都改写会话
+    now = int(time.time())
+    if now - last_used >= Config.SESSION_KEY_TOUCH_INTERVAL:
+        auth_keys[key] = now
+        session["authenticated_keys"] = auth_keys
+    return True
 
 
 def set_authenticated(key):
-    """设置用户已通过特定笔记的密码验证"""
+    """设置用户已通过特定笔记的密码验证，超过 SESSION_MAX_KEYS 时移除最久未使用的笔记"""
     auth_keys = session.get("authenticated_keys", {})
-    auth_keys[key] = True
+    auth_keys[key] = int(time.time())
+    if len(auth_keys) > Config.SESSION_MAX_KEYS:
+        for old_key in sorted(auth_keys, key=auth_keys.get)[: len(auth_keys) - Config.SESSION_MAX_KEYS]:
+            del auth_keys[old_key]
     session["authenticated_keys"] = auth_keys
 
 
@@ -311,27 +255,85 @@ def remove_authentication(key):
         session["authenticated_keys"] = auth_keys
 
 
+def record_password_failure(conn, key, ip_address):
+    """记录一次密码错误并提示剩余次数或锁定时间"""
+    failures, locked_until = login_attempts.record_failure(conn, key, ip_address)
+    if locked_until:
+        remaining = int(locked_until - time.time())
+        flash(f"由于多次密码错误，请等待{remaining}秒后再试")
+    else:
+        remaining = MAX_PASSWORD_ATTEMPTS - failures
+        flash(f"密码错误，还有{remaining}次尝试机会")
+
+
 @app.before_request
 def before_request():
-    init_db()
-    # 设置 session 为 permanent,使其使用配置的过期时间（7天滑动过期）
-    session.permanent = True
-    # 每次请求刷新过期时间，实现滑动过期策略
-    session.modified = True
+    if request_profiler.enabled and request.endpoint not in PROFILE_EXCLUDED_ENDPOINTS:
+        g.profile_capture = request_profiler.start()
+    if not SERVER_SESSIONS:
+        # 设置 session 为 permanent,使其使用配置的过期时间（7天滑动过期）
+        session.permanent = True
+        # 每次请求刷新过期时间，实现滑动过期策略
+        session.modified = True
+    # 启动本进程的过期状态清理与定时备份线程（已启动或未开启时直接返回）
+    state_sweeper.start()
+    backup_scheduler.start()
+
+
+@app.teardown_request
+def finish_profile(exc):
+    # 在 teardown 中结束，视图或 after_request 抛出异常时同样会停止剖析
+    capture = g.pop("profile_capture", None)
+    if capture is not None:
+        request_profiler.finish(capture, request.endpoint, (request.view_args or {}).get("key"))
+
+
+@app.teardown_request
+def record_endpoint(exc):
+    # 供 MetricsMiddleware 按端点统计，未匹配路由的请求为 None
+    request.environ[ENDPOINT_ENVIRON] = request.endpoint
+
+
+@app.errorhandler(PasswordBusy)
+def password_busy(exc):
+    # 密码计算排队已满，让客户端稍后重试而不是占住请求线程等待
+    message = "服务器繁忙，请稍后再试"
+    if request.is_json:
+        response = jsonify({"success": False, "message": message})
+    else:
+        response = make_response(message)
+    response.status_code = 429
+    response.headers["Retry-After"] = "1"
+    return response
+
+
+def note_etag(note, *variant):
+    """由笔记元数据和影响响应内容的请求状态生成强 ETag，不需要读取或解密内容"""
+    parts = (note["key"], note["updated_at"], note["version"], bool(note["password"]), note["public"], *variant)
+    return hashlib.sha256("\0".join(map(str, parts)).encode()).hexdigest()[:32]
+
+
+def with_cache_headers(response, etag, protected):
+    """设置 ETag 与缓存策略：每次使用前都要重新验证，有密码的笔记只允许浏览器缓存"""
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache" if protected else "no-cache"
+    # 响应内容依赖会话中的认证状态
+    response.vary.add("Cookie")
+    return response
+
+
+def not_modified(etag, protected):
+    """If-None-Match 命中时返回 304 响应，否则返回 None"""
+    if request.if_none_match.contains_weak(etag):
+        return with_cache_headers(Response(status=304), etag, protected)
+    return None
 
 
 @app.route("/")
 def index():
-    # 自动创建新笔记并重定向
-    key = generate_word_key()
-    current_time = int(time.time())
-
+    # 自动创建新笔记并重定向，key 的占用与插入在同一条 INSERT 中完成
     with get_db_connection() as conn:
-        conn.execute(
-            "INSERT INTO notes (key, content, public, created_at, updated_at, encrypted) VALUES (?, ?, ?, ?, ?, ?)",
-            (key, "", 0, current_time, current_time, 1),
-        )
-        conn.commit()
+        key = key_allocator.create_note(conn, int(time.time()))
 
     # 直接设置为已认证状态，避免可能的密码提示
     set_authenticated(key)
@@ -359,42 +361,44 @@ def view_note(key):
         # 如果笔记不存在，使用用户输入的key创建新笔记
         if not g.note:
             current_time = int(time.time())
-            conn.execute(
-                "INSERT INTO notes (key, content, public, created_at, updated_at, encrypted) VALUES (?, ?, ?, ?, ?, ?)",
-                (key, "", 0, current_time, current_time, 1),
+            db.execute_write(
+                conn,
+                "INSERT INTO notes (key, content, public, created_at, updated_at, encrypted, is_empty) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, "", 0, current_time, current_time, 1, 1),
             )
-            conn.commit()
             g.note = conn.execute("SELECT * FROM notes WHERE key = ?", (key,)).fetchone()
             # 为新创建的笔记设置认证状态
             set_authenticated(key)
 
-    # 解密笔记内容
-    decrypted_content = ""
-    if g.note["encrypted"]:
-        decrypted_content = decrypt_content(g.note["content"])
-    else:
-        decrypted_content = g.note["content"]
-
-    # 创建一个新的字典，包含解密后的内容
-    note_dict = dict(g.note)
-    note_dict["content"] = decrypted_content
-
     # 检查认证状态
     authenticated = is_authenticated(key)
+    protected = bool(g.note["password"])
+
+    # 内容未变化时在解密和渲染之前直接返回 304；有待显示的 flash 消息时必须重新渲染。
+    # 页面显示的相对更新时间随时间变化，一并计入 ETag
+    time_ago = time_ago_filter(g.note["updated_at"])
+    etag = note_etag(g.note, "view", TEMPLATES_VERSION, g.view_only, authenticated, time_ago)
+    if "_flashes" not in session:
+        cached = not_modified(etag, protected)
+        if cached:
+            return cached
 
     # 如果有密码保护且未认证，显示密码输入界面（除非是公开笔记且请求只读模式）
-    if note_dict["password"] and not authenticated:
-        if note_dict["public"] and g.view_only:
-            return render_template("view.html", note=note_dict, view_only=True, authenticated=False)
-        else:
-            return render_template("password.html", key=key, next_url=f"/{key}", is_public=note_dict["public"])
+    if protected and not authenticated and not (g.note["public"] and g.view_only):
+        page = render_template("password.html", key=key, next_url=f"/{key}", is_public=g.note["public"])
+        return with_cache_headers(make_response(page), etag, protected)
 
-    # 如果明确请求查看模式，则以只读方式显示
-    if g.view_only:
-        return render_template("view.html", note=note_dict, view_only=True, authenticated=authenticated)
+    # 创建一个新的字典，包含解密后的内容
+    note_dict = dict(g.note)
+    note_dict["content"] = load_note_content(g.note)
 
-    # 默认进入编辑模式
-    return render_template("view.html", note=note_dict, view_only=False, authenticated=True)
+    if g.view_only:
+        # 明确请求查看模式时以只读方式显示
+        page = render_template("view.html", note=note_dict, view_only=True, authenticated=authenticated)
+    else:
+        # 默认进入编辑模式
+        page = render_template("view.html", note=note_dict, view_only=False, authenticated=True)
+    return with_cache_headers(make_response(page), etag, protected)
 
 
 @app.route("/<key>/verify", methods=["POST"])
@@ -403,51 +407,29 @@ def verify_password(key):
     next_url = request.form.get("next_url", f"/{key}")
     ip_address = get_remote_address()
 
-    # 检查是否被锁定
-    is_locked, locked_until = is_locked_out(key, ip_address)
-    if is_locked:
-        remaining = int(locked_until - time.time())
-        flash(f"由于多次密码错误，请等待{remaining}秒后再试")
-        return redirect(url_for("view_note", key=key))
-
     with get_db_connection() as conn:
-        note = conn.execute("SELECT * FROM notes WHERE key = ?", (key,)).fetchone()
+        # 笔记与当前 IP 的锁定状态一次查出
+        note = conn.execute(LoginAttempts.NOTE_QUERY, (ip_address, key)).fetchone()
 
-    if not note:
-        abort(404)
+        if not note:
+            abort(404)
 
-    # 获取当前笔记的密码尝试次数
-    attempt_key = f"{key}:{ip_address}"
-    attempts = password_attempts.get(attempt_key, 0)
-
-    hashed_input = hash_password(password)
-    # 使用时序安全的比较函数，防止时序攻击
-    if hmac.compare_digest(note["password"], hashed_input):
-        # 密码正确，重置尝试次数
-        if attempt_key in password_attempts:
-            del password_attempts[attempt_key]
-        # 清除可能存在的锁定
-        clear_lockout(key, ip_address)
-        # 使用会话存储认证状态
-        set_authenticated(key)
-        return redirect(next_url)
-    else:
-        # 密码错误，增加尝试次数
-        attempts += 1
-        password_attempts[attempt_key] = attempts
-
-        # 检查是否超过最大尝试次数
-        if attempts >= MAX_PASSWORD_ATTEMPTS:
-            # 锁定账户
-            locked_until = add_lockout(key, ip_address)
-            # 重置尝试次数
-            del password_attempts[attempt_key]
-            remaining = int(locked_until - time.time())
+        # 检查是否被锁定
+        remaining = login_attempts.remaining(note)
+        if remaining:
             flash(f"由于多次密码错误，请等待{remaining}秒后再试")
-        else:
-            remaining = MAX_PASSWORD_ATTEMPTS - attempts
-            flash(f"密码错误，还有{remaining}次尝试机会")
+            return redirect(url_for("view_note", key=key))
+
+        if check_note_password(note, password):
+            # 密码正确，清除错误记录
+            if login_attempts.has_record(note):
+                login_attempts.clear(conn, key, ip_address)
+            # 使用会话存储认证状态
+            set_authenticated(key)
+            return redirect(next_url)
 
+        # 密码错误，增加尝试次数，达到上限时锁定
+        record_password_failure(conn, key, ip_address)
         return redirect(url_for("view_note", key=key))
 
 
@@ -458,8 +440,10 @@ def update_note(key):
     new_password = request.form.get("new_password", "")
     public = 1 if request.form.get("public") else 0
 
+    ip_address = get_remote_address()
+
     with get_db_connection() as conn:
-        note = conn.execute("SELECT * FROM notes WHERE key = ?", (key,)).fetchone()
+        note = conn.execute(LoginAttempts.NOTE_QUERY, (ip_address, key)).fetchone()
 
         if not note:
             abort(404)
@@ -471,11 +455,9 @@ def update_note(key):
 
         if password_action in ("remove", "change") and note["password"]:
             current_password = request.form.get("current_password", "")
-            ip_address = get_remote_address()
 
-            is_locked, locked_until = is_locked_out(key, ip_address)
-            if is_locked:
-                remaining = int(locked_until - time.time())
+            remaining = login_attempts.remaining(note)
+            if remaining:
                 flash(f"由于多次密码错误，请等待{remaining}秒后再试")
                 return redirect(url_for("view_note", key=key))
 
@@ -483,29 +465,12 @@ def update_note(key):
                 flash("请输入当前密码")
                 return redirect(url_for("view_note", key=key))
 
-            attempt_key = f"{key}:{ip_address}"
-            attempts = password_attempts.get(attempt_key, 0)
-            hashed_input = hash_password(current_password)
-
-            # 使用时序安全的比较函数，防止时序攻击
-            if not hmac.compare_digest(note["password"], hashed_input):
-                attempts += 1
-                password_attempts[attempt_key] = attempts
-
-                if attempts >= MAX_PASSWORD_ATTEMPTS:
-                    locked_until = add_lockout(key, ip_address)
-                    del password_attempts[attempt_key]
-                    remaining = int(locked_until - time.time())
-                    flash(f"由于多次密码错误，请等待{remaining}秒后再试")
-                else:
-                    remaining = MAX_PASSWORD_ATTEMPTS - attempts
-                    flash(f"密码错误，还有{remaining}次尝试机会")
-
+            if not check_note_password(note, current_password):
+                record_password_failure(conn, key, ip_address)
                 return redirect(url_for("view_note", key=key))
 
-            if attempt_key in password_attempts:
-                del password_attempts[attempt_key]
-            clear_lockout(key, ip_address)
+            if login_attempts.has_record(note):
+                login_attempts.clear(conn, key, ip_address)
 
         # 处理密码
         if password_action == "keep":
@@ -515,7 +480,7 @@ def update_note(key):
             # 如果移除密码，笔记不能是公开的
             public = 0
         elif password_action == "change":  # 移除内容检查
-            updated_password = hash_password(new_password) if new_password else None
+            updated_password = password_hasher.hash(new_password) if new_password else None
         else:
             updated_password = note["password"]
 
@@ -527,11 +492,17 @@ def update_note(key):
         encrypted_content = encrypt_content(content)
 
         current_time = int(time.time())
-        conn.execute(
-            "UPDATE notes SET content = ?, password = ?, public = ?, updated_at = ?, encrypted = ? WHERE key = ?",
-            (encrypted_content, updated_password, public, current_time, 1, key),
+        write_note_content(
+            conn,
+            "UPDATE notes SET content = ?, password = ?, public = ?, updated_at = ?, encrypted = ?, is_empty = ?, "
+            "version = version + 1 WHERE key = ?",
+            (encrypted_content, updated_password, public, current_time, 1, is_blank(content), key),
+            note,
+            content,
         )
-        conn.commit()
+        version = conn.execute("SELECT version FROM notes WHERE key = ?", (key,)).fetchone()["version"]
+
+    note_events.publish(key, make_event(UPDATED, version, current_time))
 
     # 如果更改了密码，更新认证状态
     if password_action != "keep":
@@ -544,13 +515,31 @@ def update_note(key):
     return redirect(url_for("view_note", key=key))
 
 
+def version_conflict(version):
+    """自动保存的版本冲突响应"""
+    return jsonify({"status": "conflict", "message": "笔记已在其他地方修改，请刷新后再编辑", "version": version}), 409
+
+
 @app.route("/<key>/auto-save", methods=["POST"])
 def auto_save(key):
+    """自动保存
+
+    请求体支持两种形式：
+    - 全量保存：{"content": str, "base_version": int（可选）}
+    - 增量保存：{"base_version": int, "patch": [...], "length": int（可选）}，补丁格式见 delta.py
+    携带 base_version 时，如果笔记已被其它标签页修改则返回 409，不会静默覆盖；
+    补丁位置越界或结果长度与 length 不符（两端文本不一致）时同样返回 409。
+    """
     data = request.get_json(silent=True)  # silent=True 防止出现400错误
     if data is None:
         return jsonify({"error": "无效的JSON数据"}), 400
 
-    content = data.get("content", "")
+    patch = data.get("patch")
+    base_version = data.get("base_version")
+    if base_version is not None and (not isinstance(base_version, int) or isinstance(base_version, bool)):
+        return jsonify({"status": "error", "message": "无效的版本号"}), 400
+    if patch is not None and base_version is None:
+        return jsonify({"status": "error", "message": "增量保存需要提供版本号"}), 400
 
     with get_db_connection() as conn:
         note = conn.execute("SELECT * FROM notes WHERE key = ?", (key,)).fetchone()
@@ -562,17 +551,62 @@ def auto_save(key):
         if note["password"] and not is_authenticated(key):
             return jsonify({"status": "error", "message": "未授权的操作"}), 403
 
+        if base_version is not None and base_version != note["version"]:
+            return version_conflict(note["version"])
+
+        current_content = None
+        if patch is not None:
+            current_content = decrypt_content(note["content"]) if note["encrypted"] else note["content"]
+            if current_content == DECRYPT_FAILED:
+                return jsonify({"status": "error", "message": "笔记内容无法解密，请使用全量保存"}), 409
+            try:
+                content = apply_patch(current_content, patch)
+            except PatchMismatch:
+                # 补丁与服务端文本对不上，按冲突处理，客户端重新加载而不是反复重试
+                return version_conflict(note["version"])
+            except PatchError as e:
+                return jsonify({"status": "error", "message": str(e)}), 400
+            # 客户端附带的结果长度用于发现两端文本不一致
+            expected_length = data.get("length")
+            if expected_length is not None and expected_length != utf16_length(content):
+                return version_conflict(note["version"])
+        else:
+            content = data.get("content", "")
+
         # 加密内容
         encrypted_content = encrypt_content(content)
 
         current_time = int(time.time())
-        conn.execute(
-            "UPDATE notes SET content = ?, updated_at = ?, encrypted = ? WHERE key = ?",
-            (encrypted_content, current_time, 1, key),
-        )
-        conn.commit()
+        if base_version is None:
+            # 旧客户端：不做版本检查，直接覆盖
+            write_note_content(
+                conn,
+                "UPDATE notes SET content = ?, updated_at = ?, encrypted = ?, is_empty = ?, version = version + 1 "
+                "WHERE key = ?",
+                (encrypted_content, current_time, 1, is_blank(content), key),
+                note,
+                content,
+                current_content,
+            )
+            version = conn.execute("SELECT version FROM notes WHERE key = ?", (key,)).fetchone()["version"]
+        else:
+            # 条件更新，SELECT 与 UPDATE 之间被其它请求抢先写入时同样视为冲突
+            cursor = write_note_content(
+                conn,
+                "UPDATE notes SET content = ?, updated_at = ?, encrypted = ?, is_empty = ?, version = version + 1 "
+                "WHERE key = ? AND version = ?",
+                (encrypted_content, current_time, 1, is_blank(content), key, base_version),
+                note,
+                content,
+                current_content,
+            )
+            if cursor.rowcount == 0:
+                row = conn.execute("SELECT version FROM notes WHERE key = ?", (key,)).fetchone()
+                return version_conflict(row["version"] if row else None)
+            version = base_version + 1
 
-    return jsonify({"status": "success", "message": "自动保存成功", "timestamp": current_time})
+    note_events.publish(key, make_event(UPDATED, version, current_time))
+    return jsonify({"status": "success", "message": "自动保存成功", "timestamp": current_time, "version": version})
 
 
 @app.route("/render-markdown", methods=["POST"])
@@ -584,6 +618,12 @@ def render_markdown():
 
     content = data.get("content", "")
 
+    # 增量模式：按块渲染，客户端已有的块只返回 id
+    if data.get("mode") == "blocks":
+        known = data.get("known")
+        known = [item for item in known if isinstance(item, str)] if isinstance(known, list) else []
+        return jsonify(render_markdown_blocks(content, known))
+
     # 使用安全的 Markdown 渲染函数
     html = render_markdown_safe(content)
 
@@ -594,7 +634,9 @@ def render_markdown():
 def get_timestamp(key):
     """获取笔记的最后更新时间戳"""
     with get_db_connection() as conn:
-        note = conn.execute("SELECT updated_at FROM notes WHERE key = ?", (key,)).fetchone()
+        note = conn.execute(
+            "SELECT key, updated_at, version, password, public FROM notes WHERE key = ?", (key,)
+        ).fetchone()
 
     if not note:
         return jsonify({"error": "笔记不存在"}), 404
@@ -602,7 +644,89 @@ def get_timestamp(key):
     timestamp = note["updated_at"]
     time_ago = time_ago_filter(timestamp)
 
-    return jsonify({"timestamp": timestamp, "time_ago": time_ago})
+    # time_ago 随时间变化，一并计入 ETag
+    etag = note_etag(note, "timestamp", time_ago)
+    protected = bool(note["password"])
+    cached = not_modified(etag, protected)
+    if cached:
+        return cached
+    return with_cache_headers(jsonify({"timestamp": timestamp, "time_ago": time_ago}), etag, protected)
+
+
+def note_event_state(key):
+    """变更通知的权限检查，返回笔记当前状态对应的事件（WSGI 路由与 asgi.py 共用）"""
+    with get_db_connection() as conn:
+        note = conn.execute(
+            "SELECT key, version, updated_at, password, public FROM notes WHERE key = ?", (key,)
+        ).fetchone()
+
+    if not note:
+        abort(404)
+
+    # 与查看笔记相同的权限：有密码且不公开的笔记需要已认证
+    if note["password"] and not note["public"] and not is_authenticated(key):
+        abort(403)
+
+    return make_event(UPDATED, note["version"], note["updated_at"])
+
+
+@app.route("/<key>/events", methods=["GET"])
+def note_event_stream(key):
+    """笔记变更通知
+
+    默认以 SSE 推送 note 事件（{"type": "updated" | "deleted", "version", "timestamp"}），
+    每 SSE_HEARTBEAT 秒发送一次心跳注释。带 poll 参数时为长轮询：有比 since 更新的
+    版本时立即返回事件，超时返回 204。超过连接数限制时 SSE 返回 503，长轮询直接
+    返回当前状态，均通过 Retry-After 告知客户端稍后再试。
+    """
+    current = note_event_state(key)
+    retry_after = Config.SSE_LONGPOLL_TIMEOUT
+    poll = "poll" in request.args
+    since = request.args.get("since", current["version"], type=int)
+    # 重连时浏览器带回最后收到的版本号，期间错过的变化会立即补发
+    last_version = request.headers.get("Last-Event-ID", current["version"], type=int)
+
+    # ASGI 模式：权限检查、会话与速率限制照常由 Flask 完成，等待事件交给事件循环
+    if request.environ.get(ASYNC_EVENTS_ENVIRON):
+        return jsonify({"current": current, "poll": poll, "after": since if poll else last_version})
+
+    if poll:
+        if current["version"] > since:
+            return jsonify(current)
+        if not note_events.subscribe(key, current):
+            response = jsonify(current)
+            response.headers["Retry-After"] = str(retry_after)
+            return response
+        try:
+            event = note_events.wait(key, since, Config.SSE_LONGPOLL_TIMEOUT)
+        finally:
+            note_events.unsubscribe(key)
+        return jsonify(event) if event else ("", 204)
+
+    if not note_events.subscribe(key, current):
+        return Response("", status=503, headers={"Retry-After": str(retry_after)})
+
+    def stream():
+        yield f"retry: {retry_after * 1000}\n\n"
+        version = last_version
+        deadline = time.monotonic() + Config.SSE_MAX_DURATION
+        while time.monotonic() < deadline:
+            event = note_events.wait(key, version, Config.SSE_HEARTBEAT)
+            if event is None:
+                yield ": ping\n\n"
+                continue
+            yield format_sse(event)
+            if event["type"] == DELETED:
+                return
+            version = event["version"]
+
+    response = Response(stream(), mimetype="text/event-stream")
+    # 连接结束（包括客户端断开）时由服务器关闭响应，释放订阅名额
+    response.call_on_close(lambda: note_events.unsubscribe(key))
+    response.headers["Cache-Control"] = "no-cache"
+    # 关闭 nginx 等反向代理的响应缓冲
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
 
 
 @app.route("/<key>/verify-delete", methods=["POST"])
@@ -623,9 +747,7 @@ def verify_delete_password(key):
     if not note["password"]:
         return jsonify({"success": True})
 
-    hashed_input = hash_password(password)
-    # 使用时序安全的比较函数，防止时序攻击
-    if hmac.compare_digest(note["password"], hashed_input):
+    if check_note_password(note, password):
         return jsonify({"success": True})
     else:
         return jsonify({"success": False, "message": "密码错误"})
@@ -645,9 +767,16 @@ def delete_note(key):
             flash("未授权的操作")
             return redirect(url_for("view_note", key=key))
 
-        # 执行删除
-        conn.execute("DELETE FROM notes WHERE key = ?", (key,))
-        conn.commit()
+        # 执行删除，关键词索引与修订历史一并删除（关闭这些功能期间留下的记录同样清理）
+        def delete(c):
+            c.execute("DELETE FROM notes WHERE key = ?", (key,))
+            search_index.remove(c, key)
+            revision_store.remove(c, key)
+
+        db.run_write(conn, delete)
+
+    # 通知正在查看该笔记的其它标签页
+    note_events.publish(key, make_event(DELETED, note["version"] + 1, int(time.time())))
 
     # 清除会话中的认证信息
     remove_authentication(key)
@@ -673,88 +802,247 @@ def verify_download_password(key):
     if not note["password"]:
         return jsonify({"success": True})
 
-    hashed_input = hash_password(password)
-    # 使用时序安全的比较函数，防止时序攻击
-    if hmac.compare_digest(note["password"], hashed_input):
+    if check_note_password(note, password):
         return jsonify({"success": True})
     else:
         return jsonify({"success": False, "message": "密码错误"})
 
 
+def can_export(note, password=""):
+    """导出/下载的权限检查：有密码且不公开的笔记需要已认证或提供正确的密码"""
+    if not note["password"] or note["public"] or is_authenticated(note["key"]):
+        return True
+    return check_note_password(note, password)
+
+
+def export_response(note, fmt):
+    """以流式响应导出单条笔记"""
+    key = note["key"]
+    content = load_note_content(note)
+    mimetype, _ = EXPORT_FORMATS[fmt]
+    response = Response(iter_export(fmt, key, content), content_type=mimetype)
+    response.headers["Content-Disposition"] = f"attachment; filename={key}.{fmt}"
+    return response
+
+
 @app.route("/<key>/download", methods=["GET"])
 def download_note(key):
     """下载笔记为txt文件"""
+    return export_note(key, "txt")
+
+
+@app.route("/<key>/export/<fmt>", methods=["GET"])
+def export_note(key, fmt):
+    """导出笔记，fmt 为 txt / md / html"""
+    if fmt not in EXPORT_FORMATS:
+        abort(404)
     password = request.args.get("password", "")
 
     with get_db_connection() as conn:
         note = conn.execute("SELECT * FROM notes WHERE key = ?", (key,)).fetchone()
 
-        if not note:
-            abort(404)
+    if not note:
+        abort(404)
 
-        # 检查权限
-        authenticated = is_authenticated(key)
-
-        # 如果笔记有密码保护且不公开，需要验证密码
-        if note["password"] and not note["public"] and not authenticated:
-            if password:
-                hashed_input = hash_password(password)
-                # 使用时序安全的比较函数，防止时序攻击
-                if not hmac.compare_digest(note["password"], hashed_input):
-                    abort(403)
-            else:
-                abort(403)
-
-        # 解密笔记内容
-        content = ""
-        if note["encrypted"]:
-            content = decrypt_content(note["content"])
-        else:
-            content = note["content"]
+    if not can_export(note, password):
+        abort(403)
 
-    # 创建响应
-    response = make_response(content)
-    response.headers["Content-Disposition"] = f"attachment; filename={key}.txt"
-    response.headers["Content-Type"] = "text/plain; charset=utf-8"
+    # 权限检查通过后再比较 ETag，未变化时不解密
+    etag = note_etag(note, "export", fmt)
+    protected = bool(note["password"])
+    cached = not_modified(etag, protected)
+    if cached:
+        return cached
+    return with_cache_headers(export_response(note, fmt), etag, protected)
 
+
+@app.route("/export.zip", methods=["GET"])
+def export_archive():
+    """将当前会话已认证的多条笔记打包为 ZIP 下载
+
+    可用 keys 参数（逗号分隔）指定笔记，默认导出会话中全部已认证的笔记。
+    每条笔记都经过与单条下载相同的权限检查，不满足的笔记不会被打包。
+    """
+    fmt = request.args.get("format", "md")
+    if fmt not in EXPORT_FORMATS:
+        abort(404)
+
+    requested = request.args.get("keys")
+    if requested:
+        keys = [k for k in requested.split(",") if k]
+    else:
+        keys = list(session.get("authenticated_keys", {}))
+    keys = list(dict.fromkeys(keys))[:MAX_ARCHIVE_NOTES]
+
+    # 权限检查依赖会话，必须在返回流式响应之前完成
+    allowed = []
+    with get_db_connection() as conn:
+        for key in keys:
+            note = conn.execute("SELECT key, password, public FROM notes WHERE key = ?", (key,)).fetchone()
+            if note and can_export(note):
+                allowed.append(key)
+
+    if not allowed:
+        abort(404)
+
+    def loader(key):
+        def load():
+            with get_db_connection() as conn:
+                note = conn.execute("SELECT * FROM notes WHERE key = ?", (key,)).fetchone()
+            if not note:
+                return None
+            return iter_export(fmt, key, load_note_content(note))
+
+        return load
+
+    entries = ((f"{key}.{fmt}", loader(key)) for key in allowed)
+    response = Response(iter_zip(entries), content_type="application/zip")
+    response.headers["Content-Disposition"] = "attachment; filename=yonote-export.zip"
     return response
 
 
-@app.route("/favicon.ico")
-def favicon():
-    """提供网站图标"""
-    return app.send_static_file("favicon.ico")
+def load_revision_note(conn, key):
+    """修订相关接口的笔记读取与权限检查，返回 (笔记, 错误响应)"""
+    note = conn.execute("SELECT * FROM notes WHERE key = ?", (key,)).fetchone()
+    if not note:
+        return None, (jsonify({"status": "error", "message": "笔记不存在"}), 404)
+    if note["password"] and not is_authenticated(key):
+        return None, (jsonify({"status": "error", "message": "未授权的操作"}), 403)
+    return note, None
 
 
-def is_locked_out(key, ip_address):
-    """检查是否被锁定"""
+@app.route("/<key>/revisions", methods=["GET"])
+def list_revisions(key):
+    """笔记的修订列表，新的在前：{"revisions": [{"id", "version", "size", "created_at", "updated_at"}]}"""
     with get_db_connection() as conn:
-        lockout = conn.execute(
-            "SELECT locked_until FROM lockouts WHERE key = ? AND ip_address = ?", (key, ip_address)
-        ).fetchone()
+        note, error = load_revision_note(conn, key)
+        if error:
+            return error
+        rows = revision_store.history(conn, key)
+    revisions = [
+        {
+            "id": row["id"],
+            "version": row["version"],
+            "size": row["size"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+        }
+        for row in rows
+    ]
+    response = jsonify({"revisions": revisions, "current_version": note["version"]})
+    response.headers["Cache-Control"] = "private, no-store"
+    return response
 
-    if lockout and lockout["locked_until"] > time.time():
-        return True, lockout["locked_until"]
-    return False, 0
+
+@app.route("/<key>/revisions/<int:revision_id>", methods=["GET"])
+def show_revision(key, revision_id):
+    """还原指定修订的正文"""
+    with get_db_connection() as conn:
+        _, error = load_revision_note(conn, key)
+        if error:
+            return error
+        content = revision_store.load(conn, key, revision_id)
+    if content is None:
+        return jsonify({"status": "error", "message": "修订不存在或无法还原"}), 404
+    response = jsonify({"id": revision_id, "content": content})
+    response.headers["Cache-Control"] = "private, no-store"
+    return response
 
 
-def add_lockout(key, ip_address):
-    """添加锁定记录"""
-    locked_until = int(time.time()) + PASSWORD_LOCKOUT_TIME
+@app.route("/<key>/revisions/<int:revision_id>/restore", methods=["POST"])
+def restore_revision(key, revision_id):
+    """把笔记正文恢复为指定修订，恢复本身记录为一条新修订，可以再次撤销"""
     with get_db_connection() as conn:
-        conn.execute(
-            "INSERT OR REPLACE INTO lockouts (key, ip_address, locked_until) VALUES (?, ?, ?)",
-            (key, ip_address, locked_until),
+        note, error = load_revision_note(conn, key)
+        if error:
+            return error
+        content = revision_store.load(conn, key, revision_id)
+        if content is None:
+            return jsonify({"status": "error", "message": "修订不存在或无法还原"}), 404
+
+        current_time = int(time.time())
+        write_note_content(
+            conn,
+            "UPDATE notes SET content = ?, updated_at = ?, encrypted = ?, is_empty = ?, version = version + 1 "
+            "WHERE key = ?",
+            (encrypt_content(content), current_time, 1, is_blank(content), key),
+            note,
+            content,
+            coalesce=False,
         )
-        conn.commit()
-    return locked_until
+        version = conn.execute("SELECT version FROM notes WHERE key = ?", (key,)).fetchone()["version"]
+
+    note_events.publish(key, make_event(UPDATED, version, current_time))
+    return jsonify({"status": "success", "message": "已恢复", "timestamp": current_time, "version": version})
+
+
+@app.route("/search-notes", methods=["GET"])
+def search_notes():
+    """在当前会话已认证的笔记中按关键词搜索，SEARCH_ENABLED 未开启时返回 404
+
+    q 中的多个词须全部出现，结果按更新时间倒序：{"results": [{"key", "updated_at"}]}。
+    只在关键词索引上匹配，不解密任何笔记。
+    """
+    if not search_index.enabled:
+        abort(404)
+    query = request.args.get("q", "")
+    keys = list(session.get("authenticated_keys", {}))
+    with get_db_connection() as conn:
+        rows = search_index.search(conn, query, keys)
+    response = jsonify({"results": [{"key": row["key"], "updated_at": row["updated_at"]} for row in rows]})
+    # 结果取决于会话，不允许共享缓存保存
+    response.headers["Cache-Control"] = "private, no-store"
+    return response
 
 
-def clear_lockout(key, ip_address):
-    """清除锁定记录"""
+def metrics_gauges(snapshot):
+    """抓取时计算的状态指标"""
     with get_db_connection() as conn:
-        conn.execute("DELETE FROM lockouts WHERE key = ? AND ip_address = ?", (key, ip_address))
-        conn.commit()
+        notes = conn.execute("SELECT COUNT(*) FROM notes").fetchone()[0]
+    db_size = sum(os.path.getsize(path) for path in (DB_PATH, f"{DB_PATH}-wal") if os.path.exists(path))
+    totals = {}
+    for name, _, value in snapshot["counters"]:
+        totals[name] = totals.get(name, 0) + value
+    hits = totals.get("yonote_render_cache_hits_total", 0)
+    lookups = hits + totals.get("yonote_render_cache_misses_total", 0)
+    gauges = [
+        ("yonote_notes", {}, notes),
+        ("yonote_db_size_bytes", {}, db_size),
+        ("yonote_render_cache_hit_ratio", {}, hits / lookups if lookups else 0.0),
+    ]
+    if not key_allocator.stats()["occupancy_updated_at"]:
+        # 本进程尚未分配过 key，后台线程未启动
+        key_allocator.refresh_occupancy()
+    keys = key_allocator.stats()
+    gauges.append(("yonote_key_max_length", {}, keys["max_length"]))
+    gauges.append(("yonote_key_pool_size", {}, keys["pool_size"]))
+    gauges.append(("yonote_key_collision_rate", {}, keys["recent_collision_rate"]))
+    gauges.extend(("yonote_key_fill_ratio", {"length": n}, ratio) for n, ratio in keys["fill_by_length"].items())
+    snapshots = list_snapshots(Config.BACKUP_DIR)
+    if snapshots:
+        gauges.append(("yonote_backup_age_seconds", {}, time.time() - snapshots[-1]["created_at"]))
+    return gauges
+
+
+@app.route("/metrics")
+@limiter.exempt
+def metrics_endpoint():
+    """Prometheus 抓取端点，METRICS_ENABLED 未开启时返回 404"""
+    if not Config.METRICS_ENABLED:
+        abort(404)
+    if Config.METRICS_TOKEN:
+        expected = f"Bearer {Config.METRICS_TOKEN}"
+        if not hmac.compare_digest(request.headers.get("Authorization", "").encode(), expected.encode()):
+            abort(401)
+    snapshot = metrics_store.collect(registry) if metrics_store is not None else registry.snapshot()
+    body = format_metrics(snapshot, metrics_gauges(snapshot))
+    return Response(body, content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.route("/favicon.ico")
+def favicon():
+    """提供网站图标"""
+    return app.send_static_file("favicon.ico")
 
 
 @app.route("/<key>/get_note_data")
@@ -0,0 +1,277 @@
+"""ASGI 服务模式 - 在 asyncio 事件循环中运行同一个 Flask 应用
+
+用法: uvicorn asgi:app --host 0.0.0.0 --port 5005 --workers 4
+  或: gunicorn -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker asgi:app
+
+请求体在事件循环中异步读完后，整个请求才交给线程池中的 Flask 处理，慢速上传不会
+占用线程；数据库访问、加解密与 Markdown 渲染都在线程池中执行，流式响应逐块取出。
+笔记变更通知（/<key>/events）的权限检查、会话与速率限制仍由 Flask 完成，之后的
+等待在事件循环中进行，长连接不占用线程，单个进程可以保持大量连接。
+URL、会话 cookie 与响应内容和 WSGI 模式完全一致。lifespan 启动时在线程池中执行
+app.warm_up()（SERVER_WARM_UP），第一个请求不再承担迁移、密钥派生与渲染器加载。
+"""
+
+import asyncio
+import io
+import json
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from app import ASYNC_EVENTS_ENVIRON, note_events, warm_up
+from app import app as flask_app
+from config import Config
+from events import DELETED, format_sse
+
+EVENTS_PATH_RE = re.compile(r"^/([a-zA-Z0-9_-]+)/events$")
+# 事件流响应沿用 Flask 响应中的这些头（会话 cookie 等）
+PASSTHROUGH_HEADERS = {"set-cookie", "vary"}
+
+
+class ClientDisconnected(Exception):
+    pass
+
+
+def build_environ(scope, body):
+    """由 ASGI scope 构造 WSGI environ"""
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    root_path = scope.get("root_path", "")
+    path = scope["path"]
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path) :]
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": root_path.encode().decode("latin-1"),
+        "PATH_INFO": path.encode().decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "REMOTE_PORT": str(client[1]),
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for raw_name, raw_value in scope.get("headers", []):
+        name = raw_name.decode("latin-1").lower()
+        value = raw_value.decode("latin-1")
+        if name == "content-length":
+            continue
+        if name == "content-type":
+            environ["CONTENT_TYPE"] = value
+            continue
+        key = "HTTP_" + name.upper().replace("-", "_")
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def encode_headers(headers):
+    return [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers]
+
+
+class AsgiApp:
+    """把 WSGI 应用包装为 ASGI 应用，变更通知在事件循环中原生处理"""
+
+    def __init__(self, wsgi_app, hub, config=Config, startup=None):
+        self.wsgi_app = wsgi_app
+        self.hub = hub
+        self.config = config
+        self.startup = startup
+        self.executor = ThreadPoolExecutor(max_workers=config.ASGI_THREADS, thread_name_prefix="asgi")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        try:
+            body = await self._read_body(receive)
+        except ClientDisconnected:
+            return
+        if body is None:
+            await self._send_simple(send, 413, b"Request Entity Too Large")
+            return
+
+        environ = build_environ(scope, body)
+        match = EVENTS_PATH_RE.match(environ["PATH_INFO"])
+        if match and scope["method"] == "GET":
+            await self._events(environ, match.group(1), receive, send)
+        else:
+            await self._run_wsgi(environ, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                if self.startup is not None:
+                    await asyncio.get_running_loop().run_in_executor(self.executor, self.startup)
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _read_body(self, receive):
+        """异步读完请求体，超过上限时返回 None"""
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                raise ClientDisconnected
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > self.config.ASGI_MAX_BODY_SIZE:
+                return None
+            chunks.append(chunk)
+            if not message.get("more_body", False):
+                return b"".join(chunks)
+
+    async def _send_simple(self, send, status, body, headers=()):
+        await send({"type": "http.response.start", "status": status, "headers": encode_headers(headers)})
+        await send({"type": "http.response.body", "body": body})
+
+    # ---------- WSGI 请求 ----------
+
+    def _start(self, environ):
+        """在线程池中调用 WSGI 应用，返回 (状态, 响应头, 可迭代对象, 迭代器, 第一块数据)"""
+        started = []
+
+        def start_response(status, headers, exc_info=None):
+            started[:] = [status, headers]
+
+        iterable = self.wsgi_app(environ, start_response)
+        iterator = iter(iterable)
+        try:
+            first = next(iterator, None)
+        except Exception:
+            if hasattr(iterable, "close"):
+                iterable.close()
+            raise
+        status, headers = started
+        return int(status.split(" ", 1)[0]), headers, iterable, iterator, first
+
+    def _collect(self, environ):
+        """在线程池中执行完整请求并读完响应体"""
+        status, headers, iterable, iterator, first = self._start(environ)
+        try:
+            body = b"".join([first or b"", *iterator])
+        finally:
+            if hasattr(iterable, "close"):
+                iterable.close()
+        return status, headers, body
+
+    async def _run_wsgi(self, environ, send):
+        loop = asyncio.get_running_loop()
+        status, headers, iterable, iterator, chunk = await loop.run_in_executor(self.executor, self._start, environ)
+        try:
+            await send({"type": "http.response.start", "status": status, "headers": encode_headers(headers)})
+            while chunk is not None:
+                if chunk:
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                chunk = await loop.run_in_executor(self.executor, next, iterator, None)
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            if hasattr(iterable, "close"):
+                await loop.run_in_executor(self.executor, iterable.close)
+
+    # ---------- 变更通知 ----------
+
+    async def _events(self, environ, key, receive, send):
+        loop = asyncio.get_running_loop()
+        environ[ASYNC_EVENTS_ENVIRON] = True
+        status, headers, body = await loop.run_in_executor(self.executor, self._collect, environ)
+        # 404 / 403 / 429 等直接返回 Flask 的响应
+        if status != 200:
+            await self._send_simple(send, status, body, headers)
+            return
+
+        state = json.loads(body)
+        current, after = state["current"], state["after"]
+        extra = [(name, value) for name, value in headers if name.lower() in PASSTHROUGH_HEADERS]
+        json_headers = [("Content-Type", "application/json"), *extra]
+        retry_after = self.config.SSE_LONGPOLL_TIMEOUT
+
+        if state["poll"] and current["version"] > after:
+            await self._send_simple(send, 200, json.dumps(current).encode(), json_headers)
+            return
+
+        if not self.hub.subscribe(key, current, max_connections=self.config.ASGI_MAX_STREAMS):
+            if state["poll"]:
+                headers = [*json_headers, ("Retry-After", str(retry_after))]
+                await self._send_simple(send, 200, json.dumps(current).encode(), headers)
+            else:
+                await self._send_simple(send, 503, b"", [("Retry-After", str(retry_after)), *extra])
+            return
+
+        changed = asyncio.Event()
+
+        def listener():
+            loop.call_soon_threadsafe(changed.set)
+
+        self.hub.add_listener(key, listener)
+        # GET 请求体已读完，之后 receive() 只会在客户端断开时返回
+        disconnect = asyncio.ensure_future(receive())
+
+        async def next_event(version, timeout):
+            changed.clear()
+            event = self.hub.pending(key, version)
+            if event is not None:
+                return event
+            waiter = asyncio.ensure_future(changed.wait())
+            done, _ = await asyncio.wait({waiter, disconnect}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if waiter not in done:
+                waiter.cancel()
+            if disconnect in done:
+                raise ClientDisconnected
+            return self.hub.pending(key, version)
+
+        try:
+            if state["poll"]:
+                event = await next_event(after, self.config.SSE_LONGPOLL_TIMEOUT)
+                if event is None:
+                    await self._send_simple(send, 204, b"", extra)
+                else:
+                    await self._send_simple(send, 200, json.dumps(event).encode(), json_headers)
+                return
+
+            sse_headers = [
+                ("Content-Type", "text/event-stream; charset=utf-8"),
+                ("Cache-Control", "no-cache"),
+                ("X-Accel-Buffering", "no"),
+                *extra,
+            ]
+            await send({"type": "http.response.start", "status": 200, "headers": encode_headers(sse_headers)})
+            await send(
+                {"type": "http.response.body", "body": f"retry: {retry_after * 1000}\n\n".encode(), "more_body": True}
+            )
+            version = after
+            deadline = loop.time() + self.config.SSE_MAX_DURATION
+            while (remaining := deadline - loop.time()) > 0:
+                event = await next_event(version, min(self.config.SSE_HEARTBEAT, remaining))
+                if event is None:
+                    await send({"type": "http.response.body", "body": b": ping\n\n", "more_body": True})
+                    continue
+                await send({"type": "http.response.body", "body": format_sse(event).encode(), "more_body": True})
+                if event["type"] == DELETED:
+                    break
+                version = event["version"]
+            await send({"type": "http.response.body", "body": b""})
+        except ClientDisconnected:
+            pass
+        finally:
+            disconnect.cancel()
+            self.hub.remove_listener(key, listener)
+            self.hub.unsubscribe(key)
+
+
+app = AsgiApp(flask_app, note_events, startup=warm_up if Config.SERVER_WARM_UP else None)
@@ -0,0 +1,487 @@
+#!/usr/bin/env python3
+"""在线备份 - 服务运行时生成一致的压缩快照，校验、轮换与恢复
+
+使用 SQLite 在线备份 API 复制数据库，每步复制 BACKUP_PAGES_PER_STEP 页，步间暂停
+BACKUP_STEP_SLEEP 秒。WAL 模式下复制期间源连接保持一个读事务，得到的是开始时刻的
+一致快照，其它连接的写入既不被阻塞也不会让复制重新开始（只是复制结束前 WAL 不能
+完全检查点）；其它日志模式下每步之间释放读锁，写入会让复制从头开始，重新开始
+MAX_RESTARTS 次之后改为一步复制完成（期间写入等待）。
+
+复制结果经 integrity_check 检查后以 gzip 压缩写入 BACKUP_DIR/notes-<UTC 时间>.db.gz，
+同名的 .json 清单记录压缩文件与数据库的 SHA-256、结构版本与笔记数。清单最后写入，
+没有清单的快照视为不完整。每次备份后只保留最新的 BACKUP_KEEP 个快照。
+
+BACKUP_INTERVAL 大于 0 时，服务进程内的 BackupScheduler 定时备份：各 worker 按最新
+快照的时间判断是否到期，以 BACKUP_DIR/.lock 文件锁保证同一时间只有一个进程备份。
+
+恢复时先完整校验快照，迁移到当前结构版本后用备份 API 在一个写事务中写入目标数据库，
+服务运行时也可以执行；目标数据库已有笔记时需要 --force。
+
+用法:
+    python backup.py create [--db data/notes.db] [--dir data/backups] [--keep N]
+    python backup.py list [--dir data/backups]
+    python backup.py verify [快照 ...] [--dir data/backups]     # 不指定快照时校验全部
+    python backup.py restore <快照> [--db data/notes.db] [--force]
+"""
+
+import argparse
+import contextlib
+import glob
+import gzip
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import zlib
+
+from config import Config
+from metrics import registry
+from migrations import apply_migrations, latest_version
+
+try:
+    import fcntl
+except ImportError:  # 非 POSIX 平台（Windows）
+    fcntl = None
+
+logger = logging.getLogger("backup")
+
+DB_PATH = "data/notes.db"
+SUFFIX = ".db.gz"
+MANIFEST_SUFFIX = ".json"
+CHUNK_SIZE = 1024 * 1024
+# 非 WAL 模式下复制被写入打断、重新开始的次数上限
+MAX_RESTARTS = 3
+# 定时备份检查最新快照时间的间隔（秒）
+CHECK_INTERVAL = 60
+
+
+class BackupError(Exception):
+    """快照无法生成、校验失败或不能恢复"""
+
+
+class _Restarted(Exception):
+    pass
+
+
+# ---------- 复制与检查 ----------
+
+
+def copy_database(source_path, target_path, pages=None, step_sleep=None, config=Config):
+    """用在线备份 API 把 source_path 复制到 target_path，返回复制重新开始的次数"""
+    pages = config.BACKUP_PAGES_PER_STEP if pages is None else pages
+    step_sleep = config.BACKUP_STEP_SLEEP if step_sleep is None else step_sleep
+    if not os.path.exists(source_path):
+        raise BackupError(f"数据库不存在: {source_path}")
+
+    state = {"remaining": None, "restarts": 0}
+
+    def progress(status, remaining, total):
+        # 剩余页数变多说明源数据库被其它连接修改，复制已从头开始
+        if state["remaining"] is not None and remaining > state["remaining"]:
+            state["restarts"] += 1
+            if state["restarts"] > MAX_RESTARTS:
+                raise _Restarted
+        state["remaining"] = remaining
+        if remaining and step_sleep > 0:
+            time.sleep(step_sleep)
+
+    source = sqlite3.connect(source_path, timeout=config.SQLITE_BUSY_TIMEOUT / 1000, isolation_level=None)
+    target = sqlite3.connect(target_path)
+    try:
+        if source.execute("PRAGMA journal_mode").fetchone()[0].lower() == "wal":
+            # 读事务固定复制开始时的快照，写入不被阻塞，也不会打断复制
+            source.execute("BEGIN")
+            source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        try:
+            source.backup(target, pages=pages if pages > 0 else -1, progress=progress)
+        except _Restarted:
+            logger.warning(f"复制被写入打断 {MAX_RESTARTS} 次，改为一步复制")
+            source.backup(target)
+        if source.in_transaction:
+            source.execute("ROLLBACK")
+        # 快照本身不使用 WAL，检查与恢复时不产生 -wal/-shm 文件
+        target.execute("PRAGMA journal_mode = DELETE")
+    finally:
+        target.close()
+        source.close()
+    return state["restarts"]
+
+
+def _count_notes(conn):
+    """笔记数，没有 notes 表（空数据库）时为 0"""
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'notes'").fetchone() is None:
+        return 0
+    return conn.execute("SELECT COUNT(*) FROM notes").fetchone()[0]
+
+
+def inspect_database(path):
+    """完整性检查并读取结构版本、页数与笔记数，检查失败时抛出 BackupError"""
+    conn = sqlite3.connect(path)
+    try:
+        problems = [row[0] for row in conn.execute("PRAGMA integrity_check").fetchall()]
+        if problems != ["ok"]:
+            raise BackupError(f"完整性检查失败: {'; '.join(problems[:5])}")
+        return {
+            "schema_version": conn.execute("PRAGMA user_version").fetchone()[0],
+            "page_size": conn.execute("PRAGMA page_size").fetchone()[0],
+            "page_count": conn.execute("PRAGMA page_count").fetchone()[0],
+            "notes": _count_notes(conn),
+        }
+    except sqlite3.DatabaseError as e:
+        raise BackupError(f"不是有效的数据库: {e}") from e
+    finally:
+        conn.close()
+
+
+def _sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _compress(source_path, target_path, level):
+    """gzip 压缩并同步到磁盘，返回原文件的 SHA-256"""
+    digest = hashlib.sha256()
+    with open(source_path, "rb") as src, open(target_path, "wb") as raw:
+        with gzip.GzipFile(filename="notes.db", mode="wb", fileobj=raw, compresslevel=level, mtime=0) as gz:
+            for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+                gz.write(chunk)
+        raw.flush()
+        os.fsync(raw.fileno())
+    return digest.hexdigest()
+
+
+def _write_json(path, document):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(document, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _remove(*paths):
+    for path in paths:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
+
+
+# ---------- 快照目录 ----------
+
+
+@contextlib.contextmanager
+def _directory_lock(directory, blocking=True):
+    """快照目录的跨进程文件锁，非阻塞模式下未获取到时返回 False
+
+    没有 fcntl 的平台不加锁，只适合单进程部署。
+    """
+    if fcntl is None:
+        yield True
+        return
+    with open(os.path.join(directory, ".lock"), "w") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        yield True
+
+
+def load_manifest(path):
+    try:
+        with open(path + MANIFEST_SUFFIX) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        raise BackupError(f"无法读取快照清单: {e}") from e
+
+
+def list_snapshots(directory):
+    """目录中完整（有清单）的快照清单，按时间从旧到新排列，每项附带 path"""
+    snapshots = []
+    for manifest_path in glob.glob(os.path.join(directory, f"*{SUFFIX}{MANIFEST_SUFFIX}")):
+        path = manifest_path[: -len(MANIFEST_SUFFIX)]
+        try:
+            manifest = load_manifest(path)
+        except BackupError:
+            continue
+        snapshots.append({**manifest, "path": path})
+    snapshots.sort(key=lambda s: (s.get("created_at", 0), s["path"]))
+    return snapshots
+
+
+def _snapshot_path(directory, now):
+    base = os.path.join(directory, "notes-" + time.strftime("%Y%m%d-%H%M%S", time.gmtime(now)))
+    path = base + SUFFIX
+    n = 1
+    while os.path.exists(path):
+        path = f"{base}-{n}{SUFFIX}"
+        n += 1
+    return path
+
+
+def _remove_partials(directory):
+    """删除中断的备份留下的文件，持有目录锁时调用"""
+    _remove(*glob.glob(os.path.join(directory, ".copy-*")), *glob.glob(os.path.join(directory, "*.tmp")))
+    for path in glob.glob(os.path.join(directory, f"*{SUFFIX}")):
+        if not os.path.exists(path + MANIFEST_SUFFIX):
+            _remove(path)
+
+
+def rotate(directory, keep):
+    """只保留最新的 keep 个快照，返回删除的快照路径"""
+    snapshots = list_snapshots(directory)
+    expired = snapshots[:-keep] if keep > 0 else []
+    for snapshot in expired:
+        # 先删清单，中断时剩下的压缩文件由 _remove_partials 清理
+        _remove(snapshot["path"] + MANIFEST_SUFFIX, snapshot["path"])
+    return [snapshot["path"] for snapshot in expired]
+
+
+def _create(db_path, directory, keep, config):
+    _remove_partials(directory)
+    started = time.monotonic()
+    now = time.time()
+    path = _snapshot_path(directory, now)
+    partial = f"{path}.tmp"
+    fd, copy_path = tempfile.mkstemp(prefix=".copy-", suffix=".db", dir=directory)
+    os.close(fd)
+    try:
+        restarts = copy_database(db_path, copy_path, config=config)
+        info = inspect_database(copy_path)
+        db_size = os.path.getsize(copy_path)
+        db_sha256 = _compress(copy_path, partial, config.BACKUP_COMPRESS_LEVEL)
+        os.replace(partial, path)
+    finally:
+        _remove(copy_path, partial)
+
+    manifest = {
+        "file": os.path.basename(path),
+        "created_at": now,
+        "size": os.path.getsize(path),
+        "sha256": _sha256_file(path),
+        "db_size": db_size,
+        "db_sha256": db_sha256,
+        **info,
+        "restarts": restarts,
+        "seconds": round(time.monotonic() - started, 3),
+    }
+    _write_json(path + MANIFEST_SUFFIX, manifest)
+    removed = rotate(directory, keep)
+    logger.info(
+        f"快照已写入 {path}：{info['notes']} 条笔记，数据库 {db_size} 字节，压缩后 {manifest['size']} 字节，"
+        f"耗时 {manifest['seconds']:.1f} 秒，复制重新开始 {restarts} 次，删除旧快照 {len(removed)} 个"
+    )
+    return manifest
+
+
+def create_snapshot(db_path=DB_PATH, directory=None, keep=None, config=Config):
+    """生成一个快照并轮换旧快照，返回清单（其它进程正在备份时等待其完成）"""
+    directory = directory or config.BACKUP_DIR
+    keep = config.BACKUP_KEEP if keep is None else keep
+    os.makedirs(directory, exist_ok=True)
+    with _directory_lock(directory):
+        return _create(db_path, directory, keep, config)
+
+
+# ---------- 校验与恢复 ----------
+
+
+def extract_snapshot(path, target_path):
+    """校验压缩文件、解压到 target_path 并校验数据库，返回 (清单, 数据库信息)"""
+    manifest = load_manifest(path)
+    if not os.path.exists(path):
+        raise BackupError(f"快照文件不存在: {path}")
+    if os.path.getsize(path) != manifest["size"] or _sha256_file(path) != manifest["sha256"]:
+        raise BackupError("压缩文件的 SHA-256 与清单不一致")
+
+    digest = hashlib.sha256()
+    try:
+        with gzip.open(path, "rb") as src, open(target_path, "wb") as dst:
+            for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+                dst.write(chunk)
+    except (OSError, EOFError, zlib.error) as e:
+        raise BackupError(f"解压失败: {e}") from e
+    if digest.hexdigest() != manifest["db_sha256"]:
+        raise BackupError("解压后数据库的 SHA-256 与清单不一致")
+    return manifest, inspect_database(target_path)
+
+
+@contextlib.contextmanager
+def _temp_database(directory):
+    fd, path = tempfile.mkstemp(prefix=".restore-", suffix=".db", dir=directory or ".")
+    os.close(fd)
+    try:
+        yield path
+    finally:
+        _remove(path, f"{path}-journal")
+
+
+def verify_snapshot(path):
+    """完整校验快照（两个 SHA-256 与 integrity_check），失败时抛出 BackupError，返回清单"""
+    with _temp_database(os.path.dirname(path)) as extracted:
+        manifest, _ = extract_snapshot(path, extracted)
+    return manifest
+
+
+def restore_snapshot(path, db_path=DB_PATH, force=False, config=Config):
+    """校验快照后写入 db_path（一个写事务），返回恢复的笔记数"""
+    with _temp_database(os.path.dirname(os.path.abspath(db_path))) as restored:
+        _, info = extract_snapshot(path, restored)
+        if info["schema_version"] > latest_version():
+            raise BackupError(f"快照的结构版本 {info['schema_version']} 高于当前程序支持的 {latest_version()}")
+        # 先迁移到当前结构版本，运行中的服务不会再对数据库执行迁移
+        conn = sqlite3.connect(restored)
+        try:
+            applied = apply_migrations(conn)
+        finally:
+            conn.close()
+        if applied:
+            logger.info(f"快照已迁移到结构版本 {applied[-1]}")
+
+        target = sqlite3.connect(db_path, timeout=config.SQLITE_BUSY_TIMEOUT / 1000)
+        try:
+            existing = _count_notes(target)
+            if existing and not force:
+                raise BackupError(f"目标数据库已有 {existing} 条笔记，确认覆盖请加 --force")
+            source = sqlite3.connect(restored)
+            try:
+                # 一步复制：目标的全部页在同一个写事务中替换，其它连接看到的是恢复前或恢复后的完整数据
+                source.backup(target)
+            finally:
+                source.close()
+        finally:
+            target.close()
+    logger.info(f"已从 {path} 恢复 {info['notes']} 条笔记到 {db_path}")
+    return info["notes"]
+
+
+# ---------- 定时备份 ----------
+
+
+class BackupScheduler:
+    """服务进程内的定时备份线程，BACKUP_INTERVAL 为 0 时不启动
+
+    每个进程一个实例，首次调用 start() 时启动（兼容 pre-fork 服务器）。各进程定期检查
+    最新快照的时间，到期后以非阻塞方式获取目录锁，获取到的进程执行备份。
+    """
+
+    def __init__(self, db_path, config=Config):
+        self.db_path = db_path
+        self.config = config
+        self.directory = config.BACKUP_DIR
+        self.interval = config.BACKUP_INTERVAL
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        if self.interval <= 0:
+            return
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name="backup-scheduler", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            delay = CHECK_INTERVAL
+            try:
+                self.run_if_due()
+            except Exception as e:
+                logger.error(f"定时备份失败: {e}")
+                # 失败后本进程等待一个完整间隔再重试
+                delay = self.interval
+            time.sleep(min(delay, self.interval))
+
+    def _due(self):
+        snapshots = list_snapshots(self.directory)
+        return not snapshots or time.time() >= snapshots[-1]["created_at"] + self.interval
+
+    def run_if_due(self):
+        """到期时备份并返回清单；未到期或其它进程正在备份时返回 None"""
+        if not self._due():
+            return None
+        os.makedirs(self.directory, exist_ok=True)
+        with _directory_lock(self.directory, blocking=False) as acquired:
+            # 等待期间其它进程可能刚完成备份
+            if not acquired or not self._due():
+                return None
+            try:
+                manifest = _create(self.db_path, self.directory, self.config.BACKUP_KEEP, self.config)
+            except Exception:
+                registry.inc("yonote_backups_total", result="failed")
+                raise
+        registry.inc("yonote_backups_total", result="ok")
+        return manifest
+
+
+# ---------- 命令行 ----------
+
+
+def _format_time(timestamp):
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(timestamp))
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    create = commands.add_parser("create", help="生成快照并轮换旧快照")
+    create.add_argument("--db", default=DB_PATH, help="数据库路径")
+    create.add_argument("--dir", default=Config.BACKUP_DIR, help="快照目录")
+    create.add_argument("--keep", type=int, default=Config.BACKUP_KEEP, help="保留的快照数，0 为不删除")
+
+    listing = commands.add_parser("list", help="列出快照")
+    listing.add_argument("--dir", default=Config.BACKUP_DIR, help="快照目录")
+
+    verify = commands.add_parser("verify", help="校验快照")
+    verify.add_argument("snapshots", nargs="*", help="快照文件（.db.gz），不指定时校验目录中的全部快照")
+    verify.add_argument("--dir", default=Config.BACKUP_DIR, help="快照目录")
+
+    restore = commands.add_parser("restore", help="校验快照并恢复到数据库")
+    restore.add_argument("snapshot", help="快照文件（.db.gz）")
+    restore.add_argument("--db", default=DB_PATH, help="目标数据库路径")
+    restore.add_argument("--force", action="store_true", help="目标数据库已有笔记时覆盖")
+
+    args = parser.parse_args()
+    try:
+        if args.command == "create":
+            create_snapshot(args.db, args.dir, args.keep)
+        elif args.command == "list":
+            for snapshot in list_snapshots(args.dir):
+                print(
+                    f"{snapshot['file']:<36} {_format_time(snapshot['created_at'])}  "
+                    f"{snapshot['size'] / 1024 / 1024:9.1f} MB  {snapshot['notes']:>9} 条笔记  "
+                    f"结构版本 {snapshot['schema_version']}"
+                )
+        elif args.command == "verify":
+            paths = args.snapshots or [snapshot["path"] for snapshot in list_snapshots(args.dir)]
+            failed = 0
+            for path in paths:
+                try:
+                    manifest = verify_snapshot(path)
+                except BackupError as e:
+                    failed += 1
+                    logger.error(f"{path}: {e}")
+                else:
+                    logger.info(f"{path}: 校验通过，{manifest['notes']} 条笔记")
+            if failed:
+                raise BackupError(f"{failed} 个快照校验失败")
+        elif args.command == "restore":
+            restore_snapshot(args.snapshot, args.db, args.force)
+    except BackupError as e:
+        logger.error(str(e))
+        raise SystemExit(1) from e
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+"""YoNote 性能基准测试（在仓库根目录以 python -m benchmarks.<name> 运行）"""
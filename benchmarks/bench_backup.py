@@ -0,0 +1,137 @@
+"""在线备份：持续自动保存时生成快照的耗时、对写入延迟的影响与快照一致性
+
+用法: python -m benchmarks.bench_backup [--notes N] [--threads N] [--duration 秒] [--pages N] [--sleep 秒] [--json PATH]
+
+在临时目录中导入应用并预先写入 --notes 条加密笔记，然后：
+- auto_save/baseline：--threads 个线程持续自动保存 --duration 秒，不做备份
+- auto_save/during_backup：同样的负载，期间连续生成快照（backup.create_snapshot）
+- backup：每个快照的耗时，附带复制重新开始的总次数与快照大小；全部快照最后用
+  verify_snapshot 完整校验，verified 为通过校验的快照数
+
+两次 auto_save 的延迟对比即备份对写入的影响；restarts 应为 0（WAL 下复制不会被写入打断）。
+"""
+
+import argparse
+import os
+import threading
+import time
+
+from benchmarks.bench_load import TestClientTransport, run_load
+from benchmarks.harness import print_result, summarize, temp_workdir, write_results
+from config import Config
+
+
+def backup_config(pages, step_sleep):
+    class BenchConfig(Config):
+        BACKUP_DIR = "data/backups"
+        BACKUP_KEEP = 0
+        BACKUP_PAGES_PER_STEP = pages
+        BACKUP_STEP_SLEEP = step_sleep
+
+    return BenchConfig
+
+
+def prefill(db, count, size):
+    """直接写入 count 条约 size 字节的加密笔记"""
+    from encryption import encrypt_content
+
+    now = int(time.time())
+    with db.connection() as conn:
+        for start in range(0, count, 1000):
+            rows = [
+                (f"bench{i:08d}", encrypt_content(os.urandom(size // 2).hex()), now, now)
+                for i in range(start, min(start + 1000, count))
+            ]
+            db.run_write(
+                conn,
+                lambda c, batch=rows: c.executemany(
+                    "INSERT INTO notes (key, content, public, created_at, updated_at, encrypted, is_empty) "
+                    "VALUES (?, ?, 0, ?, ?, 1, 0)",
+                    batch,
+                ),
+            )
+
+
+def bench_backup(app, threads, duration, config):
+    """负载运行期间连续备份，返回 (负载结果, 快照清单列表)"""
+    from backup import create_snapshot
+
+    load = {}
+    runner = threading.Thread(
+        target=lambda: load.update(run_load(lambda: TestClientTransport(app), threads, duration, ("auto_save",)))
+    )
+    runner.start()
+    manifests = []
+    # 等待各线程准备好笔记、负载开始之后再备份
+    time.sleep(min(1.0, duration / 5))
+    while runner.is_alive():
+        manifests.append(create_snapshot("data/notes.db", config=config))
+    runner.join()
+    return load, manifests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--notes", type=int, default=20000, help="预先写入的笔记数")
+    parser.add_argument("--note-bytes", type=int, default=2000, help="每条预写笔记的正文字节数")
+    parser.add_argument("--threads", type=int, default=8, help="自动保存线程数")
+    parser.add_argument("--duration", type=float, default=10, help="每轮负载持续时间（秒）")
+    parser.add_argument("--pages", type=int, default=Config.BACKUP_PAGES_PER_STEP, help="每步复制的页数")
+    parser.add_argument("--sleep", type=float, default=Config.BACKUP_STEP_SLEEP, help="每步之间暂停（秒）")
+    parser.add_argument("--json", help="结果 JSON 输出路径，- 为标准输出")
+    args = parser.parse_args()
+
+    config = backup_config(args.pages, args.sleep)
+    with temp_workdir():
+        # 应用在导入时打开 data/notes.db，必须先切换到临时目录
+        from app import app, db, limiter
+        from backup import BackupError, verify_snapshot
+
+        limiter.enabled = False
+        prefill(db, args.notes, args.note_bytes)
+
+        results = {}
+        baseline = run_load(lambda: TestClientTransport(app), args.threads, args.duration, ("auto_save",))
+        results["auto_save/baseline"] = baseline["auto_save"]
+        load, manifests = bench_backup(app, args.threads, args.duration, config)
+        results["auto_save/during_backup"] = load["auto_save"]
+
+        verified = 0
+        for manifest in manifests:
+            try:
+                verify_snapshot(os.path.join(config.BACKUP_DIR, manifest["file"]))
+                verified += 1
+            except BackupError as e:
+                print(f"快照 {manifest['file']} 校验失败: {e}")
+        results["backup"] = summarize(
+            [manifest["seconds"] * 1000 for manifest in manifests],
+            restarts=sum(manifest["restarts"] for manifest in manifests),
+            verified=verified,
+            db_size=manifests[-1]["db_size"] if manifests else 0,
+            size=manifests[-1]["size"] if manifests else 0,
+            errors=len(manifests) - verified,
+        )
+
+    for name, result in results.items():
+        print_result(name, result)
+        print(f"{'':<36} errors={result['errors']}")
+    backup = results["backup"]
+    print(
+        f"快照 {backup['n']} 个，通过校验 {backup['verified']} 个，复制重新开始 {backup['restarts']} 次，"
+        f"数据库 {backup['db_size'] / 1024 / 1024:.1f} MB，压缩后 {backup['size'] / 1024 / 1024:.1f} MB"
+    )
+
+    if args.json:
+        params = {
+            "notes": args.notes,
+            "note_bytes": args.note_bytes,
+            "threads": args.threads,
+            "duration": args.duration,
+            "pages": args.pages,
+            "sleep": args.sleep,
+        }
+        write_results(args.json, "backup", params, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""加密/解密单次调用延迟基准：每次派生密钥（旧实现）对比进程级缓存密钥
+
+用法: python -m benchmarks.bench_crypto [--iterations N] [--size BYTES]
+"""
+
+import argparse
+import statistics
+import time
+
+from cryptography.fernet import Fernet
+
+from encryption import KDF_ITERATIONS, SALT, KeyManager, derive_key
+
+
+def legacy_encrypt(secret, content):
+    """旧实现：每次调用都重新派生 PBKDF2 密钥"""
+    return Fernet(derive_key(secret, SALT, KDF_ITERATIONS)).encrypt(content.encode()).decode()
+
+
+def legacy_decrypt(secret, token):
+    return Fernet(derive_key(secret, SALT, KDF_ITERATIONS)).decrypt(token.encode()).decode()
+
+
+def measure(func, iterations):
+    """返回每次调用耗时（毫秒）列表"""
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def summarize(name, samples):
+    samples = sorted(samples)
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    print(
+        f"{name:<24} mean={statistics.mean(samples):9.3f}ms  median={statistics.median(samples):9.3f}ms  p95={p95:9.3f}ms"
+    )
+    return statistics.mean(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20, help="每种场景的调用次数")
+    parser.add_argument("--size", type=int, default=4096, help="笔记内容大小（字节）")
+    args = parser.parse_args()
+
+    secret = "benchmark_secret"
+    content = ("yonote benchmark " * (args.size // 17 + 1))[: args.size]
+    manager = KeyManager(secret=secret).warm_up()
+    token = manager.fernet.encrypt(content.encode()).decode()
+
+    print(f"内容大小 {args.size} 字节，每种场景 {args.iterations} 次")
+    before_enc = summarize("encrypt (每次派生)", measure(lambda: legacy_encrypt(secret, content), args.iterations))
+    before_dec = summarize("decrypt (每次派生)", measure(lambda: legacy_decrypt(secret, token), args.iterations))
+    after_enc = summarize(
+        "encrypt (缓存密钥)", measure(lambda: manager.fernet.encrypt(content.encode()), args.iterations)
+    )
+    after_dec = summarize(
+        "decrypt (缓存密钥)", measure(lambda: manager.fernet.decrypt(token.encode()), args.iterations)
+    )
+    print(f"加速比: encrypt {before_enc / after_enc:.0f}x, decrypt {before_dec / after_dec:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""启动开销：模块导入耗时（python -X importtime）与预热耗时
+
+用法: python -m benchmarks.bench_import [--runs N] [--top N] [--json PATH] [module ...]
+
+每个模块在新的解释器进程中导入 --runs 次（临时工作目录），取 -X importtime 报告中
+该模块的累计耗时，并列出累计耗时最高的依赖；同时测量 app.warm_up() 的耗时，
+即 pre-fork 服务器在 fork 之前替所有 worker 承担的那部分工作。
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+from benchmarks.harness import print_result, summarize, temp_workdir, write_results
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_MODULES = ("app", "clean_empty_notes", "bulk_crypto")
+IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s+)(\S+)$")
+WARM_UP_SCRIPT = "import time, app; start = time.perf_counter(); app.warm_up(); print(time.perf_counter() - start)"
+
+
+def run_python(args):
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT)
+    return subprocess.run(  # noqa: S603 - 参数来自本脚本
+        [sys.executable, *args], capture_output=True, text=True, check=True, env=env
+    )
+
+
+def parse_importtime(stderr):
+    """返回 [(模块名, 自身微秒, 累计微秒, 层级)]"""
+    entries = []
+    for line in stderr.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if match:
+            own, cumulative, indent, name = match.groups()
+            entries.append((name, int(own), int(cumulative), (len(indent) - 1) // 2))
+    return entries
+
+
+def bench_module(module, runs, top):
+    samples = []
+    children = []
+    for _ in range(runs):
+        entries = parse_importtime(run_python(["-X", "importtime", "-c", f"import {module}"]).stderr)
+        # 报告按导入完成顺序输出，模块自身一行之前、上一个顶层模块之后的是它引入的依赖
+        end = next(i for i, (name, _, _, depth) in enumerate(entries) if name == module and depth == 0)
+        start = max((i for i in range(end) if entries[i][3] == 0), default=-1) + 1
+        samples.append(entries[end][2] / 1000)
+        children = [e for e in entries[start:end] if e[3] == 1]
+    # 最后一次导入中累计耗时最高的直接依赖
+    heaviest = sorted(children, key=lambda e: e[2], reverse=True)[:top]
+    return summarize(samples, heaviest=[{"module": name, "cumulative_ms": c / 1000} for name, _, c, _ in heaviest])
+
+
+def bench_warm_up(runs):
+    samples = [float(run_python(["-c", WARM_UP_SCRIPT]).stdout.strip().splitlines()[-1]) * 1000 for _ in range(runs)]
+    return summarize(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("modules", nargs="*", default=list(DEFAULT_MODULES), help="要测量的模块")
+    parser.add_argument("--runs", type=int, default=5, help="每个模块的导入次数")
+    parser.add_argument("--top", type=int, default=10, help="列出累计耗时最高的依赖数")
+    parser.add_argument("--json", help="结果 JSON 输出路径，- 为标准输出")
+    args = parser.parse_args()
+
+    results = {}
+    # 应用使用相对路径 data/notes.db，预热会创建数据库，在临时目录中运行
+    with temp_workdir():
+        for module in args.modules:
+            result = results[f"import/{module}"] = bench_module(module, args.runs, args.top)
+            print_result(f"import {module}", result)
+            for item in result["heaviest"]:
+                print(f"    {item['module']:<48} {item['cumulative_ms']:9.1f}ms")
+        results["app.warm_up"] = bench_warm_up(args.runs)
+        print_result("app.warm_up()", results["app.warm_up"])
+
+    if args.json:
+        params = {"runs": args.runs, "modules": args.modules}
+        write_results(args.json, "import", params, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""多线程负载测试：自动保存、查看、预览、密码验证
+
+用法:
+    python -m benchmarks.bench_load [--threads N] [--duration 秒] [--json PATH]
+    python -m benchmarks.bench_load --url http://127.0.0.1:5005   # 对已启动的服务器
+
+默认在临时目录中导入应用，每个线程使用独立的 Flask 测试客户端（独立会话），
+不经过网络，测量的是应用本身的处理能力；此时速率限制被关闭。指定 --url 时通过
+HTTP 请求本地服务器，速率限制照常生效。
+
+每个线程准备一条普通笔记和一条带密码的笔记，然后在截止时间前轮流执行各个流程，
+统计每个流程的延迟分布、错误数与整体吞吐量。
+"""
+
+import argparse
+import http.client
+import json
+import threading
+import time
+import urllib.parse
+
+from benchmarks.harness import print_result, summarize, temp_workdir, write_results
+
+FLOWS = ("auto_save", "view", "preview", "verify")
+PASSWORD = "benchmark-password"
+
+
+class TestClientTransport:
+    """进程内的 Flask 测试客户端"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, json_body=None, form=None):
+        response = self.client.open(path, method=method, json=json_body, data=form)
+        return response.status_code, response.headers.get("Location")
+
+
+class HttpTransport:
+    """通过 HTTP 请求服务器，手动保存会话 cookie（不依赖 Secure 标记）"""
+
+    def __init__(self, base_url):
+        parsed = urllib.parse.urlsplit(base_url)
+        connection_class = http.client.HTTPSConnection if parsed.scheme == "https" else http.client.HTTPConnection
+        self.connection = connection_class(parsed.netloc, timeout=60)
+        self.prefix = parsed.path.rstrip("/")
+        self.cookies = {}
+
+    def request(self, method, path, json_body=None, form=None):
+        headers = {}
+        body = None
+        if json_body is not None:
+            body = json.dumps(json_body).encode()
+            headers["Content-Type"] = "application/json"
+        elif form is not None:
+            body = urllib.parse.urlencode(form).encode()
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        if self.cookies:
+            headers["Cookie"] = "; ".join(f"{name}={value}" for name, value in self.cookies.items())
+        self.connection.request(method, self.prefix + path, body=body, headers=headers)
+        response = self.connection.getresponse()
+        response.read()
+        for header in response.headers.get_all("Set-Cookie") or []:
+            name, _, rest = header.partition("=")
+            self.cookies[name.strip()] = rest.split(";", 1)[0]
+        return response.status, response.headers.get("Location")
+
+
+def note_key(location):
+    return urllib.parse.urlsplit(location).path.rsplit("/", 1)[-1]
+
+
+def markdown_content(thread_id, n):
+    return f"# 负载测试 {thread_id}\n\n第 {n} 次保存。\n\n- **列表** 项\n- `代码`\n\n```python\nprint({n})\n```\n"
+
+
+class Worker:
+    """一个负载线程：准备自己的笔记后循环执行各流程"""
+
+    def __init__(self, thread_id, transport, flows):
+        self.thread_id = thread_id
+        self.transport = transport
+        self.flows = flows
+        self.samples = {flow: [] for flow in flows}
+        self.errors = dict.fromkeys(flows, 0)
+        self.counter = 0
+
+    def prepare(self):
+        status, location = self.transport.request("GET", "/")
+        if status != 302:
+            raise RuntimeError(f"创建笔记失败: HTTP {status}")
+        self.key = note_key(location)
+        self.transport.request("POST", f"/{self.key}/auto-save", json_body={"content": markdown_content(0, 0)})
+
+        status, location = self.transport.request("GET", "/")
+        self.protected_key = note_key(location)
+        form = {"content": "protected", "password_action": "change", "new_password": PASSWORD}
+        self.transport.request("POST", f"/{self.protected_key}/update", form=form)
+
+    def auto_save(self):
+        content = markdown_content(self.thread_id, self.counter)
+        return self.transport.request("POST", f"/{self.key}/auto-save", json_body={"content": content})[0] == 200
+
+    def view(self):
+        return self.transport.request("GET", f"/{self.key}")[0] == 200
+
+    def preview(self):
+        # 每次内容都不同，测量的是未命中渲染缓存的情况
+        content = markdown_content(self.thread_id, self.counter)
+        return self.transport.request("POST", "/render-markdown", json_body={"content": content})[0] == 200
+
+    def verify(self):
+        form = {"password": PASSWORD, "next_url": f"/{self.protected_key}?view"}
+        status, location = self.transport.request("POST", f"/{self.protected_key}/verify", form=form)
+        # 密码正确时跳转到 next_url，错误或被锁定时跳转回不带参数的笔记页
+        return status == 302 and (location or "").endswith("?view")
+
+    def run(self, deadline):
+        while time.monotonic() < deadline:
+            for flow in self.flows:
+                self.counter += 1
+                start = time.perf_counter()
+                try:
+                    ok = getattr(self, flow)()
+                except Exception:
+                    ok = False
+                self.samples[flow].append((time.perf_counter() - start) * 1000)
+                if not ok:
+                    self.errors[flow] += 1
+
+
+def run_load(make_transport, threads, duration, flows):
+    workers = [Worker(i, make_transport(), flows) for i in range(threads)]
+    for worker in workers:
+        worker.prepare()
+
+    deadline = time.monotonic() + duration
+    started = time.perf_counter()
+    pool = [threading.Thread(target=worker.run, args=(deadline,)) for worker in workers]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    results = {}
+    total = 0
+    for flow in flows:
+        samples = [s for worker in workers for s in worker.samples[flow]]
+        errors = sum(worker.errors[flow] for worker in workers)
+        total += len(samples)
+        results[flow] = summarize(samples, errors=errors, rps=len(samples) / elapsed)
+    results["total"] = summarize(
+        [s for worker in workers for flow in flows for s in worker.samples[flow]],
+        errors=sum(sum(worker.errors.values()) for worker in workers),
+        rps=total / elapsed,
+    )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=8, help="并发线程数")
+    parser.add_argument("--duration", type=float, default=10, help="持续时间（秒）")
+    parser.add_argument("--flows", default=",".join(FLOWS), help="逗号分隔的流程")
+    parser.add_argument("--url", help="服务器地址，不指定时在进程内测试")
+    parser.add_argument("--json", help="结果 JSON 输出路径，- 为标准输出")
+    args = parser.parse_args()
+
+    flows = tuple(args.flows.split(","))
+    unknown = set(flows) - set(FLOWS)
+    if unknown:
+        parser.error(f"未知的流程: {', '.join(sorted(unknown))}")
+
+    if args.url:
+        results = run_load(lambda: HttpTransport(args.url), args.threads, args.duration, flows)
+    else:
+        with temp_workdir():
+            # 应用在导入时打开 data/notes.db，必须先切换到临时目录
+            from app import app, limiter
+
+            limiter.enabled = False
+            results = run_load(lambda: TestClientTransport(app), args.threads, args.duration, flows)
+
+    for name, result in results.items():
+        print_result(name, result)
+        print(f"{'':<36} errors={result['errors']}  rps={result['rps']:.1f}")
+
+    if args.json:
+        params = {"threads": args.threads, "duration": args.duration, "flows": list(flows), "url": args.url}
+        write_results(args.json, "load", params, results)
+
+
+if __name__ == "__main__":
+    main()
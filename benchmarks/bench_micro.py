@@ -0,0 +1,179 @@
+"""单项操作微基准：内容加解密、Markdown 渲染、笔记 key 分配
+
+用法: python -m benchmarks.bench_micro [--iterations N] [--json PATH] [--only crypto,render,keys]
+
+- crypto：encrypt_content / decrypt_content，按内容大小分组
+- render：小文档、大文档、代码密集文档，分别测量不经缓存的渲染和缓存命中
+- keys：在临时数据库中把固定长度的 key 空间预先占满一定比例，测量 create_note
+  的延迟与冲突率（关闭自动加长，观察占用率本身的影响）
+
+全部在临时目录中离线运行，不读写 data/notes.db。
+"""
+
+import argparse
+import os
+import random
+import time
+
+from benchmarks.harness import measure, print_result, summarize, temp_workdir, write_results
+from config import Config
+from db import Database
+from encryption import decrypt_content, encrypt_content, key_manager
+from keypool import KEY_CHARS, KeyAllocator
+from migrations import apply_migrations
+from rendering import render_cache, render_markdown_safe, renderer_pool
+
+CONTENT_SIZES = (256, 4 * 1024, 64 * 1024)
+FILL_LEVELS = (0.0, 0.5, 0.9)
+
+
+def sample_text(size):
+    words = ["yonote", "benchmark", "笔记", "加密", "markdown", "content", "sqlite", "测试"]
+    rng = random.Random(size)  # noqa: S311 - 固定种子保证每次生成相同内容
+    text = " ".join(rng.choice(words) for _ in range(size // 4))
+    return text.encode()[:size].decode(errors="ignore")
+
+
+def small_document():
+    return "# 标题\n\n一段**加粗**和*斜体*文字，带一个[链接](https://example.com)。\n\n- 列表项 1\n- 列表项 2\n"
+
+
+def large_document(sections=50):
+    parts = []
+    for i in range(sections):
+        parts.append(f"## 第 {i} 节\n\n")
+        parts.append("这是一段较长的正文，包含 `行内代码`、**强调** 与 ==高亮==。" * 4 + "\n\n")
+        parts.append(f"- [ ] 任务 {i}\n- [x] 已完成\n\n| 列 A | 列 B |\n| --- | --- |\n| {i} | {i * 2} |\n\n")
+    return "".join(parts)
+
+
+def code_heavy_document(blocks=20):
+    code = "def handler(request):\n    data = request.get_json()\n    return {'ok': True, 'n': len(data)}\n" * 5
+    return "".join(f"### 代码 {i}\n\n```python\n{code}```\n\n" for i in range(blocks))
+
+
+def bench_crypto(iterations):
+    key_manager.warm_up()
+    results = {}
+    for size in CONTENT_SIZES:
+        content = sample_text(size)
+        stored = encrypt_content(content)
+        results[f"encrypt_content/{size}B"] = summarize(measure(lambda c=content: encrypt_content(c), iterations))
+        results[f"decrypt_content/{size}B"] = summarize(measure(lambda s=stored: decrypt_content(s), iterations))
+    return results
+
+
+def bench_render(iterations):
+    documents = {"small": small_document(), "large": large_document(), "code": code_heavy_document()}
+    results = {}
+    for name, content in documents.items():
+        results[f"render/{name}/uncached"] = summarize(
+            measure(lambda c=content: renderer_pool.render(c), iterations), bytes=len(content.encode())
+        )
+        render_cache.clear()
+        render_markdown_safe(content)
+        results[f"render/{name}/cached"] = summarize(
+            measure(lambda c=content: render_markdown_safe(c), iterations), bytes=len(content.encode())
+        )
+    return results
+
+
+class FixedLengthConfig(Config):
+    """不因冲突率自动加长 key，保持测量时的 key 空间不变"""
+
+    KEY_COLLISION_THRESHOLD = 1.0
+
+
+def fill_notes(database, length, ratio):
+    """随机占用指定比例的 length 位 key"""
+    space = len(KEY_CHARS) ** length
+    count = int(space * ratio)
+    if not count:
+        return 0
+    keys = random.sample(range(space), count)  # noqa: S311
+    now = int(time.time())
+
+    def to_key(n):
+        chars = []
+        for _ in range(length):
+            n, r = divmod(n, len(KEY_CHARS))
+            chars.append(KEY_CHARS[r])
+        return "".join(chars)
+
+    rows = ((to_key(n), "", 0, now, now, 1, 1) for n in keys)
+    with database.connection() as conn:
+        conn.executemany(
+            "INSERT INTO notes (key, content, public, created_at, updated_at, encrypted, is_empty) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+        conn.commit()
+    return count
+
+
+def allocate_once(allocator, conn, failures):
+    """创建一条笔记；达到重试上限时计入失败而不是中断测试"""
+
+    def run():
+        try:
+            allocator.create_note(conn, int(time.time()))
+        except RuntimeError:
+            failures.append(1)
+
+    return run
+
+
+def bench_keys(iterations, length):
+    results = {}
+    # 所有占用率共用一个临时目录，分配器的后台线程在测试结束前不会碰到被删除的数据库
+    with temp_workdir():
+        for ratio in FILL_LEVELS:
+            database = Database(os.path.join("data", f"notes-{int(ratio * 100)}.db"))
+            with database.connection() as conn:
+                apply_migrations(conn)
+            filled = fill_notes(database, length, ratio)
+            allocator = KeyAllocator(database, min_length=length, max_length=length, config=FixedLengthConfig)
+            failures = []
+            with database.connection() as conn:
+                samples = measure(allocate_once(allocator, conn, failures), iterations)
+            stats = allocator.stats()
+            attempts = stats["allocated"] + stats["collisions"]
+            results[f"create_note/len{length}/fill{int(ratio * 100)}%"] = summarize(
+                samples,
+                prefilled=filled,
+                collision_rate=stats["collisions"] / attempts if attempts else 0.0,
+                failures=len(failures),
+            )
+    return results
+
+
+SUITES = {
+    "crypto": lambda args: bench_crypto(args.iterations),
+    "render": lambda args: bench_render(args.iterations),
+    "keys": lambda args: bench_keys(args.iterations, args.key_length),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=50, help="每个场景的调用次数")
+    parser.add_argument("--key-length", type=int, default=3, help="key 分配测试使用的固定 key 长度")
+    parser.add_argument("--only", default=",".join(SUITES), help="逗号分隔的测试组")
+    parser.add_argument("--json", help="结果 JSON 输出路径，- 为标准输出")
+    args = parser.parse_args()
+
+    results = {}
+    for name in args.only.split(","):
+        if name not in SUITES:
+            parser.error(f"未知的测试组: {name}")
+        for scenario, result in SUITES[name](args).items():
+            print_result(scenario, result)
+            results[scenario] = result
+
+    if args.json:
+        params = {"iterations": args.iterations, "key_length": args.key_length, "only": args.only}
+        write_results(args.json, "micro", params, results)
+
+
+if __name__ == "__main__":
+    main()
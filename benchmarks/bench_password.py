@@ -0,0 +1,105 @@
+"""密码验证吞吐量：各 bcrypt 成本参数下单核与线程池的验证速度
+
+用法: python -m benchmarks.bench_password [--costs 10,11,12,13] [--iterations N] [--threads N] [--json PATH]
+
+- verify/cost<N>：单线程逐次验证的延迟，per_core_per_s 为单核每秒可完成的验证数
+- pool/cost<N>：通过 PasswordHasher（PASSWORD_HASH_WORKERS=--threads）并发验证，
+  rps 为整体吞吐量，per_core_per_s 为按实际可用核数折算的吞吐量
+- verify/sha256：旧格式（不加盐 SHA-256）的验证，作为对比
+
+用于选择 PASSWORD_HASH_COST：单次验证的延迟即用户输入密码后的等待时间，
+单核吞吐量乘以分配给密码计算的核数即每秒可承受的验证请求数。
+"""
+
+import argparse
+import hashlib
+import os
+import threading
+import time
+
+from benchmarks.harness import measure, print_result, summarize, write_results
+from config import Config
+from passwords import PasswordHasher
+
+PASSWORD = "benchmark-password"
+DEFAULT_COSTS = (10, 11, 12, 13)
+
+
+def hasher_config(cost, workers):
+    class BenchConfig(Config):
+        PASSWORD_HASH_COST = cost
+        PASSWORD_HASH_WORKERS = workers
+        PASSWORD_QUEUE_LIMIT = workers * 4
+
+    return BenchConfig
+
+
+def bench_single(cost, iterations):
+    hasher = PasswordHasher(hasher_config(cost, 1))
+    stored = hasher.hash(PASSWORD)
+    samples = measure(lambda: hasher.verify(PASSWORD, stored), iterations)
+    result = summarize(samples, cost=cost)
+    result["per_core_per_s"] = 1000 / result["mean_ms"]
+    return result
+
+
+def bench_pool(cost, iterations, threads):
+    """threads 个请求线程同时验证，每个线程 iterations 次"""
+    hasher = PasswordHasher(hasher_config(cost, threads))
+    stored = hasher.hash(PASSWORD)
+    samples = []
+    lock = threading.Lock()
+
+    def worker():
+        local = measure(lambda: hasher.verify(PASSWORD, stored), iterations)
+        with lock:
+            samples.extend(local)
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    started = time.perf_counter()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    rps = len(samples) / (time.perf_counter() - started)
+    cores = min(threads, os.cpu_count() or 1)
+    return summarize(samples, cost=cost, threads=threads, rps=rps, per_core_per_s=rps / cores)
+
+
+def bench_legacy(iterations):
+    hasher = PasswordHasher()
+    stored = hashlib.sha256(PASSWORD.encode()).hexdigest()
+    result = summarize(measure(lambda: hasher.verify(PASSWORD, stored), iterations))
+    result["per_core_per_s"] = 1000 / result["mean_ms"]
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--costs", default=",".join(map(str, DEFAULT_COSTS)), help="逗号分隔的 bcrypt 成本参数")
+    parser.add_argument("--iterations", type=int, default=10, help="每个场景（每个线程）的验证次数")
+    parser.add_argument("--threads", type=int, default=os.cpu_count() or 1, help="线程池测试的并发数")
+    parser.add_argument("--json", help="结果 JSON 输出路径，- 为标准输出")
+    args = parser.parse_args()
+
+    costs = [int(c) for c in args.costs.split(",")]
+    invalid = [c for c in costs if not 4 <= c <= 31]
+    if invalid:
+        parser.error(f"bcrypt 成本参数必须在 4-31 之间: {invalid}")
+
+    results = {"verify/sha256": bench_legacy(args.iterations * 100)}
+    for cost in costs:
+        results[f"verify/cost{cost}"] = bench_single(cost, args.iterations)
+        results[f"pool/cost{cost}"] = bench_pool(cost, args.iterations, args.threads)
+
+    for name, result in results.items():
+        print_result(name, result)
+        print(f"{'':<36} per_core={result['per_core_per_s']:.1f}/s")
+
+    if args.json:
+        params = {"costs": costs, "iterations": args.iterations, "threads": args.threads}
+        write_results(args.json, "password", params, results)
+
+
+if __name__ == "__main__":
+    main()
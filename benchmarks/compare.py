@@ -0,0 +1,52 @@
+"""对比两次基准测试的 JSON 结果
+
+用法: python -m benchmarks.compare BASE.json NEW.json [--metric mean_ms] [--threshold 0.1]
+
+按场景输出指标变化，任一场景比基准慢超过 threshold（默认 10%）时以退出码 1 结束，
+可用于在 CI 中发现性能回退。
+"""
+
+import argparse
+import json
+import sys
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--metric", default="mean_ms", help="比较的字段，如 mean_ms / median_ms / p95_ms")
+    parser.add_argument("--threshold", type=float, default=0.1, help="视为回退的相对变化")
+    args = parser.parse_args()
+
+    base, new = load(args.base), load(args.new)
+    if base["suite"] != new["suite"]:
+        parser.error(f"测试组不同: {base['suite']} / {new['suite']}")
+    print(f"{base['environment'].get('commit')} -> {new['environment'].get('commit')}  ({args.metric})")
+
+    regressions = []
+    for scenario, result in new["results"].items():
+        before = base["results"].get(scenario, {}).get(args.metric)
+        after = result.get(args.metric)
+        if before is None or after is None:
+            print(f"{scenario:<36} {'':>12} {after!s:>12}  (新增)")
+            continue
+        change = (after - before) / before if before else 0.0
+        flag = ""
+        if change > args.threshold:
+            flag = "  回退"
+            regressions.append(scenario)
+        print(f"{scenario:<36} {before:12.3f} {after:12.3f} {change:+8.1%}{flag}")
+
+    if regressions:
+        print(f"{len(regressions)} 个场景超过阈值 {args.threshold:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
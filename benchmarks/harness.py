@@ -0,0 +1,107 @@
+"""基准测试公共工具：计时、统计、临时工作目录与 JSON 结果输出
+
+结果文件格式:
+    {"suite": 名称, "environment": {...}, "params": {...}, "results": {场景: {n, mean_ms, ...}}}
+不同提交的结果文件可以用 python -m benchmarks.compare 对比。
+"""
+
+import contextlib
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def measure(func, iterations, warmup=1):
+    """返回每次调用耗时（毫秒）列表，预热调用不计入"""
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def summarize(samples, **extra):
+    """耗时统计（毫秒），extra 中的字段原样附加"""
+    ordered = sorted(samples)
+    result = {
+        "n": len(ordered),
+        "mean_ms": statistics.mean(ordered) if ordered else 0.0,
+        "median_ms": statistics.median(ordered) if ordered else 0.0,
+        "p95_ms": percentile(ordered, 0.95) if ordered else 0.0,
+        "p99_ms": percentile(ordered, 0.99) if ordered else 0.0,
+        "min_ms": ordered[0] if ordered else 0.0,
+        "max_ms": ordered[-1] if ordered else 0.0,
+    }
+    result.update(extra)
+    return result
+
+
+def print_result(name, result):
+    print(
+        f"{name:<36} n={result['n']:<6} mean={result['mean_ms']:9.3f}ms  "
+        f"median={result['median_ms']:9.3f}ms  p95={result['p95_ms']:9.3f}ms"
+    )
+
+
+@contextlib.contextmanager
+def temp_workdir():
+    """切换到带 data/ 子目录的临时目录（应用使用相对路径 data/notes.db），退出时删除"""
+    previous = os.getcwd()
+    path = tempfile.mkdtemp(prefix="yonote-bench-")
+    os.makedirs(os.path.join(path, "data"))
+    os.chdir(path)
+    try:
+        yield path
+    finally:
+        os.chdir(previous)
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def git_commit():
+    repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        output = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],  # noqa: S607
+            cwd=repo,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.stdout.strip()
+
+
+def environment():
+    return {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": int(time.time()),
+    }
+
+
+def write_results(path, suite, params, results):
+    """写入 JSON 结果，path 为 - 时输出到标准输出"""
+    document = {"suite": suite, "environment": environment(), "params": params, "results": results}
+    if path == "-":
+        json.dump(document, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+        return
+    with open(path, "w") as f:
+        json.dump(document, f, ensure_ascii=False, indent=2)
+    print(f"结果已写入 {path}")
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""为已有笔记建立关键词索引（search.py）- 并行、可断点续跑，可在服务运行时执行
+
+按 id 顺序分块读取笔记，解密与分词分发到进程池，主进程逐块增量写入 search_tokens
+（只写入变化的摘要），断点与索引在同一事务中写入 bulk_jobs 表（流程见
+bulk_crypto.run_chunks）。读取之后被修改过的笔记（version 变化）在写事务中重新读取
+并计算摘要，写入的始终是提交时的内容。全部完成后删除已不存在的笔记留下的索引。
+
+服务只在开启 SEARCH_ENABLED 时于保存笔记时更新索引，因此先开启搜索再执行本工具，
+补建完成前搜索结果可能不完整；也可以在停止服务时执行。关闭搜索一段时间或更换
+SEARCH_INDEX_KEY 之后，开启搜索并使用 --reset 重新执行。
+
+用法: python build_search_index.py [--db data/notes.db] [--workers N] [--chunk-size 500] [--reset]
+"""
+
+import argparse
+import logging
+import os
+import time
+
+from bulk_crypto import run_chunks
+from db import Database
+from encryption import DECRYPT_FAILED, decrypt_content, key_manager
+from migrations import apply_migrations
+from search import search_index
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+logger = logging.getLogger("build_search_index")
+
+DB_PATH = "data/notes.db"
+JOB = "search-index"
+
+
+def _plaintext(content, encrypted):
+    return decrypt_content(content) if encrypted else content
+
+
+def index_chunk(rows):
+    """在工作进程中执行：解密并计算摘要
+
+    rows 为 (id, key, version, content, encrypted) 列表，返回 (成功列表, 失败 id 列表)，
+    成功项为 (id, key, version, 摘要集合)。
+    """
+    done, failed = [], []
+    for note_id, key, version, content, encrypted in rows:
+        plaintext = _plaintext(content, encrypted)
+        if plaintext == DECRYPT_FAILED:
+            failed.append(note_id)
+            continue
+        done.append((note_id, key, version, search_index.digests(plaintext)))
+    return done, failed
+
+
+def iter_chunks(conn, start_id, chunk_size):
+    last_id = start_id
+    while True:
+        rows = conn.execute(
+            "SELECT id, key, version, content, encrypted FROM notes WHERE id > ? ORDER BY id LIMIT ?",
+            (last_id, chunk_size),
+        ).fetchall()
+        if not rows:
+            return
+        last_id = rows[-1]["id"]
+        yield last_id, [tuple(row) for row in rows]
+
+
+def build_index(db_path=DB_PATH, workers=None, chunk_size=500, reset=False):
+    """建立索引，返回处理的笔记数"""
+    workers = workers or os.cpu_count() or 1
+    database = Database(db_path)
+    key_manager.warm_up()
+    totals = {"added": 0, "removed": 0, "reindexed": 0}
+    # 本块最近一次写事务的统计；锁冲突重试时 apply 会重新执行，提交后才计入 totals
+    attempt = {}
+
+    def apply(c, batch):
+        attempt.update(added=0, removed=0, reindexed=0)
+        count = 0
+        for note_id, key, version, digests in batch:
+            row = c.execute("SELECT version, content, encrypted FROM notes WHERE id = ?", (note_id,)).fetchone()
+            if row is None:
+                continue
+            if row["version"] != version:
+                # 读取之后被修改：在写事务中按当前内容重新计算，提交前内容不会再变
+                plaintext = _plaintext(row["content"], row["encrypted"])
+                if plaintext == DECRYPT_FAILED:
+                    logger.warning(f"笔记 id={note_id} 无法解密，已跳过")
+                    continue
+                digests = search_index.digests(plaintext)
+                attempt["reindexed"] += 1
+            added, removed = search_index.update(c, key, digests)
+            count += 1
+            attempt["added"] += added
+            attempt["removed"] += removed
+        return count
+
+    def commit(done):
+        for name, value in attempt.items():
+            totals[name] += value
+
+    started = time.monotonic()
+    with database.connection() as conn:
+        apply_migrations(conn)
+        processed, skipped, failed = run_chunks(
+            database,
+            conn,
+            JOB,
+            lambda start_id: iter_chunks(conn, start_id, chunk_size),
+            index_chunk,
+            apply,
+            workers,
+            reset=reset,
+            on_commit=commit,
+        )
+        orphans = database.execute_write(
+            conn, "DELETE FROM search_tokens WHERE key NOT IN (SELECT key FROM notes)"
+        ).rowcount
+
+    elapsed = max(time.monotonic() - started, 1e-9)
+    logger.info(
+        f"索引完成：处理 {processed} 条（其中读取后被修改、重新计算 {totals['reindexed']} 条，已删除跳过 {skipped} 条，"
+        f"解密失败 {failed} 条），新增摘要 {totals['added']} 个，删除 {totals['removed']} 个，"
+        f"清理已删除笔记的摘要 {orphans} 个，耗时 {elapsed:.1f} 秒"
+    )
+    database.close_all()
+    return processed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=DB_PATH, help="数据库路径")
+    parser.add_argument("--workers", type=int, default=None, help="工作进程数（默认 CPU 核数）")
+    parser.add_argument("--chunk-size", type=int, default=500, help="每块处理的笔记数，每块提交一次")
+    parser.add_argument("--reset", action="store_true", help="忽略断点，从头开始")
+    args = parser.parse_args()
+    build_index(args.db, args.workers, args.chunk_size, args.reset)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""批量加密迁移工具 - 并行、可断点续跑，可在服务运行时执行
+
+支持的任务:
+    encrypt     加密 encrypted = 0 的明文笔记（原 migrate_to_encrypted.py）
+    reformat    将旧格式 Fernet base64 文本改写为压缩存储信封（原 rewrite_storage.py）
+    rotate-key  使用当前密钥重新加密全部笔记，需要设置 ENCRYPTION_KEY_PREVIOUS；
+                轮换期间服务同时配置新旧密钥即可正常读写
+
+按 id 顺序分块读取，加解密分发到进程池，主进程按顺序逐块提交，断点与数据在
+同一事务中写入 bulk_jobs 表，中断后重新执行会从上次提交的位置继续；任务完成后
+删除断点，下一次执行（例如下一次密钥轮换）从头开始。
+更新时校验原内容未变，运行中服务同时写入的笔记不会被覆盖。
+
+用法: python bulk_crypto.py <job> [--db data/notes.db] [--workers N] [--chunk-size 500] [--reset] [--dry-run]
+"""
+
+import argparse
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from db import Database
+from encryption import DECRYPT_FAILED, decrypt_content, encrypt_content, key_manager
+from migrations import apply_migrations
+from notes import is_blank
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+logger = logging.getLogger("bulk_crypto")
+
+DB_PATH = "data/notes.db"
+
+# 任务名 -> 选择待处理笔记的条件
+JOBS = {
+    "encrypt": "(encrypted = 0 OR encrypted IS NULL)",
+    "reformat": "encrypted = 1 AND typeof(content) = 'text' AND content != ''",
+    "rotate-key": "encrypted = 1 AND content != ''",
+}
+
+
+def transform_chunk(rows):
+    """在工作进程中执行：解密（如需要）后用当前密钥写成存储信封
+
+    rows 为 (id, content, encrypted) 列表，返回 (成功列表, 失败 id 列表)，
+    成功项为 (id, 原内容, 新内容, is_empty, 明文字节数)。
+    """
+    done, failed = [], []
+    for note_id, content, encrypted in rows:
+        plaintext = decrypt_content(content) if encrypted else content
+        if plaintext == DECRYPT_FAILED:
+            failed.append(note_id)
+            continue
+        plaintext = plaintext or ""
+        done.append((note_id, content, encrypt_content(plaintext), is_blank(plaintext), len(plaintext.encode())))
+    return done, failed
+
+
+def warm_up_worker():
+    # 每个工作进程只派生一次密钥（fork 时已继承则无需重新派生）
+    key_manager.warm_up()
+
+
+def load_checkpoint(conn, job):
+    row = conn.execute("SELECT last_id, rows_done FROM bulk_jobs WHERE job = ?", (job,)).fetchone()
+    return (row["last_id"], row["rows_done"]) if row else (0, 0)
+
+
+def save_checkpoint(conn, job, last_id, count):
+    """在调用方的事务中推进断点，与本块数据一起提交"""
+    conn.execute(
+        "INSERT OR REPLACE INTO bulk_jobs (job, last_id, rows_done, updated_at) "
+        "VALUES (?, ?, COALESCE((SELECT rows_done FROM bulk_jobs WHERE job = ?), 0) + ?, ?)",
+        (job, last_id, job, count, int(time.time())),
+    )
+
+
+def run_chunks(database, conn, job, iter_chunks, work, apply, workers, reset=False, dry_run=False, on_commit=None):
+    """分块并行处理笔记、逐块提交并记录断点的公共流程，返回 (写入数, 跳过数, 失败数)
+
+    iter_chunks(start_id) 按 id 顺序产生 (块内最大 id, 行列表)；work(rows) 在工作进程中执行
+    （须为模块级函数），返回 (结果列表, 失败 id 列表)；apply(conn, 结果列表) 在写事务中写入并
+    返回实际写入数，遇到锁冲突时整个事务会重试，apply 可能被调用多次。dry_run 时不调用 apply，
+    结果全部计为写入。每块提交后调用 on_commit(结果列表)。全部完成后删除断点。
+    """
+    if reset and not dry_run:
+        database.execute_write(conn, "DELETE FROM bulk_jobs WHERE job = ?", (job,))
+    start_id, rows_done = (0, 0) if reset else load_checkpoint(conn, job)
+    if start_id:
+        logger.info(f"{job}: 从断点 id={start_id} 继续，之前已处理 {rows_done} 条")
+
+    written_total = skipped = failed_total = 0
+    started = time.monotonic()
+    with ProcessPoolExecutor(max_workers=workers, initializer=warm_up_worker) as pool:
+        pending = deque()
+        chunks = iter_chunks(start_id)
+        exhausted = False
+        while pending or not exhausted:
+            # 保持每个工作进程有两块待处理，读取与计算重叠进行
+            while not exhausted and len(pending) < workers * 2:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    exhausted = True
+                    break
+                last_id, rows = chunk
+                pending.append((last_id, pool.submit(work, rows)))
+            if not pending:
+                break
+
+            last_id, future = pending.popleft()
+            done, failed = future.result()
+            for note_id in failed:
+                logger.warning(f"{job}: 笔记 id={note_id} 无法解密，已跳过")
+            failed_total += len(failed)
+
+            if dry_run:
+                written = len(done)
+            else:
+
+                def write(c, batch=done, checkpoint=last_id):
+                    count = apply(c, batch)
+                    save_checkpoint(c, job, checkpoint, count)
+                    return count
+
+                written = database.run_write(conn, write)
+
+            written_total += written
+            skipped += len(done) - written
+            if on_commit is not None:
+                on_commit(done)
+            elapsed = max(time.monotonic() - started, 1e-9)
+            logger.info(
+                f"{job}: 已提交到 id={last_id}，处理 {written_total} 条，跳过 {skipped} 条，失败 {failed_total} 条，"
+                f"{written_total / elapsed:.0f} 条/秒"
+            )
+
+    if not dry_run:
+        # 全部完成后删除断点，否则下一次执行会跳过已有的全部笔记
+        database.execute_write(conn, "DELETE FROM bulk_jobs WHERE job = ?", (job,))
+    return written_total, skipped, failed_total
+
+
+def iter_chunks(conn, job, start_id, chunk_size):
+    """按 id 顺序分块读取待处理笔记"""
+    last_id = start_id
+    while True:
+        rows = conn.execute(
+            f"SELECT id, content, encrypted FROM notes WHERE id > ? AND {JOBS[job]} ORDER BY id LIMIT ?",  # noqa: S608
+            (last_id, chunk_size),
+        ).fetchall()
+        if not rows:
+            return
+        last_id = rows[-1]["id"]
+        yield last_id, [(row["id"], row["content"], row["encrypted"]) for row in rows]
+
+
+def apply_transformed(conn, batch):
+    """写入 transform_chunk 的结果，只更新内容未被并发修改的笔记，返回更新数"""
+    count = 0
+    for note_id, old, new, empty, _ in batch:
+        count += conn.execute(
+            "UPDATE notes SET content = ?, encrypted = 1, is_empty = COALESCE(is_empty, ?) WHERE id = ? AND content = ?",
+            (new, empty, note_id, old),
+        ).rowcount
+    return count
+
+
+def run_job(job, db_path=DB_PATH, workers=None, chunk_size=500, reset=False, dry_run=False):
+    """执行批量任务，返回处理的笔记数"""
+    if job == "rotate-key" and not key_manager.has_previous:
+        raise SystemExit("rotate-key 需要设置 ENCRYPTION_KEY_PREVIOUS（以及 ENCRYPTION_SALT_PREVIOUS，如盐值也变化）")
+
+    workers = workers or os.cpu_count() or 1
+    database = Database(db_path)
+    key_manager.warm_up()
+    processed_bytes = 0
+
+    def count_bytes(done):
+        nonlocal processed_bytes
+        processed_bytes += sum(item[4] for item in done)
+
+    started = time.monotonic()
+    with database.connection() as conn:
+        apply_migrations(conn)
+        processed, skipped, failed = run_chunks(
+            database,
+            conn,
+            job,
+            lambda start_id: iter_chunks(conn, job, start_id, chunk_size),
+            transform_chunk,
+            apply_transformed,
+            workers,
+            reset=reset,
+            dry_run=dry_run,
+            on_commit=count_bytes,
+        )
+
+    elapsed = max(time.monotonic() - started, 1e-9)
+    prefix = "[dry-run] " if dry_run else ""
+    logger.info(
+        f"{prefix}{job} 完成：处理 {processed} 条（被并发修改跳过 {skipped} 条，解密失败 {failed} 条），"
+        f"耗时 {elapsed:.1f} 秒，{processed / elapsed:.0f} 条/秒，{processed_bytes / elapsed / 1024 / 1024:.2f} MB/秒"
+    )
+    database.close_all()
+    return processed
+
+
+def main(default_job=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    if default_job is None:
+        parser.add_argument("job", choices=sorted(JOBS), help="任务名")
+    parser.add_argument("--db", default=DB_PATH, help="数据库路径")
+    parser.add_argument("--workers", type=int, default=None, help="工作进程数（默认 CPU 核数）")
+    parser.add_argument("--chunk-size", type=int, default=500, help="每块处理的笔记数，每块提交一次")
+    parser.add_argument("--reset", action="store_true", help="忽略断点，从头开始")
+    parser.add_argument("--dry-run", action="store_true", help="只统计，不写入")
+    args = parser.parse_args()
+    run_job(default_job or args.job, args.db, args.workers, args.chunk_size, args.reset, args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
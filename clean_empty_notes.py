@@ -1,15 +1,23 @@
 #!/usr/bin/env python3
+"""清理创建超过 24 小时的空笔记，以及超过保留期的笔记修订
 
-import base64
+空笔记通过写入时记录的 is_empty 字段和索引查找，不需要解密笔记内容。
+尚未记录 is_empty 的旧笔记会先分批解密回填，之后按 id 游标分批删除，
+每批单独提交，不会长时间持有写锁或把整张表读入内存。
+仍有修订历史的空笔记（例如内容被误清空）保留到修订过期之后再删除。
+
+用法: python clean_empty_notes.py [--db /app/data/notes.db] [--batch-size 500] [--dry-run]
+"""
+
+import argparse
 import logging
-import os
-import sqlite3
 import time
-from datetime import datetime
 
-from cryptography.fernet import Fernet
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from db import Database
+from encryption import DECRYPT_FAILED
+from migrations import apply_migrations
+from notes import is_blank, load_note_content
+from revisions import revision_store
 
 # 配置日志
 logging.basicConfig(
@@ -19,82 +27,117 @@ logger = logging.getLogger("clean_empty_notes")
 
 # 数据库路径
 DB_PATH = "/app/data/notes.db"
+# 空笔记保留时间（秒）
+EMPTY_NOTE_MAX_AGE = 24 * 60 * 60
+
+
+def backfill_is_empty(database, conn, cutoff, batch_size, dry_run=False):
+    """为缺少 is_empty 的旧笔记解密并回填，只处理会被清理判断的笔记，返回 (回填数, 其中空笔记数)"""
+    last_id = 0
+    filled = blanks = 0
+    while True:
+        rows = conn.execute(
+            "SELECT id, content, encrypted FROM notes "
+            "WHERE is_empty IS NULL AND id > ? AND created_at < ? ORDER BY id LIMIT ?",
+            (last_id, cutoff, batch_size),
+        ).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1]["id"]
+
+        updates = []
+        for row in rows:
+            content = load_note_content(row)
+            if content == DECRYPT_FAILED:
+                # 无法解密的笔记按非空处理，避免误删
+                updates.append((0, row["id"]))
+            else:
+                updates.append((is_blank(content), row["id"]))
+
+        if not dry_run:
+            # is_empty 已被并发写入设置时不覆盖
+            database.run_write(
+                conn,
+                lambda c, batch=updates: c.executemany(
+                    "UPDATE notes SET is_empty = ? WHERE id = ? AND is_empty IS NULL", batch
+                ),
+            )
+        filled += len(updates)
+        blanks += sum(flag for flag, _ in updates)
+        logger.info(f"回填 is_empty：已处理到 id={last_id}，累计 {filled} 条")
+    return filled, blanks
+
+
+def delete_empty_notes(database, conn, cutoff, batch_size, dry_run=False):
+    """按 id 游标分批删除空笔记"""
+    last_id = 0
+    deleted = 0
+    while True:
+        rows = conn.execute(
+            "SELECT id FROM notes WHERE is_empty = 1 AND id > ? AND created_at < ? "
+            "AND NOT EXISTS (SELECT 1 FROM revisions WHERE revisions.key = notes.key) ORDER BY id LIMIT ?",
+            (last_id, cutoff, batch_size),
+        ).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1]["id"]
+
+        if dry_run:
+            deleted += len(rows)
+        else:
+            # 删除时再次确认条件，期间被写入内容的笔记不会被删除
+            params = [(row["id"], cutoff) for row in rows]
+            cursor = database.run_write(
+                conn,
+                lambda c, batch=params: c.executemany(
+                    "DELETE FROM notes WHERE id = ? AND is_empty = 1 AND created_at < ? "
+                    "AND NOT EXISTS (SELECT 1 FROM revisions WHERE revisions.key = notes.key)",
+                    batch,
+                ),
+            )
+            deleted += cursor.rowcount
+        logger.info(f"删除空笔记：已处理到 id={last_id}，累计 {deleted} 条")
+    return deleted
+
+
+def clean_empty_notes(db_path=DB_PATH, batch_size=500, dry_run=False):
+    """清理空笔记，返回删除（dry-run 时为待删除）的数量"""
+    prefix = "[dry-run] " if dry_run else ""
+    logger.info(f"{prefix}开始清理空笔记...")
 
-# 加密相关配置（与主应用保持一致）
-ENCRYPTION_KEY = os.environ.get("ENCRYPTION_KEY", "this_is_a_secret_key_please_change_in_production")
-SALT = os.environ.get("ENCRYPTION_SALT", "static_salt_change_this").encode()
-
-
-def get_encryption_key():
-    """从环境变量生成加密密钥"""
-    kdf = PBKDF2HMAC(
-        algorithm=hashes.SHA256(),
-        length=32,
-        salt=SALT,
-        iterations=100000,
-    )
-    key = base64.urlsafe_b64encode(kdf.derive(ENCRYPTION_KEY.encode()))
-    return key
-
-
-def decrypt_content(encrypted_content):
-    """解密笔记内容"""
-    if not encrypted_content:
-        return ""
-
-    try:
-        f = Fernet(get_encryption_key())
-        decrypted = f.decrypt(encrypted_content.encode())
-        return decrypted.decode()
-    except Exception as e:
-        logger.error(f"解密错误: {e}")
-        return "[解密失败]"
-
-
-def get_db_connection():
-    """获取数据库连接"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
-
-
-def clean_empty_notes():
-    """清理空笔记"""
-    logger.info("开始清理空笔记...")
-
-    # 获取当前时间戳
-    current_time = int(time.time())
     # 计算24小时前的时间戳
-    one_day_ago = current_time - (24 * 60 * 60)
+    cutoff = int(time.time()) - EMPTY_NOTE_MAX_AGE
 
-    conn = get_db_connection()
+    database = Database(db_path)
     try:
-        # 获取所有笔记
-        notes = conn.execute("SELECT * FROM notes").fetchall()
-
-        empty_notes_count = 0
-        for note in notes:
-            content = ""
-            # 解密内容
-            if note["encrypted"]:
-                content = decrypt_content(note["content"])
-            else:
-                content = note["content"]
-
-            # 检查内容是否为空且创建时间超过24小时
-            if (not content or content.strip() == "") and note["created_at"] < one_day_ago:
-                # 删除空笔记
-                conn.execute("DELETE FROM notes WHERE key = ?", (note["key"],))
-                empty_notes_count += 1
-                logger.info(f"已删除空笔记: {note['key']}, 创建于: {datetime.fromtimestamp(note['created_at'])}")
-
-        conn.commit()
-        logger.info(f"清理完成，共删除 {empty_notes_count} 个空笔记")
+        with database.connection() as conn:
+            # 确保 is_empty 字段和索引已存在
+            apply_migrations(conn)
+            if not dry_run:
+                pruned = revision_store.prune_expired(database, conn)
+                logger.info(f"清理过期修订 {pruned} 条")
+            _, blanks = backfill_is_empty(database, conn, cutoff, batch_size, dry_run)
+            deleted = delete_empty_notes(database, conn, cutoff, batch_size, dry_run)
+            if dry_run:
+                # dry-run 不回填，未记录 is_empty 的空笔记单独计入
+                deleted += blanks
+        logger.info(f"{prefix}清理完成，共删除 {deleted} 个空笔记")
+        return deleted
     except Exception as e:
         logger.error(f"清理过程中发生错误: {e}")
+        return 0
     finally:
-        conn.close()
+        database.close_all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=DB_PATH, help="数据库路径")
+    parser.add_argument("--batch-size", type=int, default=500, help="每批处理的笔记数")
+    parser.add_argument("--dry-run", action="store_true", help="只统计，不修改笔记数据")
+    args = parser.parse_args()
+    clean_empty_notes(args.db, args.batch_size, args.dry_run)
 
 
 if __name__ == "__main__":
-    clean_empty_notes()
+    main()
@@ -9,15 +9,133 @@ class Config:
     # 数据库配置
     DATABASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "notes.db")
 
+    # SQLite 连接池与 PRAGMA 调优
+    SQLITE_POOL_SIZE = int(os.environ.get("SQLITE_POOL_SIZE", 8))  # 每个进程保留的空闲连接数
+    SQLITE_JOURNAL_MODE = os.environ.get("SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL")  # WAL 下 NORMAL 即可保证一致性
+    SQLITE_BUSY_TIMEOUT = int(os.environ.get("SQLITE_BUSY_TIMEOUT", 5000))  # 毫秒
+    SQLITE_CACHE_SIZE = int(os.environ.get("SQLITE_CACHE_SIZE", -16000))  # 负数表示 KiB
+    SQLITE_MMAP_SIZE = int(os.environ.get("SQLITE_MMAP_SIZE", 64 * 1024 * 1024))  # 字节
+    SQLITE_LOCK_RETRIES = int(os.environ.get("SQLITE_LOCK_RETRIES", 5))  # database is locked 时的重试次数
+    SQLITE_LOCK_RETRY_DELAY = float(os.environ.get("SQLITE_LOCK_RETRY_DELAY", 0.05))  # 首次重试等待（秒），指数退避
+
+    # Markdown 渲染缓存
+    RENDER_CACHE_MAX_BYTES = int(os.environ.get("RENDER_CACHE_MAX_BYTES", 32 * 1024 * 1024))  # 渲染结果缓存容量（字节）
+    RENDER_POOL_SIZE = int(os.environ.get("RENDER_POOL_SIZE", 4))  # 保留的 Markdown/Cleaner 实例数
+
+    # 笔记 key 分配
+    KEY_POOL_SIZE = int(os.environ.get("KEY_POOL_SIZE", 64))  # 预校验 key 池大小
+    KEY_COLLISION_WINDOW = int(os.environ.get("KEY_COLLISION_WINDOW", 200))  # 统计冲突率的最近尝试次数
+    KEY_COLLISION_THRESHOLD = float(os.environ.get("KEY_COLLISION_THRESHOLD", 0.2))  # 超过该冲突率时增加 key 长度
+    KEY_STATS_INTERVAL = int(os.environ.get("KEY_STATS_INTERVAL", 300))  # key 空间占用统计间隔（秒）
+
+    # 生产服务器（gunicorn.conf.py）
+    SERVER_BIND = os.environ.get("SERVER_BIND", "0.0.0.0:5005")
+    SERVER_WORKERS = int(os.environ.get("SERVER_WORKERS", (os.cpu_count() or 1) * 2 + 1))  # worker 进程数
+    SERVER_THREADS = int(os.environ.get("SERVER_THREADS", 4))  # 每个 worker 的线程数
+    SERVER_TIMEOUT = int(os.environ.get("SERVER_TIMEOUT", 30))  # worker 无响应超时（秒）
+    SERVER_GRACEFUL_TIMEOUT = int(os.environ.get("SERVER_GRACEFUL_TIMEOUT", 30))  # 平滑重启时等待请求结束（秒）
+    SERVER_MAX_REQUESTS = int(os.environ.get("SERVER_MAX_REQUESTS", 0))  # worker 处理多少请求后重启，0 为不重启
+    SERVER_WARM_UP = os.environ.get("SERVER_WARM_UP", "1").lower() in ("1", "true", "yes")  # fork 前预热应用
+
+    # 笔记密码哈希（passwords.py），bcrypt 在每个进程独立的线程池中计算
+    PASSWORD_HASH_COST = int(
+        os.environ.get("PASSWORD_HASH_COST", 12)
+    )  # bcrypt 成本参数（4-31），修改后旧哈希在下次验证时更新
+    PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", 2))  # 每个进程同时计算的哈希数
+    PASSWORD_QUEUE_LIMIT = int(os.environ.get("PASSWORD_QUEUE_LIMIT", 16))  # 每个进程排队与计算中的上限，超过时返回 429
+
+    # 速率限制存储，sqlite:// 表示与笔记共用数据库；也可以使用 redis://host:6379 等 limits 支持的存储。
+    # 每个请求（含自动保存与预览）对每条默认限制各递增一次计数，sqlite 存储为数据库写入；
+    # 单进程部署可以用 memory:// 完全避免这些写入
+    RATELIMIT_STORAGE_URI = os.environ.get("RATELIMIT_STORAGE_URI", "sqlite://")
+    # sqlite 存储中每个进程累积计数、合并写入的间隔（秒），0 为每次请求直接写入
+    RATELIMIT_FLUSH_INTERVAL = float(os.environ.get("RATELIMIT_FLUSH_INTERVAL", 1))
+    # 过期的速率限制计数与密码错误记录的清理
+    STATE_SWEEP_INTERVAL = int(os.environ.get("STATE_SWEEP_INTERVAL", 300))  # 清理间隔（秒）
+    STATE_SWEEP_BATCH_SIZE = int(os.environ.get("STATE_SWEEP_BATCH_SIZE", 1000))  # 每批删除的行数
+
+    # 笔记变更通知（SSE / 长轮询），每个连接在 WSGI 模式下占用一个 worker 线程
+    SSE_MAX_CONNECTIONS = int(os.environ.get("SSE_MAX_CONNECTIONS", max(SERVER_THREADS // 2, 1)))  # 每个进程
+    SSE_MAX_PER_NOTE = int(os.environ.get("SSE_MAX_PER_NOTE", 8))  # 每个进程内单条笔记的连接数
+    SSE_HEARTBEAT = int(os.environ.get("SSE_HEARTBEAT", 15))  # 心跳间隔（秒）
+    SSE_MAX_DURATION = int(
+        os.environ.get("SSE_MAX_DURATION", 300)
+    )  # 单个 SSE 连接的最长时间（秒），到期后浏览器自动重连
+    SSE_LONGPOLL_TIMEOUT = int(os.environ.get("SSE_LONGPOLL_TIMEOUT", 25))  # 长轮询最长等待（秒）
+    SSE_POLL_INTERVAL = float(os.environ.get("SSE_POLL_INTERVAL", 2))  # 检查其它 worker 写入的间隔（秒），0 为关闭
+
+    # ASGI 模式（asgi.py）
+    ASGI_THREADS = int(os.environ.get("ASGI_THREADS", 16))  # 运行 Flask 视图的线程数
+    ASGI_MAX_STREAMS = int(os.environ.get("ASGI_MAX_STREAMS", 10000))  # 每个进程的 SSE / 长轮询连接数
+    ASGI_MAX_BODY_SIZE = int(os.environ.get("ASGI_MAX_BODY_SIZE", 16 * 1024 * 1024))  # 请求体上限（字节）
+
+    # 运行指标（/metrics，Prometheus 文本格式），默认关闭
+    METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "0").lower() in ("1", "true", "yes")
+    METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")  # 设置后抓取时需带 Authorization: Bearer <token>
+    METRICS_DIR = os.environ.get("METRICS_DIR", "data/metrics")  # 各进程快照目录，留空时只统计处理抓取的进程
+    METRICS_FLUSH_INTERVAL = float(os.environ.get("METRICS_FLUSH_INTERVAL", 5))  # 进程写入快照的最短间隔（秒）
+
+    # 请求性能剖析（profiling.py），两项都为 0 时关闭
+    PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0))  # 用 cProfile 记录的请求比例（0-1）
+    PROFILE_SLOW_MS = int(os.environ.get("PROFILE_SLOW_MS", 0))  # 超过该耗时（毫秒）的请求保存调用栈采样
+    PROFILE_STACK_INTERVAL = float(os.environ.get("PROFILE_STACK_INTERVAL", 0.005))  # 调用栈采样间隔（秒）
+    PROFILE_DIR = os.environ.get("PROFILE_DIR", "data/profiles")
+    PROFILE_MAX_FILES = int(os.environ.get("PROFILE_MAX_FILES", 200))  # 目录中最多保留的文件数
+
     # 加密配置
     ENCRYPTION_KEY = os.environ.get("ENCRYPTION_KEY") or "this_is_a_secret_key_please_change_in_production"
     ENCRYPTION_SALT = os.environ.get("ENCRYPTION_SALT") or "static_salt_change_this"
 
+    # 存储信封压缩阈值（明文字节数）
+    STORAGE_COMPRESS_MIN_BYTES = int(os.environ.get("STORAGE_COMPRESS_MIN_BYTES", 256))  # 小于该值不压缩
+    STORAGE_ZSTD_MIN_BYTES = int(
+        os.environ.get("STORAGE_ZSTD_MIN_BYTES", 64 * 1024)
+    )  # 达到该值且安装了 zstandard 时使用 zstd
+
+    # 笔记关键词搜索（search.py），默认关闭；开启后用 build_search_index.py 为已有笔记建立索引
+    SEARCH_ENABLED = os.environ.get("SEARCH_ENABLED", "0").lower() in ("1", "true", "yes")
+    SEARCH_INDEX_KEY = os.environ.get(
+        "SEARCH_INDEX_KEY", ""
+    )  # 摘要密钥，留空时由 ENCRYPTION_KEY 派生；更换后需重建索引
+    SEARCH_MAX_TOKENS = int(os.environ.get("SEARCH_MAX_TOKENS", 20000))  # 每条笔记最多索引的词数
+    SEARCH_MAX_RESULTS = int(os.environ.get("SEARCH_MAX_RESULTS", 50))  # 单次查询最多返回的笔记数
+
+    # 笔记修订历史（revisions.py），默认关闭；开启后每次保存额外解密旧正文、计算补丁并加密写入一条修订
+    REVISIONS_ENABLED = os.environ.get("REVISIONS_ENABLED", "0").lower() in ("1", "true", "yes")
+    REVISION_COALESCE_WINDOW = int(
+        os.environ.get("REVISION_COALESCE_WINDOW", 300)
+    )  # 该时间（秒）内的连续保存合并为一条修订
+    REVISION_SNAPSHOT_EVERY = int(os.environ.get("REVISION_SNAPSHOT_EVERY", 20))  # 每隔多少条修订保存一次完整快照
+    REVISION_SNAPSHOT_BYTES = int(
+        os.environ.get("REVISION_SNAPSHOT_BYTES", 256 * 1024)
+    )  # 距上次快照的补丁累计超过该字节数时保存快照
+    REVISION_MAX_PER_NOTE = int(os.environ.get("REVISION_MAX_PER_NOTE", 100))  # 每条笔记保留的修订数
+    REVISION_RETENTION_DAYS = int(os.environ.get("REVISION_RETENTION_DAYS", 30))  # 修订保留天数
+
+    # 在线备份（backup.py），快照目录建议挂载到与 data/ 不同的磁盘
+    BACKUP_DIR = os.environ.get("BACKUP_DIR", "data/backups")
+    BACKUP_INTERVAL = int(os.environ.get("BACKUP_INTERVAL", 0))  # 服务内定时备份间隔（秒），0 为关闭
+    BACKUP_KEEP = int(os.environ.get("BACKUP_KEEP", 7))  # 保留的快照数
+    BACKUP_PAGES_PER_STEP = int(os.environ.get("BACKUP_PAGES_PER_STEP", 1024))  # 每步复制的页数，0 为一步复制
+    BACKUP_STEP_SLEEP = float(os.environ.get("BACKUP_STEP_SLEEP", 0.01))  # 每步之间暂停（秒），降低对请求的 I/O 影响
+    BACKUP_COMPRESS_LEVEL = int(os.environ.get("BACKUP_COMPRESS_LEVEL", 6))  # gzip 压缩级别（1-9）
+
     # 会话配置
     SESSION_COOKIE_SECURE = True
     SESSION_COOKIE_HTTPONLY = True
     SESSION_COOKIE_SAMESITE = "Lax"
     PERMANENT_SESSION_LIFETIME = timedelta(days=7)  # 7天滑动过期
+    # 会话存储：sqlite 时 cookie 只保存会话 ID，数据保存在 sessions 表（sessions.py）；cookie 为 Flask 签名 cookie
+    SESSION_BACKEND = os.environ.get("SESSION_BACKEND", "sqlite")
+    SESSION_MAX_KEYS = int(
+        os.environ.get("SESSION_MAX_KEYS", 200)
+    )  # 每个会话最多保留的已认证笔记数，超出时移除最久未用的
+    SESSION_KEY_TOUCH_INTERVAL = int(
+        os.environ.get("SESSION_KEY_TOUCH_INTERVAL", 300)
+    )  # 更新笔记最近使用时间的最短间隔（秒）
+    SESSION_REFRESH_INTERVAL = int(os.environ.get("SESSION_REFRESH_INTERVAL", 3600))  # 顺延会话过期时间的最短间隔（秒）
+    SESSION_CACHE_SIZE = int(os.environ.get("SESSION_CACHE_SIZE", 4096))  # 每个进程缓存的会话数
 
     # 认证配置
     TOKEN_EXPIRY = timedelta(hours=24)
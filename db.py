@@ -0,0 +1,158 @@
+"""SQLite 连接管理 - 进程内连接池与 PRAGMA 调优
+
+每个进程维护一组长连接，新连接创建时按 config.Config 设置 WAL、synchronous、
+busy_timeout、cache_size、mmap_size。写操作遇到 database is locked 时回滚并按
+指数退避重试。语句执行、提交与锁等待的耗时记录到 metrics。
+
+setup（例如执行迁移）在每个进程第一次借出连接时执行一次，导入模块时不访问数据库。
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from config import Config
+from metrics import observe_stage, registry
+
+logger = logging.getLogger(__name__)
+
+
+def is_locked_error(error):
+    """判断是否为可重试的锁冲突错误"""
+    message = str(error).lower()
+    return isinstance(error, sqlite3.OperationalError) and ("locked" in message or "busy" in message)
+
+
+class TimedConnection(sqlite3.Connection):
+    """记录语句执行与提交耗时的连接（SELECT 的耗时到返回第一行为止）"""
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            observe_stage("sqlite_query", time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            observe_stage("sqlite_query", time.perf_counter() - start)
+
+    def commit(self):
+        start = time.perf_counter()
+        try:
+            super().commit()
+        finally:
+            observe_stage("sqlite_commit", time.perf_counter() - start)
+
+
+class Database:
+    """SQLite 连接池，连接在请求之间复用，fork 之后自动丢弃父进程的连接"""
+
+    def __init__(self, path, config=Config, setup=None):
+        self.path = path
+        self.config = config
+        self._idle = []
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._setup = setup
+        self._setup_lock = threading.Lock()
+        self._ready = setup is None
+
+    def _open(self):
+        """创建新连接并应用 PRAGMA"""
+        cfg = self.config
+        conn = sqlite3.connect(
+            self.path, timeout=cfg.SQLITE_BUSY_TIMEOUT / 1000, check_same_thread=False, factory=TimedConnection
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA busy_timeout = {int(cfg.SQLITE_BUSY_TIMEOUT)}")
+        conn.execute(f"PRAGMA journal_mode = {cfg.SQLITE_JOURNAL_MODE}")
+        conn.execute(f"PRAGMA synchronous = {cfg.SQLITE_SYNCHRONOUS}")
+        conn.execute(f"PRAGMA cache_size = {int(cfg.SQLITE_CACHE_SIZE)}")
+        conn.execute(f"PRAGMA mmap_size = {int(cfg.SQLITE_MMAP_SIZE)}")
+        return conn
+
+    def _acquire(self):
+        with self._lock:
+            # fork 出的子进程不能复用父进程的连接
+            if self._pid != os.getpid():
+                self._idle = []
+                self._pid = os.getpid()
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            conn = self._open()
+        if not self._ready:
+            try:
+                self._prepare(conn)
+            except Exception:
+                conn.close()
+                raise
+        return conn
+
+    def _prepare(self, conn):
+        """首次使用时执行 setup（只执行一次，其它线程等待完成）"""
+        with self._setup_lock:
+            if not self._ready:
+                self._setup(conn)
+                self._ready = True
+
+    def _release(self, conn):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            # 连接状态不可信，直接关闭而不是归还
+            conn.close()
+            return
+        with self._lock:
+            if self._pid == os.getpid() and len(self._idle) < self.config.SQLITE_POOL_SIZE:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    @contextmanager
+    def connection(self):
+        """从连接池借出连接，退出时回滚未提交的事务并归还"""
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            self._release(conn)
+
+    def close_all(self):
+        """关闭所有空闲连接"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def run_write(self, conn, func):
+        """在 conn 上执行 func(conn) 并提交，遇到锁冲突时回滚整个事务并重试"""
+        retries = self.config.SQLITE_LOCK_RETRIES
+        delay = self.config.SQLITE_LOCK_RETRY_DELAY
+        for attempt in range(retries + 1):
+            started = time.perf_counter()
+            try:
+                result = func(conn)
+                conn.commit()
+                return result
+            except sqlite3.OperationalError as e:
+                if conn.in_transaction:
+                    conn.rollback()
+                if not is_locked_error(e) or attempt == retries:
+                    raise
+                logger.warning(f"数据库被锁定，第 {attempt + 1} 次重试: {e}")
+                time.sleep(delay * (2**attempt))
+                # 失败的这次尝试（主要是 busy_timeout 等待）加上退避时间
+                observe_stage("sqlite_lock_wait", time.perf_counter() - started)
+                registry.inc("yonote_sqlite_lock_retries_total")
+
+    def execute_write(self, conn, sql, params=()):
+        """执行单条写语句并提交（带锁冲突重试）"""
+        return self.run_write(conn, lambda c: c.execute(sql, params))
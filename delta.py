@@ -0,0 +1,67 @@
+"""文本增量补丁
+
+补丁是一组顺序应用的替换操作 {"start": int, "end": int, "text": str}，
+每个操作作用于上一个操作的结果。位置以 UTF-16 码元计算，与浏览器端
+JavaScript 字符串下标一致（包含 emoji 等非 BMP 字符时与 Python 下标不同）。
+"""
+
+MAX_PATCH_OPS = 100
+
+
+class PatchError(ValueError):
+    """补丁格式不正确或无法应用到当前文本"""
+
+
+class PatchMismatch(PatchError):
+    """补丁格式正确，但与当前文本对不上（位置越界或拆散了代理对），说明两端文本已不一致"""
+
+
+def utf16_length(text):
+    return len(text.encode("utf-16-le", "surrogatepass")) // 2
+
+
+def apply_patch(text, ops):
+    """将补丁应用到 text，返回新文本"""
+    if not isinstance(ops, list) or len(ops) > MAX_PATCH_OPS:
+        raise PatchError("补丁格式错误")
+
+    units = bytearray(text.encode("utf-16-le", "surrogatepass"))
+    for op in ops:
+        if not isinstance(op, dict):
+            raise PatchError("补丁格式错误")
+        start, end, insert = op.get("start"), op.get("end"), op.get("text", "")
+        if not all(isinstance(v, int) and not isinstance(v, bool) for v in (start, end)) or not isinstance(insert, str):
+            raise PatchError("补丁格式错误")
+        if not 0 <= start <= end <= len(units) // 2:
+            raise PatchMismatch("补丁位置超出范围")
+        units[start * 2 : end * 2] = insert.encode("utf-16-le", "surrogatepass")
+
+    try:
+        # 严格解码，拆散的代理对说明补丁与服务端文本不一致
+        return units.decode("utf-16-le")
+    except UnicodeDecodeError as e:
+        raise PatchMismatch("补丁结果不是有效文本") from e
+
+
+def _common_prefix_length(a, b):
+    # 二分比较切片，长文本上比逐字符循环快得多
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[:mid] == b[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def make_patch(old, new):
+    """生成把 old 变为 new 的补丁（去掉公共前后缀后的一次替换），相同时为空列表"""
+    if old == new:
+        return []
+    prefix = _common_prefix_length(old, new)
+    limit = min(len(old), len(new)) - prefix
+    suffix = _common_prefix_length(old[::-1][:limit], new[::-1][:limit])
+    start = utf16_length(old[:prefix])
+    end = utf16_length(old[: len(old) - suffix])
+    return [{"start": start, "end": end, "text": new[prefix : len(new) - suffix]}]
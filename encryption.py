@@ -0,0 +1,202 @@
+"""笔记内容加密 - 进程级密钥管理与存储信封
+
+PBKDF2 派生 100,000 轮，每次调用耗时数十毫秒。这里在进程内只派生一次密钥，
+并缓存可直接使用的 Fernet 实例，供 app.py 和各个维护脚本共用。
+
+新写入的内容使用二进制存储信封（BLOB）：
+    MAGIC(2 字节 "YN") + 格式版本(1 字节) + 压缩算法(1 字节) + Fernet 令牌（base64 解码后的原始字节）
+明文先按大小选择不压缩 / zlib / zstd 再加密，同时省去 Fernet base64 带来的约 33% 膨胀。
+旧版本写入的 Fernet base64 文本（TEXT）仍可直接读取。
+
+cryptography 在首次派生密钥时才导入，不需要加解密的维护脚本不承担导入开销。
+"""
+
+import base64
+import logging
+import os
+import threading
+import zlib
+
+from config import Config
+from metrics import stage_timer
+
+try:
+    import zstandard
+except ImportError:  # 可选依赖，未安装时大笔记同样使用 zlib
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# 加密相关配置
+ENCRYPTION_KEY = os.environ.get("ENCRYPTION_KEY", "this_is_a_secret_key_please_change_in_production")
+SALT = os.environ.get("ENCRYPTION_SALT", "static_salt_change_this").encode()
+# 密钥轮换期间设置旧的口令和盐值：新内容使用当前密钥加密，旧密钥仍可解密
+PREVIOUS_ENCRYPTION_KEY = os.environ.get("ENCRYPTION_KEY_PREVIOUS")
+PREVIOUS_SALT = os.environ.get("ENCRYPTION_SALT_PREVIOUS", os.environ.get("ENCRYPTION_SALT", "static_salt_change_this"))
+PREVIOUS_SALT = PREVIOUS_SALT.encode()
+KDF_ITERATIONS = 100000
+# 解密失败时返回的占位文本
+DECRYPT_FAILED = "[解密失败]"
+
+# 存储信封
+ENVELOPE_MAGIC = b"YN"
+ENVELOPE_VERSION = 2
+CODEC_NONE = 0
+CODEC_ZLIB = 1
+CODEC_ZSTD = 2
+
+
+def derive_key(secret, salt, iterations=KDF_ITERATIONS):
+    """使用 PBKDF2HMAC 从口令派生 Fernet 密钥"""
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+
+    kdf = PBKDF2HMAC(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=salt,
+        iterations=iterations,
+    )
+    with stage_timer("key_derivation"):
+        return base64.urlsafe_b64encode(kdf.derive(secret.encode()))
+
+
+class KeyManager:
+    """进程级密钥管理器，首次使用时派生密钥，之后复用同一个 Fernet 实例
+
+    配置了旧密钥（previous）时 fernet 为 MultiFernet：加密使用当前密钥，
+    解密依次尝试当前密钥和旧密钥，用于不停服的密钥轮换。
+    """
+
+    def __init__(self, secret=ENCRYPTION_KEY, salt=SALT, iterations=KDF_ITERATIONS, previous=None):
+        self._secret = secret
+        self._salt = salt
+        self._iterations = iterations
+        self._previous = list(previous or [])
+        self._key = None
+        self._fernet = None
+        self._lock = threading.Lock()
+
+    def _ensure(self):
+        # 双重检查，避免多个线程同时派生密钥
+        if self._fernet is None:
+            with self._lock:
+                if self._fernet is None:
+                    from cryptography.fernet import Fernet, MultiFernet
+
+                    key = derive_key(self._secret, self._salt, self._iterations)
+                    fernet = Fernet(key)
+                    if self._previous:
+                        old = [Fernet(derive_key(s, salt, self._iterations)) for s, salt in self._previous]
+                        fernet = MultiFernet([fernet, *old])
+                    self._fernet = fernet
+                    self._key = key
+
+    @property
+    def key(self):
+        """派生后的当前 Fernet 密钥（urlsafe base64）"""
+        self._ensure()
+        return self._key
+
+    @property
+    def fernet(self):
+        """可直接使用的 Fernet / MultiFernet 实例（线程安全，可跨请求复用）"""
+        self._ensure()
+        return self._fernet
+
+    @property
+    def has_previous(self):
+        return bool(self._previous)
+
+    def warm_up(self):
+        """提前派生密钥，适合在进程启动时调用"""
+        self._ensure()
+        return self
+
+    def reset(self, secret=None, salt=None, previous=None):
+        """丢弃缓存的密钥，下次使用时重新派生（可同时替换口令、盐值或旧密钥）"""
+        with self._lock:
+            if secret is not None:
+                self._secret = secret
+            if salt is not None:
+                self._salt = salt
+            if previous is not None:
+                self._previous = list(previous)
+            self._key = None
+            self._fernet = None
+
+
+# 进程内共享的默认密钥管理器
+key_manager = KeyManager(
+    previous=[(PREVIOUS_ENCRYPTION_KEY, PREVIOUS_SALT)] if PREVIOUS_ENCRYPTION_KEY else None,
+)
+
+
+def get_encryption_key():
+    """返回缓存的加密密钥"""
+    return key_manager.key
+
+
+def is_legacy_format(stored):
+    """是否为旧版本的 Fernet base64 文本"""
+    return isinstance(stored, str)
+
+
+def _compress(data):
+    """按明文大小选择压缩算法，压缩无收益时保留原文"""
+    if len(data) < Config.STORAGE_COMPRESS_MIN_BYTES:
+        return CODEC_NONE, data
+    if zstandard is not None and len(data) >= Config.STORAGE_ZSTD_MIN_BYTES:
+        codec, compressed = CODEC_ZSTD, zstandard.ZstdCompressor(level=3).compress(data)
+    else:
+        codec, compressed = CODEC_ZLIB, zlib.compress(data, 6)
+    if len(compressed) >= len(data):
+        return CODEC_NONE, data
+    return codec, compressed
+
+
+def _decompress(codec, data):
+    if codec == CODEC_NONE:
+        return data
+    if codec == CODEC_ZLIB:
+        return zlib.decompress(data)
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("内容使用 zstd 压缩，但未安装 zstandard")
+        return zstandard.ZstdDecompressor().decompress(data)
+    raise ValueError(f"未知的压缩算法: {codec}")
+
+
+def encrypt_content(content):
+    """加密笔记内容，返回存储信封（bytes）"""
+    if not content:
+        return ""
+
+    codec, payload = _compress(content.encode())
+    fernet = key_manager.fernet
+    with stage_timer("encrypt"):
+        token = fernet.encrypt(payload)
+    return ENVELOPE_MAGIC + bytes([ENVELOPE_VERSION, codec]) + base64.urlsafe_b64decode(token)
+
+
+def decrypt_content(encrypted_content):
+    """解密笔记内容，同时兼容存储信封和旧版本的 Fernet base64 文本"""
+    if not encrypted_content:
+        return ""
+
+    try:
+        fernet = key_manager.fernet
+        if is_legacy_format(encrypted_content):
+            with stage_timer("decrypt"):
+                decrypted = fernet.decrypt(encrypted_content.encode())
+            return decrypted.decode()
+
+        if encrypted_content[:2] != ENVELOPE_MAGIC or encrypted_content[2] != ENVELOPE_VERSION:
+            raise ValueError("未知的存储格式")
+        codec = encrypted_content[3]
+        with stage_timer("decrypt"):
+            payload = fernet.decrypt(base64.urlsafe_b64encode(encrypted_content[4:]))
+        return _decompress(codec, payload).decode()
+    except Exception as e:
+        logger.error(f"解密错误: {e}")
+        return DECRYPT_FAILED
@@ -0,0 +1,172 @@
+"""笔记变更通知 - 进程内发布/订阅
+
+auto_save / update_note / delete_note 提交后发布事件，订阅该笔记的 SSE 连接或
+长轮询请求立即收到通知。每个笔记只保留最新一条事件，连续保存会被合并。
+
+SSE 与长轮询在 WSGI 模式下由线程通过 wait() 阻塞等待；ASGI 模式下由事件循环通过
+add_listener() 注册回调，不占用线程。
+
+多 worker 部署时其它进程的写入不会经过本进程的 publish，因此有订阅者时由一个
+后台线程按 SSE_POLL_INTERVAL 用一条查询检查本进程所有被订阅笔记的版本号，
+代替每个标签页各自轮询。
+"""
+
+import json
+import logging
+import threading
+import time
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+UPDATED = "updated"
+DELETED = "deleted"
+
+
+def make_event(kind, version, timestamp):
+    return {"type": kind, "version": version, "timestamp": timestamp}
+
+
+def format_sse(event):
+    """编码为一条 SSE 消息，id 为版本号，重连时浏览器通过 Last-Event-ID 带回"""
+    return f"id: {event['version']}\nevent: note\ndata: {json.dumps(event)}\n\n"
+
+
+class EventHub:
+    """每个进程一个实例，记录被订阅笔记的最新事件"""
+
+    def __init__(self, database, config=Config):
+        self.database = database
+        self.max_connections = config.SSE_MAX_CONNECTIONS
+        self.max_per_note = config.SSE_MAX_PER_NOTE
+        self.poll_interval = config.SSE_POLL_INTERVAL
+        self._cond = threading.Condition()
+        self._latest = {}
+        self._subscribers = {}
+        self._listeners = {}
+        self._poller = None
+        self.connections = 0
+
+    # ---------- 订阅 ----------
+
+    def subscribe(self, key, current, max_connections=None):
+        """登记一个订阅，current 为订阅时笔记的状态；超过连接数限制时返回 False"""
+        max_connections = self.max_connections if max_connections is None else max_connections
+        with self._cond:
+            count = self._subscribers.get(key, 0)
+            if self.connections >= max_connections or count >= self.max_per_note:
+                return False
+            self._subscribers[key] = count + 1
+            self.connections += 1
+            self._merge(key, current)
+        self._ensure_poller()
+        return True
+
+    def unsubscribe(self, key):
+        with self._cond:
+            count = self._subscribers.get(key, 0) - 1
+            self.connections -= 1
+            if count > 0:
+                self._subscribers[key] = count
+            else:
+                self._subscribers.pop(key, None)
+                self._latest.pop(key, None)
+
+    def add_listener(self, key, callback):
+        """注册回调，该笔记有新事件时在发布线程中调用（不持有锁），用于异步等待"""
+        with self._cond:
+            self._listeners.setdefault(key, set()).add(callback)
+
+    def remove_listener(self, key, callback):
+        with self._cond:
+            listeners = self._listeners.get(key)
+            if listeners is not None:
+                listeners.discard(callback)
+                if not listeners:
+                    del self._listeners[key]
+
+    def _pending(self, key, after_version):
+        event = self._latest.get(key)
+        if event is not None and (event["type"] == DELETED or event["version"] > after_version):
+            return event
+        return None
+
+    def pending(self, key, after_version):
+        """返回比 after_version 新的事件（或删除事件），没有时返回 None，不等待"""
+        with self._cond:
+            return self._pending(key, after_version)
+
+    def wait(self, key, after_version, timeout):
+        """等待比 after_version 新的事件（或删除事件），超时返回 None"""
+        with self._cond:
+            if self._cond.wait_for(lambda: self._pending(key, after_version), timeout):
+                return self._latest[key]
+        return None
+
+    # ---------- 发布 ----------
+
+    def _merge(self, key, event):
+        """保留较新的事件，返回是否有变化（调用方持有锁）"""
+        latest = self._latest.get(key)
+        if latest is not None:
+            # 删除是终态；更新事件只接受更高的版本号
+            if latest["type"] == DELETED:
+                return False
+            if event["type"] == UPDATED and event["version"] <= latest["version"]:
+                return False
+        self._latest[key] = event
+        return True
+
+    def publish(self, key, event):
+        """写入提交后调用，没有订阅者时直接返回"""
+        with self._cond:
+            if key not in self._subscribers or not self._merge(key, event):
+                return
+            self._cond.notify_all()
+            listeners = list(self._listeners.get(key, ()))
+        for callback in listeners:
+            callback()
+
+    # ---------- 跨进程轮询 ----------
+
+    def _ensure_poller(self):
+        if self.poll_interval <= 0:
+            return
+        if self._poller is None or not self._poller.is_alive():
+            with self._cond:
+                if self._poller is None or not self._poller.is_alive():
+                    self._poller = threading.Thread(target=self._poll_loop, name="note-events", daemon=True)
+                    self._poller.start()
+
+    def _poll_loop(self):
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                self.poll()
+            except Exception as e:
+                logger.error(f"检查笔记变更失败: {e}")
+
+    def poll(self):
+        """用一条查询检查所有被订阅笔记的版本号，把其它进程的写入转为事件"""
+        with self._cond:
+            keys = list(self._subscribers)
+        if not keys:
+            return
+        with self.database.connection() as conn:
+            rows = conn.execute(
+                "SELECT key, version, updated_at FROM notes WHERE key IN (SELECT value FROM json_each(?))",
+                (json.dumps(keys),),
+            ).fetchall()
+        found = {row["key"]: row for row in rows}
+        for key in keys:
+            row = found.get(key)
+            if row is None:
+                self.publish(key, make_event(DELETED, self._deleted_version(key), int(time.time())))
+            else:
+                self.publish(key, make_event(UPDATED, row["version"], row["updated_at"]))
+
+    def _deleted_version(self, key):
+        with self._cond:
+            latest = self._latest.get(key)
+        return latest["version"] + 1 if latest else 0
@@ -0,0 +1,105 @@
+"""笔记导出 - 以生成器形式流式输出
+
+每个生成器按块产出 bytes，直接作为 Flask Response 的响应体。多笔记 ZIP
+导出时每次只解密一条笔记，写完即释放，不会把整个压缩包放在内存中。
+"""
+
+import time
+import zipfile
+
+from markupsafe import escape
+
+from rendering import render_markdown_safe
+
+CHUNK_SIZE = 64 * 1024
+MAX_ARCHIVE_NOTES = 200
+
+# 导出格式: 扩展名 -> (Content-Type, 说明)
+EXPORT_FORMATS = {
+    "txt": ("text/plain; charset=utf-8", "纯文本"),
+    "md": ("text/markdown; charset=utf-8", "Markdown"),
+    "html": ("text/html; charset=utf-8", "HTML 页面"),
+}
+
+HTML_HEAD = """<!DOCTYPE html>
+<html lang="zh-CN">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>{title}</title>
+<link rel="stylesheet" href="https://cdnjs.cloudflare.com/ajax/libs/github-markdown-css/5.2.0/github-markdown.min.css">
+<style>.markdown-body {{ box-sizing: border-box; max-width: 980px; margin: 0 auto; padding: 45px; }}</style>
+</head>
+<body>
+<article class="markdown-body">
+"""
+HTML_TAIL = """
+</article>
+</body>
+</html>
+"""
+
+
+def iter_text(text, chunk_size=CHUNK_SIZE):
+    """按块产出 UTF-8 编码的文本"""
+    for start in range(0, len(text), chunk_size):
+        yield text[start : start + chunk_size].encode()
+
+
+def iter_html_document(title, content, chunk_size=CHUNK_SIZE):
+    """产出包含渲染后内容的独立 HTML 页面"""
+    yield HTML_HEAD.format(title=escape(title)).encode()
+    yield from iter_text(render_markdown_safe(content), chunk_size)
+    yield HTML_TAIL.encode()
+
+
+def iter_export(fmt, title, content):
+    """按导出格式产出响应体"""
+    if fmt == "html":
+        return iter_html_document(title, content)
+    return iter_text(content)
+
+
+class _ChunkSink:
+    """zipfile 的只写输出目标，写入的数据暂存后由生成器取走"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_zip(entries):
+    """将 (文件名, 加载函数) 序列流式打包为 ZIP
+
+    加载函数在打包到该条目时才调用，返回 bytes 块的可迭代对象，返回 None 时跳过。
+    输出目标不可 seek，zipfile 会使用数据描述符，每写完一块就把压缩后的数据交给客户端。
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, load in entries:
+            chunks = load()
+            if chunks is None:
+                continue
+            info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            with archive.open(info, mode="w") as member:
+                for chunk in chunks:
+                    member.write(chunk)
+                    data = sink.drain()
+                    if data:
+                        yield data
+            data = sink.drain()
+            if data:
+                yield data
+    yield sink.drain()
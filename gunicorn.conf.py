@@ -0,0 +1,37 @@
+"""gunicorn 配置 - 生产环境多进程部署
+
+用法: gunicorn -c gunicorn.conf.py app:app
+
+参数来自 config.Config，可用环境变量覆盖。preload_app 让 master 只导入一次应用，
+worker 通过 fork 共享已加载的代码；SERVER_WARM_UP 开启时 master 在 fork 之前
+还会执行数据库迁移、派生加密密钥并加载 Markdown 渲染器（app.warm_up）。数据库
+连接池会在 fork 后自动丢弃父进程的连接。速率限制与密码错误计数保存在 SQLite 中，
+所有 worker 共享。
+
+平滑重启 worker: kill -HUP <master pid>
+升级代码（preload 模式下 HUP 不会重新导入代码）: kill -USR2 <master pid>，新 master
+启动后再向旧 master 发送 QUIT。
+"""
+
+from config import Config
+
+bind = Config.SERVER_BIND
+workers = Config.SERVER_WORKERS
+threads = Config.SERVER_THREADS
+worker_class = "gthread"
+timeout = Config.SERVER_TIMEOUT
+graceful_timeout = Config.SERVER_GRACEFUL_TIMEOUT
+max_requests = Config.SERVER_MAX_REQUESTS
+max_requests_jitter = Config.SERVER_MAX_REQUESTS // 10
+preload_app = True
+
+accesslog = "-"
+errorlog = "-"
+
+
+def when_ready(server):
+    """master 启动完成、fork worker 之前调用"""
+    if preload_app and Config.SERVER_WARM_UP:
+        from app import warm_up
+
+        warm_up()
@@ -0,0 +1,162 @@
+"""笔记 key 分配器 - 预校验的 key 池与原子占用
+
+后台线程预先生成并校验一批未被使用的随机 key，创建笔记时从池中取出并直接
+INSERT（唯一约束冲突时换一个重试），不再先查询再插入。最近一段时间的冲突率
+超过阈值时自动增加 key 长度；同时定期统计各长度 key 空间的占用情况。
+"""
+
+import logging
+import secrets
+import sqlite3
+import string
+import threading
+import time
+from collections import deque
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+KEY_CHARS = string.ascii_lowercase
+# key 长度上限，冲突率持续偏高时最多扩展到这个长度
+MAX_KEY_LENGTH = 16
+# 单次创建笔记时最多尝试的 key 数
+MAX_ALLOCATE_ATTEMPTS = 20
+
+
+class KeyAllocator:
+    """每个进程一个实例，后台线程在首次使用时启动（兼容 pre-fork 服务器）"""
+
+    def __init__(self, database, min_length=3, max_length=7, config=Config):
+        self.database = database
+        self.min_length = min_length
+        self.max_length = max_length
+        self.pool_size = config.KEY_POOL_SIZE
+        self.collision_threshold = config.KEY_COLLISION_THRESHOLD
+        self.stats_interval = config.KEY_STATS_INTERVAL
+        self._pool = deque()
+        self._recent = deque(maxlen=config.KEY_COLLISION_WINDOW)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._occupancy = {}
+        self._occupancy_at = 0
+        self.allocated = 0
+        self.collisions = 0
+
+    # ---------- key 生成与冲突统计 ----------
+
+    def _random_key(self):
+        length = secrets.randbelow(self.max_length - self.min_length + 1) + self.min_length
+        return "".join(secrets.choice(KEY_CHARS) for _ in range(length))
+
+    def _record(self, collided):
+        """记录一次尝试，冲突率超过阈值时扩展 key 长度"""
+        with self._lock:
+            self._recent.append(collided)
+            if collided:
+                self.collisions += 1
+            window_full = len(self._recent) == self._recent.maxlen
+            rate = sum(self._recent) / len(self._recent)
+            if window_full and rate > self.collision_threshold and self.max_length < MAX_KEY_LENGTH:
+                self.min_length += 1
+                self.max_length += 1
+                self._recent.clear()
+                # 池中的 key 来自拥挤的长度区间，丢弃后按新长度重新生成
+                self._pool.clear()
+                logger.warning(f"key 冲突率 {rate:.0%} 超过阈值，key 长度调整为 {self.min_length}-{self.max_length}")
+
+    # ---------- 后台补充 ----------
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name="key-pool", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                self.refill()
+                if time.time() - self._occupancy_at >= self.stats_interval:
+                    self.refresh_occupancy()
+            except Exception as e:
+                logger.error(f"补充 key 池失败: {e}")
+            self._wakeup.wait(timeout=self.stats_interval)
+
+    def refill(self):
+        """生成新 key 并校验未被使用，补满 key 池"""
+        with self.database.connection() as conn:
+            while len(self._pool) < self.pool_size:
+                key = self._random_key()
+                exists = conn.execute("SELECT 1 FROM notes WHERE key = ?", (key,)).fetchone()
+                self._record(bool(exists))
+                if not exists:
+                    with self._lock:
+                        self._pool.append(key)
+
+    def _next_key(self):
+        with self._lock:
+            key = self._pool.popleft() if self._pool else None
+            low = len(self._pool) < self.pool_size // 2
+        if low:
+            self._wakeup.set()
+        # 池为空时（刚启动或扩展长度后）直接生成，冲突由 INSERT 的唯一约束兜底
+        return key or self._random_key()
+
+    # ---------- 对外接口 ----------
+
+    def create_note(self, conn, current_time):
+        """原子地占用一个 key 并创建空笔记，返回 key"""
+        self._ensure_thread()
+        for _ in range(MAX_ALLOCATE_ATTEMPTS):
+            key = self._next_key()
+            try:
+                self.database.run_write(
+                    conn,
+                    lambda c, k=key: c.execute(
+                        "INSERT INTO notes (key, content, public, created_at, updated_at, encrypted, is_empty) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (k, "", 0, current_time, current_time, 1, 1),
+                    ),
+                )
+            except sqlite3.IntegrityError:
+                if conn.in_transaction:
+                    conn.rollback()
+                self._record(True)
+                continue
+            self._record(False)
+            self.allocated += 1
+            return key
+        raise RuntimeError("无法分配笔记 key，请稍后重试")
+
+    def refresh_occupancy(self):
+        """统计当前长度区间内各长度 key 的占用数（只统计纯小写字母的 key）"""
+        with self.database.connection() as conn:
+            rows = conn.execute(
+                "SELECT length(key) AS n, COUNT(*) AS used FROM notes WHERE key NOT GLOB '*[^a-z]*' GROUP BY n"
+            ).fetchall()
+        with self._lock:
+            self._occupancy = {row["n"]: row["used"] for row in rows}
+            self._occupancy_at = time.time()
+
+    def stats(self):
+        """key 空间占用与分配统计"""
+        with self._lock:
+            lengths = range(self.min_length, self.max_length + 1)
+            space = {n: len(KEY_CHARS) ** n for n in lengths}
+            used = {n: self._occupancy.get(n, 0) for n in lengths}
+            recent = list(self._recent)
+            return {
+                "min_length": self.min_length,
+                "max_length": self.max_length,
+                "pool_size": len(self._pool),
+                "allocated": self.allocated,
+                "collisions": self.collisions,
+                "recent_collision_rate": sum(recent) / len(recent) if recent else 0.0,
+                "fill_ratio": sum(used.values()) / sum(space.values()),
+                "fill_by_length": {n: used[n] / space[n] for n in lengths},
+                "occupancy_updated_at": self._occupancy_at,
+            }
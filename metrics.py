@@ -0,0 +1,300 @@
+"""运行指标 - 计数器与直方图，以 Prometheus 文本格式输出
+
+每个进程在内存中累计指标（一次加锁的字典更新），按 METRICS_FLUSH_INTERVAL 把快照
+写入 METRICS_DIR/metrics-<pid>.json。/metrics 读取目录中所有进程的快照并合并，
+多 worker 部署时也能得到全局数据；已退出进程的快照会合并进 metrics-archive.json，
+计数器不会因为 worker 重启而回退。
+
+阶段耗时统一记录在 yonote_stage_seconds{stage=...} 直方图中，各模块通过
+stage_timer() / observe_stage() 上报。
+"""
+
+import bisect
+import contextlib
+import glob
+import json
+import logging
+import operator
+import os
+import threading
+import time
+
+from config import Config
+
+try:
+    import fcntl
+except ImportError:  # 非 POSIX 平台（Windows）
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# 直方图桶（秒）
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HELP = {
+    "yonote_requests_total": "按端点与状态码统计的请求数",
+    "yonote_request_seconds": "按端点统计的请求耗时（到返回响应头为止）",
+    "yonote_stage_seconds": "各处理阶段耗时：密钥派生、加解密、密码哈希、搜索索引与查询、修订记录、Markdown、bleach、SQLite 语句与锁等待",
+    "yonote_sqlite_lock_retries_total": "写操作遇到 database is locked 后的重试次数",
+    "yonote_password_rejected_total": "密码计算排队超过 PASSWORD_QUEUE_LIMIT 被拒绝（429）的次数",
+    "yonote_backups_total": "服务内定时备份次数（按结果）",
+    "yonote_render_cache_hits_total": "Markdown 渲染缓存命中次数",
+    "yonote_render_cache_misses_total": "Markdown 渲染缓存未命中次数",
+    "yonote_render_cache_hit_ratio": "Markdown 渲染缓存命中率",
+    "yonote_notes": "笔记数量",
+    "yonote_db_size_bytes": "数据库文件大小（含 WAL）",
+    "yonote_backup_age_seconds": "距最新快照的时间（秒）",
+    "yonote_keys_allocated_total": "创建笔记时成功分配的 key 数",
+    "yonote_key_collisions_total": "校验或插入时遇到已被使用的 key 的次数",
+    "yonote_key_max_length": "当前分配的 key 长度上限（冲突率过高时自动增加）",
+    "yonote_key_pool_size": "抓取所在进程 key 池中已校验的 key 数",
+    "yonote_key_collision_rate": "抓取所在进程最近一段时间的 key 冲突率",
+    "yonote_key_fill_ratio": "按长度统计的 key 空间占用比例",
+}
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+class Registry:
+    """进程内的指标集合，线程安全"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._collectors = []
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = (name, _labels(labels))
+        index = bisect.bisect_left(BUCKETS, value)
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                # 各桶计数（最后一个为 +Inf）、总和、次数
+                hist = self._histograms[key] = [[0] * (len(BUCKETS) + 1), 0.0, 0]
+            hist[0][index] += 1
+            hist[1] += value
+            hist[2] += 1
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def register_collector(self, collector):
+        """注册在生成快照时调用的函数，返回 [(计数器名, 标签 dict, 当前累计值)]，用于导出已有的统计"""
+        self._collectors.append(collector)
+
+    def snapshot(self):
+        """可 JSON 序列化的快照"""
+        with self._lock:
+            counters = [[name, list(labels), value] for (name, labels), value in self._counters.items()]
+            histograms = [
+                [name, list(labels), list(hist[0]), hist[1], hist[2]]
+                for (name, labels), hist in self._histograms.items()
+            ]
+        for collector in self._collectors:
+            counters.extend([name, list(_labels(labels)), value] for name, labels, value in collector())
+        return {"counters": counters, "histograms": histograms}
+
+
+def merge(snapshots):
+    """合并多个进程的快照"""
+    counters = {}
+    histograms = {}
+    for snap in snapshots:
+        for name, labels, value in snap.get("counters", []):
+            key = (name, tuple(tuple(pair) for pair in labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, buckets, total, count in snap.get("histograms", []):
+            key = (name, tuple(tuple(pair) for pair in labels))
+            hist = histograms.get(key)
+            if hist is None:
+                histograms[key] = [list(buckets), total, count]
+            else:
+                hist[0] = list(map(operator.add, hist[0], buckets))
+                hist[1] += total
+                hist[2] += count
+    return {
+        "counters": [[name, list(labels), value] for (name, labels), value in counters.items()],
+        "histograms": [[name, list(labels), *hist] for (name, labels), hist in histograms.items()],
+    }
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class MultiProcessStore:
+    """把各进程的快照写入共享目录，读取时合并"""
+
+    ARCHIVE = "metrics-archive.json"
+
+    def __init__(self, directory, flush_interval):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._flushed_at = 0.0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, pid):
+        return os.path.join(self.directory, f"metrics-{pid}.json")
+
+    @staticmethod
+    def _write(path, snapshot):
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp, path)
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def maybe_flush(self, registry):
+        if time.monotonic() - self._flushed_at >= self.flush_interval:
+            self.flush(registry)
+
+    def flush(self, registry):
+        self._flushed_at = time.monotonic()
+        self._write(self._path(os.getpid()), registry.snapshot())
+
+    def _fold_dead(self):
+        """把已退出进程的快照合并进归档文件（加文件锁，避免并发抓取时重复合并）"""
+        with open(os.path.join(self.directory, ".lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            archive_path = os.path.join(self.directory, self.ARCHIVE)
+            dead = []
+            for path in glob.glob(os.path.join(self.directory, "metrics-*.json")):
+                pid = os.path.basename(path)[len("metrics-") : -len(".json")]
+                if pid.isdigit() and not _pid_alive(int(pid)):
+                    dead.append(path)
+            if dead:
+                snapshots = [self._read(archive_path), *(self._read(path) for path in dead)]
+                self._write(archive_path, merge(snapshots))
+                for path in dead:
+                    with contextlib.suppress(OSError):
+                        os.remove(path)
+
+    def collect(self, registry):
+        """写入本进程最新快照后合并所有进程的数据"""
+        self.flush(registry)
+        self._fold_dead()
+        paths = glob.glob(os.path.join(self.directory, "metrics-*.json"))
+        return merge(self._read(path) for path in paths)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels, extra=()):
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+def format_metrics(snapshot, gauges=()):
+    """输出 Prometheus 文本格式，gauges 为 [(名称, 标签 dict, 值)]"""
+    lines = []
+    typed = set()
+
+    def header(name, kind):
+        if name not in typed:
+            typed.add(name)
+            if name in HELP:
+                lines.append(f"# HELP {name} {HELP[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+
+    for name, labels, value in sorted(snapshot["counters"], key=lambda item: (item[0], item[1])):
+        header(name, "counter")
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+
+    for name, labels, buckets, total, count in sorted(snapshot["histograms"], key=lambda item: (item[0], item[1])):
+        header(name, "histogram")
+        cumulative = 0
+        for index, bucket in enumerate(buckets):
+            cumulative += bucket
+            bound = BUCKETS[index] if index < len(BUCKETS) else "+Inf"
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+        lines.append(f"{name}_count{_format_labels(labels)} {count}")
+
+    for name, labels, value in gauges:
+        header(name, "gauge")
+        lines.append(f"{name}{_format_labels(_labels(labels))} {value}")
+
+    return "\n".join(lines) + "\n"
+
+
+# 进程内共享的指标集合
+registry = Registry()
+# 应用在请求结束时把端点名写入 environ 的这个键（请求上下文结束后 request 对象不再可用）
+ENDPOINT_ENVIRON = "yonote.endpoint"
+
+
+def observe_stage(stage, seconds):
+    registry.observe("yonote_stage_seconds", seconds, stage=stage)
+
+
+@contextlib.contextmanager
+def stage_timer(stage):
+    """记录代码块耗时，异常时同样记录"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start)
+
+
+class MetricsMiddleware:
+    """WSGI 中间件：按 Flask 端点统计请求数与耗时"""
+
+    def __init__(self, wsgi_app, store=None):
+        self.wsgi_app = wsgi_app
+        self.store = store
+
+    def __call__(self, environ, start_response):
+        start = time.perf_counter()
+        status = []
+
+        def recording_start_response(status_line, headers, exc_info=None):
+            status.append(status_line.split(" ", 1)[0])
+            return start_response(status_line, headers, exc_info)
+
+        try:
+            return self.wsgi_app(environ, recording_start_response)
+        finally:
+            endpoint = environ.get(ENDPOINT_ENVIRON) or "unmatched"
+            registry.inc("yonote_requests_total", endpoint=endpoint, status=status[0] if status else "500")
+            registry.observe("yonote_request_seconds", time.perf_counter() - start, endpoint=endpoint)
+            if self.store is not None:
+                self.store.maybe_flush(registry)
+
+
+def create_store(config=Config):
+    """按配置创建多进程存储，未启用或未设置目录时返回 None（只统计本进程）"""
+    if config.METRICS_ENABLED and config.METRICS_DIR:
+        if fcntl is None:
+            # 合并已退出进程的快照需要文件锁；这类平台也没有 pre-fork 服务器
+            logger.warning("当前平台不支持文件锁，忽略 METRICS_DIR，只统计本进程")
+            return None
+        return MultiProcessStore(config.METRICS_DIR, config.METRICS_FLUSH_INTERVAL)
+    return None
@@ -0,0 +1,200 @@
+"""数据库结构迁移 - 基于 PRAGMA user_version 的版本化迁移
+
+迁移按版本号顺序执行，每个迁移在独立的 IMMEDIATE 事务中运行并同时更新
+user_version，多个进程同时启动时只会有一个真正执行。新增索引或字段时在文件末尾
+追加新的 @migration 函数即可，已发布的迁移不要修改。
+"""
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# (版本号, 说明, 迁移函数)，按版本号升序
+MIGRATIONS = []
+
+
+def migration(version, description):
+    """注册一个迁移，版本号必须连续递增"""
+
+    def decorator(func):
+        expected = len(MIGRATIONS) + 1
+        if version != expected:
+            raise ValueError(f"迁移版本号应为 {expected}，实际为 {version}")
+        MIGRATIONS.append((version, description, func))
+        return func
+
+    return decorator
+
+
+def column_names(conn, table):
+    """返回表的字段名列表"""
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def get_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def latest_version():
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+def apply_migrations(conn):
+    """执行所有未应用的迁移，返回本次应用的版本号列表"""
+    if get_version(conn) >= latest_version():
+        return []
+
+    applied = []
+    for version, description, func in MIGRATIONS:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # 拿到写锁后重新读取版本，其它进程可能已经完成了迁移
+            if get_version(conn) >= version:
+                conn.rollback()
+                continue
+            logger.info(f"应用数据库迁移 {version}: {description}")
+            func(conn)
+            conn.execute(f"PRAGMA user_version = {int(version)}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(version)
+    return applied
+
+
+@migration(1, "创建 notes 与 lockouts 表")
+def _create_base_tables(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS notes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        key TEXT UNIQUE NOT NULL,
+        content TEXT NOT NULL,
+        password TEXT,
+        public BOOLEAN DEFAULT 0,
+        created_at INTEGER NOT NULL,
+        updated_at INTEGER NOT NULL,
+        encrypted BOOLEAN DEFAULT 1
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS lockouts (
+        key TEXT PRIMARY KEY,
+        ip_address TEXT NOT NULL,
+        locked_until INTEGER NOT NULL
+    )
+    """)
+
+
+@migration(2, "旧数据库补充 encrypted 字段")
+def _add_encrypted_column(conn):
+    # 早期版本的 notes 表没有 encrypted 字段，已有内容均为明文
+    if "encrypted" not in column_names(conn, "notes"):
+        conn.execute("ALTER TABLE notes ADD COLUMN encrypted BOOLEAN DEFAULT 0")
+
+
+@migration(3, "notes 增加 version 字段，用于自动保存的乐观并发控制")
+def _add_version_column(conn):
+    conn.execute("ALTER TABLE notes ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+
+
+@migration(4, "notes 增加 is_empty 字段及索引，清理空笔记时无需解密")
+def _add_is_empty_column(conn):
+    # NULL 表示尚未记录，由 clean_empty_notes.py 分批回填
+    conn.execute("ALTER TABLE notes ADD COLUMN is_empty BOOLEAN")
+    conn.execute("UPDATE notes SET is_empty = 1 WHERE content = ''")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_notes_is_empty ON notes (is_empty, id)")
+
+
+@migration(5, "创建 bulk_jobs 表，记录批量加密任务的断点")
+def _create_bulk_jobs_table(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS bulk_jobs (
+        job TEXT PRIMARY KEY,
+        last_id INTEGER NOT NULL DEFAULT 0,
+        rows_done INTEGER NOT NULL DEFAULT 0,
+        updated_at INTEGER NOT NULL
+    )
+    """)
+
+
+@migration(6, "创建 counters 表，保存跨进程共享的速率限制与密码错误计数")
+def _create_counters_table(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS counters (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL,
+        expires_at REAL NOT NULL
+    )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_counters_expires_at ON counters (expires_at)")
+
+
+@migration(7, "lockouts 改为按 (key, ip_address) 记录错误次数与锁定，并为过期清理建立索引")
+def _rebuild_lockouts_table(conn):
+    # 旧表以 key 为主键，不同 IP 的锁定会互相覆盖；locked_until 同时作为记录的过期时间
+    conn.execute("""
+    CREATE TABLE lockouts_new (
+        key TEXT NOT NULL,
+        ip_address TEXT NOT NULL,
+        failures INTEGER NOT NULL DEFAULT 0,
+        locked BOOLEAN NOT NULL DEFAULT 0,
+        locked_until INTEGER NOT NULL,
+        PRIMARY KEY (key, ip_address)
+    )
+    """)
+    conn.execute(
+        "INSERT INTO lockouts_new (key, ip_address, failures, locked, locked_until) "
+        "SELECT key, ip_address, 0, 1, locked_until FROM lockouts"
+    )
+    conn.execute("DROP TABLE lockouts")
+    conn.execute("ALTER TABLE lockouts_new RENAME TO lockouts")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_lockouts_locked_until ON lockouts (locked_until)")
+
+
+@migration(8, "创建 sessions 表，保存服务端会话数据")
+def _create_sessions_table(conn):
+    # id 为会话 cookie 的 SHA-256，数据库泄露时无法直接冒用会话
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS sessions (
+        id TEXT PRIMARY KEY,
+        data TEXT NOT NULL,
+        revision INTEGER NOT NULL DEFAULT 1,
+        expires_at REAL NOT NULL
+    )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions (expires_at)")
+
+
+@migration(9, "创建 search_tokens 表，保存笔记关键词的 HMAC 摘要")
+def _create_search_tokens_table(conn):
+    # 查询按 (token, key) 主键匹配，保存笔记时按 key 索引读取旧摘要做增量更新
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS search_tokens (
+        token BLOB NOT NULL,
+        key TEXT NOT NULL,
+        PRIMARY KEY (token, key)
+    ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_search_tokens_key ON search_tokens (key)")
+
+
+@migration(10, "创建 revisions 表，保存笔记修订历史（加密的快照与增量补丁）")
+def _create_revisions_table(conn):
+    # kind：0 为完整快照，1 为相对同一笔记上一条修订的补丁；chain_* 记录距最近快照的补丁数与字节数
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS revisions (
+        id INTEGER PRIMARY KEY,
+        key TEXT NOT NULL,
+        version INTEGER NOT NULL,
+        kind INTEGER NOT NULL,
+        data BLOB NOT NULL,
+        size INTEGER NOT NULL,
+        chain_length INTEGER NOT NULL,
+        chain_bytes INTEGER NOT NULL,
+        created_at INTEGER NOT NULL,
+        updated_at INTEGER NOT NULL
+    )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_revisions_key ON revisions (key, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_revisions_updated_at ON revisions (updated_at)")
@@ -0,0 +1,13 @@
+"""笔记数据的通用辅助函数，供 app.py 与维护脚本共用"""
+
+from encryption import decrypt_content
+
+
+def is_blank(content):
+    """笔记是否为空（只含空白字符），写入时记录，清理脚本无需解密即可判断"""
+    return 0 if content and content.strip() else 1
+
+
+def load_note_content(note):
+    """返回笔记明文"""
+    return decrypt_content(note["content"]) if note["encrypted"] else note["content"]
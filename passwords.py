@@ -0,0 +1,126 @@
+"""笔记密码哈希 - 自描述的哈希格式与有界的计算线程池
+
+存储格式：
+    bcrypt-sha256$<bcrypt 哈希>   当前格式，密码先做 SHA-256 + base64 再交给 bcrypt
+                                   （避开 bcrypt 只取前 72 字节的限制），成本参数写在 bcrypt 哈希中
+    64 位十六进制                  旧格式：不加盐的 SHA-256，只用于验证
+
+旧格式或成本参数与 PASSWORD_HASH_COST 不同的哈希由调用方在验证成功后重新计算
+（needs_rehash）。bcrypt 每次计算耗时数百毫秒，在每个进程独立的线程池中执行，
+同时计算的数量由 PASSWORD_HASH_WORKERS 限制，请求线程只等待结果；排队与执行中的
+计算超过 PASSWORD_QUEUE_LIMIT 时直接抛出 PasswordBusy，由调用方返回 429。
+
+bcrypt 在第一次计算时才导入。
+"""
+
+import base64
+import hashlib
+import hmac
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from config import Config
+from metrics import registry, stage_timer
+
+SCHEME = "bcrypt-sha256"
+LEGACY_SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+class PasswordBusy(Exception):
+    """排队中的密码计算超过 PASSWORD_QUEUE_LIMIT"""
+
+
+def identify(stored):
+    """返回哈希格式：bcrypt-sha256 / sha256，无法识别时为 None"""
+    if not stored:
+        return None
+    if stored.startswith(SCHEME + "$"):
+        return SCHEME
+    if LEGACY_SHA256_RE.match(stored):
+        return "sha256"
+    return None
+
+
+def _prehash(password):
+    return base64.b64encode(hashlib.sha256(password.encode()).digest())
+
+
+def _bcrypt_hash(password, cost):
+    import bcrypt
+
+    with stage_timer("password_hash"):
+        return bcrypt.hashpw(_prehash(password), bcrypt.gensalt(cost)).decode()
+
+
+def _bcrypt_verify(password, hashed):
+    import bcrypt
+
+    with stage_timer("password_verify"):
+        try:
+            return bcrypt.checkpw(_prehash(password), hashed.encode())
+        except ValueError:  # 损坏的哈希
+            return False
+
+
+def bcrypt_cost(stored):
+    """当前格式哈希中的成本参数（$2b$12$... 中的 12）"""
+    try:
+        return int(stored[len(SCHEME) + 1 :].split("$")[2])
+    except (IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    """每个进程一个实例，线程池在首次计算时创建，fork 之后重新创建"""
+
+    def __init__(self, config=Config):
+        self.cost = config.PASSWORD_HASH_COST
+        self.workers = config.PASSWORD_HASH_WORKERS
+        self.queue_limit = config.PASSWORD_QUEUE_LIMIT
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self._pending = 0
+
+    def _run(self, func, *args):
+        """在线程池中执行 func 并等待结果；排队与执行中的数量超过上限时抛出 PasswordBusy"""
+        with self._lock:
+            if self._pending >= self.queue_limit:
+                registry.inc("yonote_password_rejected_total")
+                raise PasswordBusy()
+            # fork 出的子进程中线程池的线程已不存在
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password")
+                self._pid = os.getpid()
+            self._pending += 1
+            executor = self._executor
+        try:
+            return executor.submit(func, *args).result()
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def hash(self, password):
+        """计算当前格式的哈希"""
+        return f"{SCHEME}${self._run(_bcrypt_hash, password, self.cost)}"
+
+    def verify(self, password, stored):
+        """验证密码，旧格式直接在当前线程比较"""
+        if not password:
+            return False
+        scheme = identify(stored)
+        if scheme == SCHEME:
+            return self._run(_bcrypt_verify, password, stored[len(SCHEME) + 1 :])
+        if scheme == "sha256":
+            # 使用时序安全的比较函数，防止时序攻击
+            return hmac.compare_digest(stored, hashlib.sha256(password.encode()).hexdigest())
+        return False
+
+    def needs_rehash(self, stored):
+        """旧格式或成本参数不同的哈希需要在验证成功后重新计算"""
+        return identify(stored) != SCHEME or bcrypt_cost(stored) != self.cost
+
+
+password_hasher = PasswordHasher()
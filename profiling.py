@@ -0,0 +1,171 @@
+"""请求性能剖析 - 按比例采样与慢请求捕获（默认关闭）
+
+两种方式可以同时开启：
+- PROFILE_SAMPLE_RATE：按比例挑选请求，用 cProfile 完整记录视图执行过程，
+  保存为 .prof（pstats 格式，可用 snakeviz / python -m pstats 查看）
+- PROFILE_SLOW_MS：后台线程每隔 PROFILE_STACK_INTERVAL 秒采样一次处理中请求的
+  调用栈，请求超过阈值时保存为 .folded（折叠栈格式，可直接交给 flamegraph.pl /
+  speedscope 生成火焰图），未超过阈值的采样直接丢弃
+
+文件名只包含时间、端点、耗时和笔记 key 的 HMAC 摘要，文件内容只有函数名与源码位置，
+不含笔记内容或请求参数。目录中最多保留 PROFILE_MAX_FILES 个文件，超出时删除最旧的。
+剖析覆盖 before_request 到 teardown_request，流式响应的响应体生成不计入。
+"""
+
+import contextlib
+import cProfile
+import hashlib
+import hmac
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+PROFILE_SUFFIXES = (".prof", ".folded")
+SAFE_NAME_RE = re.compile(r"[^A-Za-z0-9_.-]")
+
+
+class Capture:
+    """一个请求的剖析状态"""
+
+    __slots__ = ("started", "profile", "stacks")
+
+    def __init__(self, started, profile, stacks):
+        self.started = started
+        self.profile = profile
+        self.stacks = stacks
+
+
+def frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def fold_stack(frame):
+    """由栈顶帧生成折叠栈（根在前，以分号分隔）"""
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame.f_code))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class RequestProfiler:
+    """每个进程一个实例，栈采样线程在首次需要时启动（兼容 pre-fork 服务器）"""
+
+    def __init__(self, secret, config=Config):
+        self.secret = secret.encode() if isinstance(secret, str) else secret
+        self.directory = config.PROFILE_DIR
+        self.sample_rate = config.PROFILE_SAMPLE_RATE
+        self.slow_seconds = config.PROFILE_SLOW_MS / 1000
+        self.interval = config.PROFILE_STACK_INTERVAL
+        self.max_files = config.PROFILE_MAX_FILES
+        self._active = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def enabled(self):
+        return self.sample_rate > 0 or self.slow_seconds > 0
+
+    # ---------- 请求生命周期 ----------
+
+    def start(self):
+        """请求开始时调用，返回剖析状态；本次请求不剖析时返回 None"""
+        profile = None
+        if self.sample_rate > 0 and random.random() < self.sample_rate:  # noqa: S311 - 采样不需要密码学随机数
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # 同一时间只能有一个 cProfile 在运行（其它线程正在剖析）
+                profile = None
+        stacks = Counter() if self.slow_seconds > 0 else None
+        if profile is None and stacks is None:
+            return None
+        capture = Capture(time.perf_counter(), profile, stacks)
+        if stacks is not None:
+            with self._lock:
+                self._active[threading.get_ident()] = capture
+            self._ensure_thread()
+        return capture
+
+    def finish(self, capture, endpoint, note_key=None):
+        """请求结束时调用，按采样或耗时决定是否写入文件"""
+        if capture.profile is not None:
+            capture.profile.disable()
+        if capture.stacks is not None:
+            with self._lock:
+                self._active.pop(threading.get_ident(), None)
+        elapsed = time.perf_counter() - capture.started
+        slow = capture.stacks is not None and elapsed >= self.slow_seconds
+        if capture.profile is None and not slow:
+            return
+        try:
+            self._save(capture, slow, endpoint, note_key, elapsed)
+        except OSError as e:
+            logger.error(f"保存性能剖析失败: {e}")
+
+    # ---------- 栈采样 ----------
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                active = list(self._active.items())
+            if not active:
+                continue
+            frames = sys._current_frames()
+            stacks = [(capture, fold_stack(frames[ident])) for ident, capture in active if ident in frames]
+            # 在锁内累加，finish() 移出登记后采样结果不再变化
+            with self._lock:
+                for capture, stack in stacks:
+                    capture.stacks[stack] += 1
+
+    # ---------- 输出 ----------
+
+    def note_digest(self, note_key):
+        """笔记 key 的 HMAC 摘要，用于关联同一笔记的多个剖析文件而不泄露 key"""
+        return hmac.new(self.secret, note_key.encode(), hashlib.sha256).hexdigest()[:12]
+
+    def _save(self, capture, slow, endpoint, note_key, elapsed):
+        os.makedirs(self.directory, exist_ok=True)
+        parts = [time.strftime("%Y%m%d-%H%M%S"), f"{os.getpid()}", SAFE_NAME_RE.sub("_", endpoint or "unmatched")]
+        if note_key:
+            parts.append(self.note_digest(note_key))
+        parts.append(f"{int(elapsed * 1000)}ms")
+        base = os.path.join(self.directory, "-".join(parts))
+        if capture.profile is not None:
+            capture.profile.dump_stats(f"{base}.prof")
+        if slow and capture.stacks:
+            with open(f"{base}.folded", "w") as f:
+                for stack, count in capture.stacks.items():
+                    f.write(f"{stack} {count}\n")
+        self._rotate()
+
+    def _rotate(self):
+        """只保留最新的 max_files 个文件"""
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(PROFILE_SUFFIXES):
+                    with contextlib.suppress(OSError):
+                        entries.append((entry.stat().st_mtime, entry.path))
+        entries.sort()
+        for _, path in entries[: max(len(entries) - self.max_files, 0)]:
+            with contextlib.suppress(OSError):
+                os.remove(path)
@@ -0,0 +1,357 @@
+"""Markdown 渲染 - 带缓存的安全渲染
+
+Markdown 与 bleach.Cleaner 实例放在对象池中复用（Markdown 每次使用前 reset），
+渲染结果以内容的 SHA-256 为键放入按字节计算容量的 LRU 缓存，
+实时预览和 markdown 模板过滤器渲染未修改的内容时只需一次字典查找。
+
+markdown（连同 pymdownx 扩展与 Pygments）和 bleach 在第一次渲染时才导入，
+只导入本模块的进程（例如维护脚本）不需要承担这部分启动开销；pre-fork 服务器
+可以在 fork 之前调用 RendererPool.warm_up() 提前加载。
+"""
+
+import hashlib
+import re
+import threading
+
+from cachetools import LRUCache
+
+from config import Config
+from metrics import stage_timer
+
+# Markdown HTML 清理配置 - 防止 XSS 攻击
+ALLOWED_TAGS = [
+    "p",
+    "br",
+    "hr",
+    "h1",
+    "h2",
+    "h3",
+    "h4",
+    "h5",
+    "h6",
+    "ul",
+    "ol",
+    "li",
+    "code",
+    "pre",
+    "blockquote",
+    "table",
+    "thead",
+    "tbody",
+    "tr",
+    "th",
+    "td",
+    "a",
+    "strong",
+    "em",
+    "b",
+    "i",
+    "u",
+    "s",
+    "del",
+    "ins",
+    "img",
+    "figure",
+    "figcaption",
+    "div",
+    "span",
+    "sup",
+    "sub",
+    "dl",
+    "dt",
+    "dd",
+    "abbr",
+    "cite",
+    "mark",
+    "small",
+    # pymdown-extensions 新增标签
+    "input",  # 任务列表 checkbox
+    "label",  # 任务列表 label
+    "section",  # 脚注容器
+]
+ALLOWED_ATTRS = {
+    "a": ["href", "title", "target", "rel"],
+    "img": ["src", "alt", "title", "width", "height"],
+    "abbr": ["title"],
+    "td": ["colspan", "rowspan"],
+    "th": ["colspan", "rowspan", "scope"],
+    "code": ["class"],  # 用于代码高亮
+    "pre": ["class"],
+    "div": ["class", "id"],  # 脚注需要 id
+    "span": ["class", "id"],
+    # pymdown-extensions 新增属性
+    "input": ["type", "checked", "disabled"],  # 任务列表
+    "li": ["class"],  # 任务列表项
+    "section": ["class"],  # 脚注容器
+    "sup": ["id", "class"],  # 脚注引用
+}
+
+
+# Markdown 扩展配置
+MARKDOWN_EXTENSIONS = [
+    "markdown.extensions.extra",
+    "markdown.extensions.codehilite",
+    "markdown.extensions.nl2br",
+    "markdown.extensions.sane_lists",
+    "markdown.extensions.tables",
+    "markdown.extensions.toc",
+    "markdown.extensions.footnotes",  # 脚注
+    "pymdownx.tasklist",  # 任务列表
+    "pymdownx.caret",  # 上标 ^text^
+    "pymdownx.tilde",  # 下标 ~text~, 删除线
+    "pymdownx.mark",  # 高亮 ==text==
+    "pymdownx.superfences",  # 增强代码块
+]
+MARKDOWN_EXTENSION_CONFIGS = {
+    "pymdownx.tasklist": {
+        "custom_checkbox": False,
+        "clickable_checkbox": False,
+    },
+}
+
+# 预热时渲染的示例文档，覆盖代码高亮、任务列表等用到额外模块的扩展
+WARM_UP_DOCUMENT = "# yonote\n\n- [x] **task** `code`\n\n```python\nprint('yonote')\n```\n"
+
+
+class RendererPool:
+    """Markdown / bleach.Cleaner 对象池，二者都不是线程安全的，每个线程借出独占使用"""
+
+    def __init__(self, max_idle=Config.RENDER_POOL_SIZE):
+        self.max_idle = max_idle
+        self._idle = []
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _create():
+        import bleach
+        import markdown
+
+        md = markdown.Markdown(
+            extensions=MARKDOWN_EXTENSIONS, extension_configs=MARKDOWN_EXTENSION_CONFIGS, output_format="html"
+        )
+        cleaner = bleach.Cleaner(tags=ALLOWED_TAGS, attributes=ALLOWED_ATTRS, strip=True)
+        return md, cleaner
+
+    def warm_up(self):
+        """导入渲染依赖并渲染一段示例文档（加载代码高亮等扩展），实例留在池中"""
+        self.render(WARM_UP_DOCUMENT)
+        return self
+
+    def acquire(self):
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return self._create()
+
+    def release(self, pair):
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(pair)
+
+    def render(self, content):
+        """渲染并清理 HTML，不经过缓存"""
+        pair = self.acquire()
+        md, cleaner = pair
+        try:
+            # reset 清除上一次渲染留下的脚注、目录等状态
+            with stage_timer("markdown"):
+                html = md.reset().convert(content)
+            with stage_timer("bleach"):
+                return cleaner.clean(html)
+        finally:
+            self.release(pair)
+
+
+def _utf8_size(html):
+    return len(html.encode())
+
+
+class RenderCache:
+    """以内容哈希为键、按 HTML 的 UTF-8 字节数限制容量的 LRU 缓存，带命中统计"""
+
+    def __init__(self, max_bytes=Config.RENDER_CACHE_MAX_BYTES):
+        self._cache = LRUCache(maxsize=max_bytes, getsizeof=_utf8_size)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(content):
+        return hashlib.sha256(content.encode()).digest()
+
+    def get(self, key):
+        with self._lock:
+            html = self._cache.get(key)
+            if html is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return html
+
+    def put(self, key, html):
+        # 超过整个缓存容量的结果直接跳过，不挤掉其它条目
+        if _utf8_size(html) > self._cache.maxsize:
+            return
+        with self._lock:
+            self._cache[key] = html
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self._cache),
+                "bytes": self._cache.currsize,
+                "max_bytes": self._cache.maxsize,
+            }
+
+
+renderer_pool = RendererPool()
+render_cache = RenderCache()
+
+
+def sanitize_html(html):
+    """清理 HTML 内容，移除危险标签和属性，防止 XSS 攻击"""
+    import bleach
+
+    with stage_timer("bleach"):
+        return bleach.clean(html, tags=ALLOWED_TAGS, attributes=ALLOWED_ATTRS, strip=True)
+
+
+def render_markdown_safe(content):
+    """安全地渲染 Markdown 为 HTML（结果带缓存）"""
+    if not content:
+        return ""
+    key = render_cache.make_key(content)
+    html = render_cache.get(key)
+    if html is None:
+        html = renderer_pool.render(content)
+        render_cache.put(key, html)
+    return html
+
+
+# ==================== 增量（分块）预览 ====================
+
+FENCE_RE = re.compile(r"^ {0,3}(`{3,}|~{3,})")
+LIST_ITEM_RE = re.compile(r"^ {0,3}([*+-]|\d+[.)])\s")
+# 目录、脚注、引用式链接、缩写依赖整篇文档，出现时退回整篇渲染
+WHOLE_DOCUMENT_RE = re.compile(r"^\s*\[TOC\]\s*$|\[\^[^\]]+\]|^ {0,3}\[[^\]]+\]:|^\*\[[^\]]+\]:", re.M)
+
+
+QUOTE_RE = re.compile(r"^ {0,3}>")
+# Markdown 原样保留的 HTML 块，内部的空行不结束块
+HTML_BLOCK_RE = re.compile(
+    r"^ {0,3}(?:(<!--)|<(address|article|aside|blockquote|canvas|center|details|div|dl|fieldset|figcaption|figure|"
+    r"footer|form|header|hgroup|iframe|main|map|math|menu|nav|noscript|object|ol|output|pre|script|section|"
+    r"style|table|textarea|ul|video)(?=[\s/>]|$))",
+    re.I,
+)
+
+
+def _open_html(lines):
+    """lines 以 HTML 块开头且尚未闭合时返回 True"""
+    match = HTML_BLOCK_RE.match(lines[0])
+    if not match:
+        return False
+    text = "\n".join(lines)
+    if match.group(1):
+        return "-->" not in text
+    tag = match.group(2)
+    opens = len(re.findall(rf"<{tag}(?=[\s/>]|$)", text, re.I | re.M))
+    closes = len(re.findall(rf"</{tag}\s*>", text, re.I))
+    return opens > closes
+
+
+def _is_indented(line):
+    return line.startswith(("    ", "\t"))
+
+
+def split_blocks(content):
+    """将文档拆分为顶层块（段落、围栏代码、表格、列表等），以空行为界
+
+    围栏代码和未闭合的 HTML 块内部的空行不会拆分；列表、引用和缩进代码块在空行后
+    继续时保持为同一块。
+    """
+    lines = content.split("\n")
+    blocks = []
+    current = []
+    fence = None
+
+    def flush():
+        if current:
+            blocks.append("\n".join(current))
+            current.clear()
+
+    for i, line in enumerate(lines):
+        if fence:
+            current.append(line)
+            stripped = line.strip()
+            if stripped.startswith(fence) and stripped.strip(fence[0]) == "":
+                fence = None
+            continue
+
+        match = FENCE_RE.match(line)
+        if match:
+            # 列表和 HTML 块中的代码块属于外层块，不单独成块
+            if current and not LIST_ITEM_RE.match(current[0]) and not _open_html(current):
+                flush()
+            fence = match.group(1)
+            current.append(line)
+            continue
+
+        if line.strip():
+            current.append(line)
+            continue
+
+        if not current:
+            continue
+        following = next((candidate for candidate in lines[i + 1 :] if candidate.strip()), None)
+        continues_list = LIST_ITEM_RE.match(current[0]) and following is not None
+        continues_list = continues_list and (_is_indented(following) or LIST_ITEM_RE.match(following))
+        continues_code = _is_indented(current[0]) and following is not None and _is_indented(following)
+        # 空行隔开的两段引用在整篇渲染中合并为同一个 blockquote
+        last = next(candidate for candidate in reversed(current) if candidate.strip())
+        continues_quote = QUOTE_RE.match(last) and following is not None and QUOTE_RE.match(following)
+        if continues_list or continues_code or continues_quote or _open_html(current):
+            current.append(line)
+        else:
+            flush()
+
+    flush()
+    return blocks
+
+
+def block_id(html):
+    """块的标识，由最终 HTML 计算，客户端据此判断是否需要替换"""
+    return hashlib.sha256(html.encode()).hexdigest()[:16]
+
+
+def render_markdown_blocks(content, known=()):
+    """分块渲染 Markdown，供实时预览增量更新
+
+    每个块单独经过 render_markdown_safe，因此块级结果（包括 Pygments 高亮）
+    与整篇渲染共享同一个缓存。返回按顺序排列的块列表，客户端已有（id 在
+    known 中）的块只返回 id。文档包含目录、脚注等整篇特性时返回整篇 HTML。
+    """
+    if not content:
+        return {"mode": "blocks", "blocks": []}
+    if WHOLE_DOCUMENT_RE.search(content):
+        return {"mode": "full", "html": render_markdown_safe(content)}
+
+    known = set(known)
+    blocks = []
+    for source in split_blocks(content):
+        html = render_markdown_safe(source)
+        if not html:
+            continue
+        bid = block_id(html)
+        blocks.append({"id": bid} if bid in known else {"id": bid, "html": html})
+    return {"mode": "blocks", "blocks": blocks}
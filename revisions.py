@@ -0,0 +1,254 @@
+"""笔记修订历史 - 加密的增量补丁链与定期快照
+
+每次保存正文时，在同一事务中为笔记记录一条修订：
+- 快照（kind=0）保存完整正文；补丁（kind=1）保存相对同一笔记上一条修订的补丁
+  （delta.py 格式，UTF-16 位置），两者都经 encrypt_content 压缩加密后存储
+- 距最近快照的补丁数达到 REVISION_SNAPSHOT_EVERY，或补丁累计字节数超过
+  REVISION_SNAPSHOT_BYTES 时改存快照，任一修订最多从一个快照开始应用有限个补丁即可还原
+- REVISION_COALESCE_WINDOW 秒内的连续保存合并到同一条修订中（把新补丁追加到该修订的
+  补丁后面，不需要还原旧版本）；大幅删减内容的保存不合并，误删前的内容单独保留
+- 每条笔记最多保留 REVISION_MAX_PER_NOTE 条、REVISION_RETENTION_DAYS 天内的修订，
+  删除时从最近的快照处截断，保留的补丁链始终从快照开始
+
+修订记录的 version 为笔记在该修订时的版本号。最新一条修订与保存前的笔记版本一致时
+才写补丁，否则（例如关闭修订期间有过保存）写快照。
+"""
+
+import json
+import time
+
+from config import Config
+from delta import MAX_PATCH_OPS, PatchError, apply_patch, make_patch
+from encryption import DECRYPT_FAILED, decrypt_content, encrypt_content
+from metrics import stage_timer
+from notes import load_note_content
+
+SNAPSHOT = 0
+DELTA = 1
+
+
+class PendingRevision:
+    """在写事务之外准备好的修订：旧正文、新正文与两者之间的补丁"""
+
+    __slots__ = ("key", "version", "previous", "content", "ops")
+
+    def __init__(self, key, version, previous, content, ops):
+        self.key = key
+        self.version = version
+        self.previous = previous
+        self.content = content
+        self.ops = ops
+
+
+def _encode_ops(ops):
+    return json.dumps(ops, ensure_ascii=False, separators=(",", ":"))
+
+
+class RevisionStore:
+    def __init__(self, config=Config):
+        self.enabled = config.REVISIONS_ENABLED
+        self.coalesce_window = config.REVISION_COALESCE_WINDOW
+        self.snapshot_every = config.REVISION_SNAPSHOT_EVERY
+        self.snapshot_bytes = config.REVISION_SNAPSHOT_BYTES
+        self.max_per_note = config.REVISION_MAX_PER_NOTE
+        self.retention = config.REVISION_RETENTION_DAYS * 86400
+
+    # ---------- 记录 ----------
+
+    def prepare(self, note, content, previous=None):
+        """解密旧正文（调用方已解密时直接传入）并计算补丁，在写事务之外调用"""
+        if previous is None:
+            previous = load_note_content(note)
+        ops = None if previous == DECRYPT_FAILED else make_patch(previous or "", content)
+        return PendingRevision(note["key"], note["version"], previous, content, ops)
+
+    def record(self, conn, pending, coalesce=True):
+        """在调用方的事务中（笔记已更新之后）记录修订"""
+        with stage_timer("revision"):
+            self._record(conn, pending, coalesce)
+
+    def _record(self, conn, pending, coalesce):
+        now = int(time.time())
+        key = pending.key
+        version = conn.execute("SELECT version FROM notes WHERE key = ?", (key,)).fetchone()["version"]
+        latest = self._latest(conn, key)
+        readable = pending.ops is not None
+
+        if latest is None:
+            if not readable or not pending.previous:
+                if pending.content:
+                    self._insert_snapshot(conn, key, version, pending.content, now)
+                return
+            # 第一条修订：先保存开启修订之前的内容，本次保存另记一条，不合并进去
+            self._insert_snapshot(conn, key, pending.version, pending.previous, now)
+            latest = self._latest(conn, key)
+            coalesce = False
+
+        in_sync = readable and latest["version"] == pending.version
+        if not in_sync:
+            self._insert_snapshot(conn, key, version, pending.content, now)
+            self.prune(conn, key, now)
+            return
+
+        if not pending.ops:
+            # 正文未变化（如只修改了密码），只同步版本号
+            conn.execute("UPDATE revisions SET version = ? WHERE id = ?", (version, latest["id"]))
+            return
+
+        size = len(pending.content.encode())
+        shrunk = size * 2 < latest["size"]
+        if coalesce and not shrunk and now - latest["created_at"] < self.coalesce_window:
+            if self._coalesce(conn, latest, pending, version, size, now):
+                return
+
+        payload = _encode_ops(pending.ops).encode()
+        if (
+            latest["chain_length"] + 1 < self.snapshot_every
+            and latest["chain_bytes"] + len(payload) <= self.snapshot_bytes
+            and len(payload) < size
+        ):
+            conn.execute(
+                "INSERT INTO revisions (key, version, kind, data, size, chain_length, chain_bytes, created_at, "
+                "updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    version,
+                    DELTA,
+                    encrypt_content(payload.decode()),
+                    size,
+                    latest["chain_length"] + 1,
+                    latest["chain_bytes"] + len(payload),
+                    now,
+                    now,
+                ),
+            )
+        else:
+            self._insert_snapshot(conn, key, version, pending.content, now)
+        self.prune(conn, key, now)
+
+    def _coalesce(self, conn, latest, pending, version, size, now):
+        """把本次保存合并进最新修订，无法合并（补丁过长）时返回 False"""
+        if latest["kind"] == SNAPSHOT:
+            conn.execute(
+                "UPDATE revisions SET version = ?, data = ?, size = ?, updated_at = ? WHERE id = ?",
+                (version, encrypt_content(pending.content), size, now, latest["id"]),
+            )
+            return True
+
+        stored = decrypt_content(latest["data"])
+        if stored == DECRYPT_FAILED:
+            return False
+        ops = json.loads(stored) + pending.ops
+        if len(ops) > MAX_PATCH_OPS:
+            return False
+        payload = _encode_ops(ops)
+        chain_bytes = latest["chain_bytes"] - latest["payload_bytes"] + len(payload.encode())
+        if chain_bytes > self.snapshot_bytes or len(payload.encode()) >= size:
+            # 合并后的补丁不再划算，改为快照（后面没有依赖它的修订）
+            conn.execute(
+                "UPDATE revisions SET version = ?, kind = ?, data = ?, size = ?, chain_length = 0, chain_bytes = 0, "
+                "updated_at = ? WHERE id = ?",
+                (version, SNAPSHOT, encrypt_content(pending.content), size, now, latest["id"]),
+            )
+        else:
+            conn.execute(
+                "UPDATE revisions SET version = ?, data = ?, size = ?, chain_bytes = ?, updated_at = ? WHERE id = ?",
+                (version, encrypt_content(payload), size, chain_bytes, now, latest["id"]),
+            )
+        return True
+
+    def _latest(self, conn, key):
+        row = conn.execute(
+            "SELECT id, version, kind, data, size, chain_length, chain_bytes, created_at FROM revisions "
+            "WHERE key = ? ORDER BY id DESC LIMIT 1",
+            (key,),
+        ).fetchone()
+        if row is None:
+            return None
+        latest = dict(row)
+        # 本条补丁的字节数：累计值减去上一条的累计值（快照为 0）
+        if latest["kind"] == DELTA:
+            previous = conn.execute(
+                "SELECT chain_bytes FROM revisions WHERE key = ? AND id < ? ORDER BY id DESC LIMIT 1",
+                (key, latest["id"]),
+            ).fetchone()
+            latest["payload_bytes"] = latest["chain_bytes"] - previous["chain_bytes"]
+        else:
+            latest["payload_bytes"] = 0
+        return latest
+
+    def _insert_snapshot(self, conn, key, version, content, now):
+        conn.execute(
+            "INSERT INTO revisions (key, version, kind, data, size, chain_length, chain_bytes, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, 0, 0, ?, ?)",
+            (key, version, SNAPSHOT, encrypt_content(content), len(content.encode()), now, now),
+        )
+
+    # ---------- 保留策略 ----------
+
+    def prune(self, conn, key, now=None):
+        """按条数与天数删除笔记的旧修订，从最早保留的修订之前最近的快照处截断，返回删除数"""
+        now = int(time.time()) if now is None else now
+        oldest = conn.execute(
+            "SELECT MIN(id) FROM (SELECT id FROM revisions WHERE key = ? AND updated_at >= ? ORDER BY id DESC LIMIT ?)",
+            (key, now - self.retention, self.max_per_note),
+        ).fetchone()[0]
+        if oldest is None:
+            return conn.execute("DELETE FROM revisions WHERE key = ?", (key,)).rowcount
+        base = conn.execute(
+            "SELECT MAX(id) FROM revisions WHERE key = ? AND id <= ? AND kind = ?", (key, oldest, SNAPSHOT)
+        ).fetchone()[0]
+        if base is None:
+            return 0
+        return conn.execute("DELETE FROM revisions WHERE key = ? AND id < ?", (key, base)).rowcount
+
+    def prune_expired(self, database, conn, now=None):
+        """清理全部笔记中超过保留天数的修订，每条笔记单独提交，返回删除数"""
+        now = int(time.time()) if now is None else now
+        keys = [
+            row[0]
+            for row in conn.execute(
+                "SELECT DISTINCT key FROM revisions WHERE updated_at < ?", (now - self.retention,)
+            ).fetchall()
+        ]
+        return sum(database.run_write(conn, lambda c, k=key: self.prune(c, k, now)) for key in keys)
+
+    def remove(self, conn, key):
+        conn.execute("DELETE FROM revisions WHERE key = ?", (key,))
+
+    # ---------- 查询与还原 ----------
+
+    def history(self, conn, key):
+        return conn.execute(
+            "SELECT id, version, kind, size, created_at, updated_at FROM revisions WHERE key = ? ORDER BY id DESC",
+            (key,),
+        ).fetchall()
+
+    def load(self, conn, key, revision_id):
+        """还原指定修订的正文，不存在或无法还原时返回 None"""
+        base = conn.execute(
+            "SELECT MAX(id) FROM revisions WHERE key = ? AND id <= ? AND kind = ?", (key, revision_id, SNAPSHOT)
+        ).fetchone()[0]
+        if base is None:
+            return None
+        rows = conn.execute(
+            "SELECT id, kind, data FROM revisions WHERE key = ? AND id BETWEEN ? AND ? ORDER BY id",
+            (key, base, revision_id),
+        ).fetchall()
+        if rows[-1]["id"] != revision_id:
+            return None
+        content = decrypt_content(rows[0]["data"])
+        if content == DECRYPT_FAILED:
+            return None
+        try:
+            for row in rows[1:]:
+                ops = decrypt_content(row["data"])
+                if ops == DECRYPT_FAILED:
+                    return None
+                content = apply_patch(content, json.loads(ops))
+        except (PatchError, ValueError):
+            return None
+        return content
+
+
+revision_store = RevisionStore()
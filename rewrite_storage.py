@@ -0,0 +1,10 @@
+#!/usr/bin/env python3
+"""将旧格式（Fernet base64 文本）的笔记改写为压缩存储信封，等价于 python bulk_crypto.py reformat
+
+参数见 --help。
+"""
+
+from bulk_crypto import main
+
+if __name__ == "__main__":
+    main(default_job="reformat")
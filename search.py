@@ -0,0 +1,134 @@
+"""笔记关键词搜索 - 不解密正文的盲索引
+
+笔记正文只以密文存储，这里在保存时把正文切分成词，以 HMAC-SHA256（密钥为
+SEARCH_INDEX_KEY，留空时由 ENCRYPTION_KEY 派生）计算每个词的摘要，按 (摘要, 笔记 key)
+写入 search_tokens 表。查询时对查询词做同样的计算，只在索引上匹配，不需要解密任何笔记。
+数据库中只有摘要，没有密钥时无法还原出词本身。
+
+分词：NFKC 规范化并忽略大小写；连续的字母数字为一个词（至少 2 个字符），
+中日韩文字没有分隔符，按单字与相邻两字建立索引，查询时连续两个以上的字按两字匹配。
+多个查询词之间为“且”关系。
+
+保存笔记时只写入新增的摘要、删除不再出现的摘要（与笔记写入在同一事务中）；
+已有笔记由 build_search_index.py 批量补建。
+"""
+
+import hashlib
+import hmac
+import re
+import unicodedata
+
+from config import Config
+from metrics import stage_timer
+
+WORD_RE = re.compile(r"\w+")
+# 假名、中日韩统一表意文字（含扩展 A）、韩文音节、兼容表意文字
+CJK_RE = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]+")
+MIN_WORD_LENGTH = 2
+MAX_WORD_LENGTH = 64
+# 单次查询最多使用的词数
+MAX_QUERY_TOKENS = 16
+DIGEST_BYTES = 16
+
+
+def _normalize(text):
+    return unicodedata.normalize("NFKC", text).casefold()
+
+
+def _split(text):
+    """按顺序产生 (片段, 是否为中日韩文字)"""
+    for word in WORD_RE.findall(_normalize(text)):
+        pos = 0
+        for match in CJK_RE.finditer(word):
+            if match.start() > pos:
+                yield word[pos : match.start()], False
+            yield match.group(), True
+            pos = match.end()
+        if pos < len(word):
+            yield word[pos:], False
+
+
+def _word_tokens(part):
+    if MIN_WORD_LENGTH <= len(part) <= MAX_WORD_LENGTH:
+        yield part
+
+
+def index_tokens(text):
+    """正文中需要建立索引的词（去重，保持出现顺序）"""
+    tokens = {}
+    for part, cjk in _split(text):
+        if not cjk:
+            tokens.update(dict.fromkeys(_word_tokens(part)))
+            continue
+        tokens.update(dict.fromkeys(part))
+        tokens.update(dict.fromkeys(part[i : i + 2] for i in range(len(part) - 1)))
+    return list(tokens)
+
+
+def query_tokens(text):
+    """查询串中必须全部出现的词"""
+    tokens = {}
+    for part, cjk in _split(text):
+        if not cjk:
+            tokens.update(dict.fromkeys(_word_tokens(part)))
+        elif len(part) == 1:
+            tokens[part] = None
+        else:
+            tokens.update(dict.fromkeys(part[i : i + 2] for i in range(len(part) - 1)))
+    return list(tokens)[:MAX_QUERY_TOKENS]
+
+
+def derive_index_key(config=Config):
+    secret = config.SEARCH_INDEX_KEY or config.ENCRYPTION_KEY
+    # 与加密密钥分离：即使两者来自同一口令，摘要也不能用来推导加密密钥
+    return hmac.new(secret.encode(), b"yonote-search-index", hashlib.sha256).digest()
+
+
+class SearchIndex:
+    """关键词摘要的计算、增量维护与查询"""
+
+    def __init__(self, config=Config):
+        self.enabled = config.SEARCH_ENABLED
+        self.max_tokens = config.SEARCH_MAX_TOKENS
+        self.max_results = config.SEARCH_MAX_RESULTS
+        self._key = derive_index_key(config)
+
+    def digest(self, token):
+        return hmac.new(self._key, token.encode(), hashlib.sha256).digest()[:DIGEST_BYTES]
+
+    def digests(self, content):
+        """正文的摘要集合，最多 SEARCH_MAX_TOKENS 个；在写事务之外计算"""
+        return {self.digest(token) for token in index_tokens(content or "")[: self.max_tokens]}
+
+    def update(self, conn, key, digests):
+        """把笔记的索引改为 digests，只写入变化的部分；在调用方的事务中执行，返回 (新增数, 删除数)"""
+        with stage_timer("search_index"):
+            existing = {row[0] for row in conn.execute("SELECT token FROM search_tokens WHERE key = ?", (key,))}
+            removed = existing - digests
+            added = digests - existing
+            conn.executemany("DELETE FROM search_tokens WHERE token = ? AND key = ?", ((t, key) for t in removed))
+            conn.executemany("INSERT INTO search_tokens (token, key) VALUES (?, ?)", ((t, key) for t in added))
+        return len(added), len(removed)
+
+    def remove(self, conn, key):
+        conn.execute("DELETE FROM search_tokens WHERE key = ?", (key,))
+
+    def search(self, conn, query, keys):
+        """在 keys 范围内查找包含全部查询词的笔记，按更新时间倒序返回 notes 行"""
+        digests = [self.digest(token) for token in query_tokens(query)]
+        keys = list(keys)
+        if not digests or not keys:
+            return []
+        token_marks = ",".join("?" * len(digests))
+        key_marks = ",".join("?" * len(keys))
+        with stage_timer("search_query"):
+            return conn.execute(
+                "SELECT notes.key, notes.updated_at FROM notes JOIN ("  # noqa: S608 - 只拼接占位符
+                f"  SELECT key FROM search_tokens WHERE token IN ({token_marks}) AND key IN ({key_marks})"
+                "  GROUP BY key HAVING COUNT(*) = ?"
+                ") AS hits ON hits.key = notes.key ORDER BY notes.updated_at DESC LIMIT ?",
+                (*digests, *keys, len(digests), self.max_results),
+            ).fetchall()
+
+
+search_index = SearchIndex()
@@ -0,0 +1,186 @@
+"""服务端会话 - cookie 中只保存随机会话 ID，会话数据保存在 SQLite
+
+Flask 默认把整个会话签名后放在 cookie 中，已认证笔记列表会随使用不断变大，
+并且每个响应都要重新签名、下发。这里的 cookie 只有一个随机 ID，sessions 表以
+ID 的 SHA-256 为主键保存会话数据（与签名 cookie 相同的带类型标记的 JSON）：
+- 会话数据只在修改时写入（revision 加一）
+- 滑动过期：剩余有效期比完整有效期少了 SESSION_REFRESH_INTERVAL 以上时才顺延
+  expires_at 并重新下发 cookie，而不是每个请求都写
+- 每个进程缓存最近使用的会话，读取时用一条查询比较 revision，其它 worker 修改过
+  的会话会重新读取，未修改时不传输数据列
+- 过期的行由 shared_state.Sweeper 清理
+
+切换到服务端会话时，旧的签名 cookie 会被识别并导入，用户不需要重新输入密码。
+"""
+
+import hashlib
+import secrets
+import threading
+import time
+
+from cachetools import LRUCache
+from flask.sessions import (
+    SecureCookieSession,
+    SecureCookieSessionInterface,
+    SessionInterface,
+    session_json_serializer,
+)
+from itsdangerous import BadSignature
+
+from config import Config
+
+
+class ServerSession(SecureCookieSession):
+    """带会话 ID 的会话字典，沿用 SecureCookieSession 的 modified / accessed 跟踪"""
+
+    def __init__(self, initial=None, sid=None, revision=0, expires_at=0.0):
+        super().__init__(initial)
+        self.sid = sid
+        self.revision = revision
+        self.expires_at = expires_at
+        # 需要重新下发 cookie（新会话或导入了旧 cookie）
+        self.new = sid is None
+
+
+def hash_sid(sid):
+    return hashlib.sha256(sid.encode()).hexdigest()
+
+
+class SQLiteSessionInterface(SessionInterface):
+    """以 SQLite 为存储的 Flask SessionInterface，每个进程一个实例"""
+
+    def __init__(self, database, config=Config):
+        self.database = database
+        self.lifetime = config.PERMANENT_SESSION_LIFETIME.total_seconds()
+        self.refresh_interval = config.SESSION_REFRESH_INTERVAL
+        self._cache = LRUCache(maxsize=config.SESSION_CACHE_SIZE)
+        self._lock = threading.Lock()
+        self._legacy = SecureCookieSessionInterface()
+
+    # ---------- 读取 ----------
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if not sid:
+            return ServerSession()
+        session = self._load(sid)
+        if session is not None:
+            return session
+        # 切换前签发的签名 cookie：导入其中的数据，保存时换成新的会话 ID
+        legacy = self._load_legacy(app, sid)
+        if legacy:
+            session = ServerSession(legacy)
+            session.modified = True
+            return session
+        return ServerSession()
+
+    def _load(self, sid):
+        if len(sid) > 128:
+            return None
+        key = hash_sid(sid)
+        with self._lock:
+            cached = self._cache.get(key)
+        revision = cached[0] if cached else -1
+        with self.database.connection() as conn:
+            row = conn.execute(
+                "SELECT revision, expires_at, CASE WHEN revision = ? THEN NULL ELSE data END AS data "
+                "FROM sessions WHERE id = ? AND expires_at > ?",
+                (revision, key, time.time()),
+            ).fetchone()
+        if row is None:
+            with self._lock:
+                self._cache.pop(key, None)
+            return None
+        if row["data"] is None:
+            data = cached[1]
+        else:
+            data = row["data"]
+            with self._lock:
+                self._cache[key] = (row["revision"], data)
+        return ServerSession(
+            session_json_serializer.loads(data), sid=sid, revision=row["revision"], expires_at=row["expires_at"]
+        )
+
+    def _load_legacy(self, app, value):
+        serializer = self._legacy.get_signing_serializer(app)
+        if serializer is None or "." not in value:
+            return None
+        try:
+            return serializer.loads(value, max_age=int(self.lifetime))
+        except BadSignature:
+            return None
+
+    # ---------- 写入 ----------
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        samesite = self.get_cookie_samesite(app)
+
+        if not session:
+            # 会话被清空：删除记录和 cookie；从未保存过的空会话不下发 cookie
+            if session.modified and session.sid is not None:
+                self._delete(session.sid)
+            if session.modified or session.sid is not None:
+                response.delete_cookie(name, domain=domain, path=path, secure=secure, samesite=samesite)
+            return
+
+        if session.accessed:
+            response.vary.add("Cookie")
+
+        now = time.time()
+        if session.modified or session.sid is None:
+            self._write(session, now)
+        elif session.expires_at - now < self.lifetime - self.refresh_interval:
+            self._refresh(session, now)
+        else:
+            return
+
+        response.set_cookie(
+            name,
+            session.sid,
+            expires=session.expires_at,
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=secure,
+            samesite=samesite,
+        )
+
+    def _write(self, session, now):
+        if session.sid is None:
+            session.sid = secrets.token_urlsafe(32)
+        key = hash_sid(session.sid)
+        data = session_json_serializer.dumps(dict(session))
+        session.expires_at = now + self.lifetime
+
+        def upsert(conn):
+            conn.execute(
+                "INSERT INTO sessions (id, data, revision, expires_at) VALUES (?, ?, 1, ?) "
+                "ON CONFLICT(id) DO UPDATE SET data = excluded.data, revision = revision + 1, "
+                "expires_at = excluded.expires_at",
+                (key, data, session.expires_at),
+            )
+            return conn.execute("SELECT revision FROM sessions WHERE id = ?", (key,)).fetchone()["revision"]
+
+        with self.database.connection() as conn:
+            session.revision = self.database.run_write(conn, upsert)
+        with self._lock:
+            self._cache[key] = (session.revision, data)
+
+    def _refresh(self, session, now):
+        """只顺延过期时间，数据与 revision 不变"""
+        session.expires_at = now + self.lifetime
+        with self.database.connection() as conn:
+            self.database.execute_write(
+                conn, "UPDATE sessions SET expires_at = ? WHERE id = ?", (session.expires_at, hash_sid(session.sid))
+            )
+
+    def _delete(self, sid):
+        key = hash_sid(sid)
+        with self.database.connection() as conn:
+            self.database.execute_write(conn, "DELETE FROM sessions WHERE id = ?", (key,))
+        with self._lock:
+            self._cache.pop(key, None)
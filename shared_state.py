@@ -0,0 +1,322 @@
+"""跨进程共享状态 - 基于 SQLite 的过期计数器
+
+多 worker 部署时，速率限制和密码错误次数如果保存在进程内存中，每个进程各自
+计数，实际允许的尝试次数会随 worker 数成倍增加。这里把计数器放在 counters
+表中，所有进程共用同一个数据库文件。
+
+SQLiteStorage 注册为 limits 的 sqlite:// 存储，供 Flask-Limiter 使用；
+LoginAttempts 在 lockouts 表中记录密码错误次数与锁定；过期的行由 Sweeper
+后台线程分批删除。
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+
+from limits.storage import Storage
+
+from config import Config
+from db import Database
+
+logger = logging.getLogger(__name__)
+
+# 需要清理的表 -> 过期时间字段（均已建立索引）
+EXPIRING_TABLES = {
+    "counters": "expires_at",
+    "lockouts": "locked_until",
+    "sessions": "expires_at",
+}
+
+
+class CounterStore:
+    """带过期时间的计数器，过期后下一次递增从零开始"""
+
+    def __init__(self, database):
+        self.database = database
+
+    def incr(self, name, expiry, amount=1, elastic=False):
+        """递增计数并返回新值；elastic 为 True 时每次递增都顺延过期时间"""
+        return self.incr_many([(name, amount, expiry, elastic)])[name][0]
+
+    def incr_many(self, items):
+        """在一个写事务中递增多个计数
+
+        items 为 [(名称, 增量, 有效期, elastic)]，返回 {名称: (新值, 过期时间)}。
+        """
+        now = time.time()
+
+        def upsert(conn):
+            result = {}
+            for name, amount, expiry, elastic in items:
+                conn.execute(
+                    "INSERT INTO counters (name, value, expires_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(name) DO UPDATE SET "
+                    "value = CASE WHEN expires_at <= ? THEN excluded.value ELSE value + excluded.value END, "
+                    "expires_at = CASE WHEN expires_at <= ? OR ? THEN excluded.expires_at ELSE expires_at END",
+                    (name, amount, now + expiry, now, now, int(elastic)),
+                )
+                row = conn.execute("SELECT value, expires_at FROM counters WHERE name = ?", (name,)).fetchone()
+                result[name] = (row["value"], row["expires_at"])
+            return result
+
+        with self.database.connection() as conn:
+            return self.database.run_write(conn, upsert)
+
+    def get(self, name):
+        """返回未过期的计数，不存在或已过期时为 0"""
+        with self.database.connection() as conn:
+            row = conn.execute(
+                "SELECT value FROM counters WHERE name = ? AND expires_at > ?", (name, time.time())
+            ).fetchone()
+        return row["value"] if row else 0
+
+    def get_expiry(self, name):
+        """返回过期时间戳，不存在时为 None"""
+        with self.database.connection() as conn:
+            row = conn.execute("SELECT expires_at FROM counters WHERE name = ?", (name,)).fetchone()
+        return row["expires_at"] if row else None
+
+    def clear(self, name):
+        with self.database.connection() as conn:
+            self.database.execute_write(conn, "DELETE FROM counters WHERE name = ?", (name,))
+
+    def clear_prefix(self, prefix):
+        """删除指定前缀的全部计数器，返回删除数"""
+        pattern = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        with self.database.connection() as conn:
+            cursor = self.database.execute_write(conn, "DELETE FROM counters WHERE name LIKE ? ESCAPE '\\'", (pattern,))
+        return cursor.rowcount
+
+
+class SQLiteStorage(Storage):
+    """limits 的 SQLite 存储，只支持 fixed-window 类策略
+
+    storage_uri 为 ``sqlite:///相对路径`` 或 ``sqlite:////绝对路径``；
+    也可以只写 ``sqlite://`` 并通过 storage_options 传入已有的 Database 共用连接池。
+
+    每个请求对每条限制各递增一次计数。flush_interval 大于 0 时增量先在进程内累积，
+    每个间隔最多在一个写事务中写入一次（新出现的 key 立即写入），返回值为上次写入时
+    的共享计数加上本进程尚未写入的增量：其他进程的计数最多晚一个间隔可见，进程退出时
+    最多丢失一个间隔的计数。flush_interval 为 0 时每次递增都直接写入。
+    """
+
+    STORAGE_SCHEME = ["sqlite"]
+    PREFIX = "limit:"
+
+    def __init__(self, uri=None, database=None, flush_interval=None, **options):
+        super().__init__(uri, **options)
+        if database is None:
+            path = (uri or "")[len("sqlite:///") :]
+            if not path:
+                raise ValueError("sqlite 存储需要数据库路径或 database 参数")
+            database = Database(path)
+        self.counters = CounterStore(database)
+        self.flush_interval = Config.RATELIMIT_FLUSH_INTERVAL if flush_interval is None else flush_interval
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        # key -> [尚未写入的增量, 有效期, elastic]
+        self._pending = {}
+        # key -> (上次写入后的共享计数, 过期时间)
+        self._shared = {}
+        self._flushed_at = 0.0
+
+    def _local_value(self, key):
+        entry = self._shared.get(key)
+        if entry is not None and entry[1] <= time.time():
+            return 0
+        pending = self._pending.get(key)
+        return (entry[0] if entry else 0) + (pending[0] if pending else 0)
+
+    def incr(self, key, expiry, elastic_expiry=False, amount=1):
+        if self.flush_interval <= 0:
+            return self.counters.incr(self.PREFIX + key, expiry, amount, elastic_expiry)
+        now = time.time()
+        with self._lock:
+            entry = self._shared.get(key)
+            expired = entry is not None and entry[1] <= now
+            if expired:
+                # 窗口已结束，尚未写入的增量属于上一个窗口，不再计入
+                self._pending.pop(key, None)
+            pending = self._pending.setdefault(key, [0, expiry, elastic_expiry])
+            pending[0] += amount
+            due = entry is None or expired or now - self._flushed_at >= self.flush_interval
+        if due:
+            self.flush()
+        with self._lock:
+            return self._local_value(key)
+
+    def flush(self):
+        """把本进程累积的增量在一个写事务中写入共享计数"""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                self._flushed_at = time.time()
+            if not pending:
+                return
+            items = [(self.PREFIX + key, amount, expiry, elastic) for key, (amount, expiry, elastic) in pending.items()]
+            try:
+                shared = self.counters.incr_many(items)
+            except Exception:
+                # 写入失败时放回，下次再写
+                with self._lock:
+                    for key, (amount, expiry, elastic) in pending.items():
+                        self._pending.setdefault(key, [0, expiry, elastic])[0] += amount
+                raise
+            now = time.time()
+            with self._lock:
+                # 丢弃已过期且没有新增量的 key，避免按 IP 无限增长
+                self._shared = {
+                    key: entry for key, entry in self._shared.items() if entry[1] > now or key in self._pending
+                }
+                for key in pending:
+                    self._shared[key] = shared[self.PREFIX + key]
+
+    def get(self, key):
+        with self._lock:
+            if key in self._shared or key in self._pending:
+                return self._local_value(key)
+        return self.counters.get(self.PREFIX + key)
+
+    def get_expiry(self, key):
+        with self._lock:
+            entry = self._shared.get(key)
+        expires_at = entry[1] if entry else self.counters.get_expiry(self.PREFIX + key)
+        return int(expires_at if expires_at is not None else time.time())
+
+    def check(self):
+        try:
+            with self.counters.database.connection() as conn:
+                conn.execute("SELECT 1")
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self):
+        with self._lock:
+            self._pending.clear()
+            self._shared.clear()
+        return self.counters.clear_prefix(self.PREFIX)
+
+    def clear(self, key):
+        with self._lock:
+            self._pending.pop(key, None)
+            self._shared.pop(key, None)
+        self.counters.clear(self.PREFIX + key)
+
+
+class LoginAttempts:
+    """按 (笔记 key, IP) 记录密码错误次数，达到上限后锁定
+
+    lockouts 表中每行的 locked_until 是该行的过期时间：未锁定时为错误计数的
+    有效期（最后一次错误后 window 秒），锁定时为解锁时间。过期的行视为不存在。
+    """
+
+    # 读取笔记时一并取出当前 IP 的锁定状态，参数为 (ip_address, key)
+    NOTE_QUERY = (
+        "SELECT notes.*, lockouts.locked AS lockout_locked, lockouts.locked_until AS lockout_until "
+        "FROM notes LEFT JOIN lockouts ON lockouts.key = notes.key AND lockouts.ip_address = ? "
+        "WHERE notes.key = ?"
+    )
+
+    def __init__(self, database, max_attempts, lockout_time, window=None):
+        self.database = database
+        self.max_attempts = max_attempts
+        self.lockout_time = lockout_time
+        self.window = lockout_time if window is None else window
+
+    def remaining(self, note):
+        """由 NOTE_QUERY 查出的行判断是否被锁定，返回剩余锁定秒数（未锁定为 0）"""
+        if not note["lockout_locked"]:
+            return 0
+        return max(int(note["lockout_until"] - time.time()), 0)
+
+    def has_record(self, note):
+        return note["lockout_until"] is not None
+
+    def record_failure(self, conn, key, ip_address):
+        """记录一次密码错误（单条 upsert），返回 (错误次数, 解锁时间)，未锁定时解锁时间为 0"""
+        now = int(time.time())
+        first_locked = self.max_attempts <= 1
+
+        def upsert(c):
+            c.execute(
+                "INSERT INTO lockouts (key, ip_address, failures, locked, locked_until) "
+                "VALUES (:key, :ip, 1, :first_locked, :first_until) "
+                "ON CONFLICT(key, ip_address) DO UPDATE SET "
+                "failures = CASE WHEN locked_until <= :now THEN 1 ELSE failures + 1 END, "
+                "locked = (CASE WHEN locked_until <= :now THEN 1 ELSE failures + 1 END) >= :max, "
+                "locked_until = :now + CASE WHEN (CASE WHEN locked_until <= :now THEN 1 ELSE failures + 1 END) "
+                ">= :max THEN :lockout ELSE :window END",
+                {
+                    "key": key,
+                    "ip": ip_address,
+                    "now": now,
+                    "max": self.max_attempts,
+                    "lockout": self.lockout_time,
+                    "window": self.window,
+                    "first_locked": int(first_locked),
+                    "first_until": now + (self.lockout_time if first_locked else self.window),
+                },
+            )
+            return c.execute(
+                "SELECT failures, locked, locked_until FROM lockouts WHERE key = ? AND ip_address = ?",
+                (key, ip_address),
+            ).fetchone()
+
+        row = self.database.run_write(conn, upsert)
+        return row["failures"], row["locked_until"] if row["locked"] else 0
+
+    def clear(self, conn, key, ip_address):
+        """密码正确后清除错误记录"""
+        self.database.execute_write(conn, "DELETE FROM lockouts WHERE key = ? AND ip_address = ?", (key, ip_address))
+
+
+class Sweeper:
+    """后台线程定期分批删除 EXPIRING_TABLES 中已过期的行
+
+    每个进程一个实例，首次调用 start() 时启动（兼容 pre-fork 服务器）。
+    """
+
+    def __init__(self, database, tables=None, config=Config):
+        self.database = database
+        self.tables = EXPIRING_TABLES if tables is None else tables
+        self.interval = config.STATE_SWEEP_INTERVAL
+        self.batch_size = config.STATE_SWEEP_BATCH_SIZE
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name="state-sweeper", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"清理过期状态失败: {e}")
+            time.sleep(self.interval)
+
+    def sweep(self):
+        """删除全部已过期的行，每批单独提交，返回 {表名: 删除数}"""
+        deleted = {}
+        now = time.time()
+        with self.database.connection() as conn:
+            for table, column in self.tables.items():
+                total = 0
+                while True:
+                    cursor = self.database.execute_write(
+                        conn,
+                        f"DELETE FROM {table} WHERE rowid IN "  # noqa: S608
+                        f"(SELECT rowid FROM {table} WHERE {column} <= ? LIMIT ?)",
+                        (now, self.batch_size),
+                    )
+                    total += cursor.rowcount
+                    if cursor.rowcount < self.batch_size:
+                        break
+                deleted[table] = total
+        return deleted
@@ -72,6 +72,9 @@ function initResizer() {
 setInterval(updateTimeAgo, 1000);
 updateTimeAgo(); // 立即更新一次
 
+// 订阅笔记变更通知
+subscribeNoteEvents();
+
 document.addEventListener('DOMContentLoaded', (event) => {
     const editor = document.getElementById('content');
     const editorContainer1 = editor.parentElement; // 获取编辑区容器
@@ -406,6 +409,55 @@ document.addEventListener('DOMContentLoaded', (event) => {
 
     // AbortController 用于取消未完成的预览请求
     let previewAbortController = null;
+    // 增量预览：块 id -> 已渲染的 HTML，服务端只返回这里没有的块
+    const previewBlockCache = new Map();
+
+    // 渲染数学公式并应用代码高亮
+    const enhancePreview = (root) => {
+        renderMathInElement(root, katexOptions);
+        root.querySelectorAll('pre code').forEach((block) => {
+            hljs.highlightElement(block);
+        });
+    };
+
+    // 按块更新预览，未变化的块直接复用已有的 DOM 节点
+    const patchPreviewBlocks = (blocks) => {
+        const existing = new Map();
+        previewDiv.querySelectorAll(':scope > .md-block').forEach((el) => {
+            const list = existing.get(el.dataset.blockId) || [];
+            list.push(el);
+            existing.set(el.dataset.blockId, list);
+        });
+
+        blocks.forEach((block) => {
+            if (block.html !== undefined) {
+                previewBlockCache.set(block.id, block.html);
+            }
+        });
+
+        const fragment = document.createDocumentFragment();
+        blocks.forEach((block) => {
+            const reusable = existing.get(block.id);
+            let el = reusable && reusable.length ? reusable.shift() : null;
+            if (!el) {
+                el = document.createElement('div');
+                el.className = 'md-block';
+                el.dataset.blockId = block.id;
+                el.innerHTML = previewBlockCache.get(block.id) || '';
+                enhancePreview(el);
+            }
+            fragment.appendChild(el);
+        });
+        previewDiv.replaceChildren(fragment);
+
+        // 只保留当前文档中仍然存在的块
+        const currentIds = new Set(blocks.map((block) => block.id));
+        Array.from(previewBlockCache.keys()).forEach((id) => {
+            if (!currentIds.has(id)) {
+                previewBlockCache.delete(id);
+            }
+        });
+    };
 
     // 更新预览内容
     const updatePreview = debounce(function(content) {
@@ -420,20 +472,24 @@ document.addEventListener('DOMContentLoaded', (event) => {
             headers: {
                 'Content-Type': 'application/json',
             },
-            body: JSON.stringify({ content: content }),
+            body: JSON.stringify({
+                content: content,
+                mode: 'blocks',
+                known: Array.from(previewBlockCache.keys())
+            }),
             signal: previewAbortController.signal
         })
         .then(response => response.json())
         .then(data => {
-            previewDiv.innerHTML = data.html;
-
-            // 渲染数学公式
-            renderMathInElement(previewDiv, katexOptions);
+            if (data.mode === 'blocks') {
+                patchPreviewBlocks(data.blocks);
+                return;
+            }
 
-            // 应用代码高亮
-            previewDiv.querySelectorAll('pre code').forEach((block) => {
-                hljs.highlightElement(block);
-            });
+            // 文档包含目录、脚注等整篇特性时服务端返回完整 HTML
+            previewBlockCache.clear();
+            previewDiv.innerHTML = data.html;
+            enhancePreview(previewDiv);
         })
         .catch(error => {
             // 忽略 AbortError（请求被取消）
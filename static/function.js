@@ -240,17 +240,82 @@ function downloadNote(password = null) {
     document.body.removeChild(a);
 }
 
+// 自动保存状态：服务端已确认的内容和版本号，用于发送增量补丁和检测冲突
+// 页面加载后的第一次保存总是全量（textarea 会规范化换行符，与服务端文本不一定完全一致）
+let noteVersion = window.noteVersion;
+let savedContent = null;
+let saveInFlight = false;
+let savePending = false;
+let saveConflict = false;
+// 内容较短时直接全量保存
+const PATCH_MIN_LENGTH = 1024;
+
+// 计算从 oldText 到 newText 的替换操作（公共前缀/后缀之外的部分），位置为 UTF-16 码元
+function makePatch(oldText, newText) {
+    let start = 0;
+    const minLength = Math.min(oldText.length, newText.length);
+    while (start < minLength && oldText.charCodeAt(start) === newText.charCodeAt(start)) {
+        start++;
+    }
+    let oldEnd = oldText.length;
+    let newEnd = newText.length;
+    while (oldEnd > start && newEnd > start && oldText.charCodeAt(oldEnd - 1) === newText.charCodeAt(newEnd - 1)) {
+        oldEnd--;
+        newEnd--;
+    }
+    return [{ start: start, end: oldEnd, text: newText.slice(start, newEnd) }];
+}
+
+// 笔记已被其它标签页或设备修改，停止自动保存，避免覆盖对方的内容
+function handleSaveConflict() {
+    saveConflict = true;
+    const conflictIndicator = document.createElement('div');
+    conflictIndicator.className = 'save-indicator error';
+    conflictIndicator.textContent = '笔记已在其他地方修改，自动保存已暂停';
+    document.body.appendChild(conflictIndicator);
+
+    setTimeout(() => {
+        conflictIndicator.remove();
+    }, 4000);
+
+    if (confirm('笔记已在其他窗口或设备上修改，当前修改尚未保存。是否重新加载最新内容？')) {
+        window.location.reload();
+    }
+}
+
 function autoSave() {
+    if (saveConflict) return;
+    // 同一时间只保留一个保存请求，避免基于同一版本的请求互相冲突
+    if (saveInFlight) {
+        savePending = true;
+        return;
+    }
+
     const content = document.getElementById('content').value;
-    
+    if (content === savedContent) return;
+
+    const payload = { base_version: noteVersion };
+    if (savedContent !== null && content.length >= PATCH_MIN_LENGTH) {
+        payload.patch = makePatch(savedContent, content);
+        payload.length = content.length;
+    } else {
+        payload.content = content;
+    }
+
+    saveInFlight = true;
     fetch(`/${window.noteKey}/auto-save`, {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json',
         },
-        body: JSON.stringify({ content }),
+        body: JSON.stringify(payload),
     })
     .then(response => {
+        if (response.status === 409) {
+            const conflict = new Error('版本冲突');
+            conflict.conflict = true;
+            throw conflict;
+        }
         if (!response.ok) {
             throw new Error('保存失败');
         }
@@ -258,21 +323,17 @@ function autoSave() {
     })
     .then(data => {
         console.log('自动保存成功:', data);
+        savedContent = content;
+        noteVersion = data.version;
         // 更新最后保存时间
         lastSaveTime = data.timestamp;
         updateTimeAgo();
-        
-        // 可以添加一个小提示，表示已保存
-        // const saveIndicator = document.createElement('div');
-        // saveIndicator.className = 'save-indicator';
-        // saveIndicator.textContent = '已保存';
-        // document.body.appendChild(saveIndicator);
-        
-        // setTimeout(() => {
-        //     saveIndicator.remove();
-        // }, 2000);
     })
     .catch(error => {
+        if (error.conflict) {
+            handleSaveConflict();
+            return;
+        }
         console.error('自动保存失败:', error);
         const errorIndicator = document.createElement('div');
         errorIndicator.className = 'save-indicator error';
@@ -282,8 +343,103 @@ function autoSave() {
         setTimeout(() => {
             errorIndicator.remove();
         }, 2000);
+    })
+    .finally(() => {
+        saveInFlight = false;
+        // 保存期间收到的变更通知可能就是本次保存，等拿到新版本号后再判断
+        if (remoteEvent) {
+            handleNoteEvent(remoteEvent);
+        }
+        if (savePending) {
+            savePending = false;
+            autoSave();
+        }
     });
 }
+
+// ==================== 变更通知 ====================
+
+// 通过 SSE 接收其它标签页或设备的保存/删除通知，不支持或连接被拒绝时退回长轮询
+let remoteEvent = null;
+let remoteNoticeShown = false;
+
+function showNoteNotice(text) {
+    const indicator = document.createElement('div');
+    indicator.className = 'save-indicator';
+    indicator.textContent = text;
+    document.body.appendChild(indicator);
+    setTimeout(() => {
+        indicator.remove();
+    }, 4000);
+}
+
+function handleNoteEvent(event) {
+    if (saveInFlight) {
+        remoteEvent = event;
+        return;
+    }
+    remoteEvent = null;
+
+    if (event.type === 'deleted') {
+        saveConflict = true;
+        showNoteNotice('笔记已在其他地方删除，自动保存已停止');
+        return;
+    }
+    if (event.version <= noteVersion) return;
+
+    // 其它地方保存了新版本：更新时间显示，下一次自动保存会以冲突提示用户
+    lastSaveTime = event.timestamp;
+    updateTimeAgo();
+    if (!remoteNoticeShown) {
+        remoteNoticeShown = true;
+        showNoteNotice('笔记已在其他地方更新，刷新页面可查看最新内容');
+    }
+}
+
+function longPollNoteEvents(since) {
+    fetch(`/${window.noteKey}/events?poll=1&since=${since}`)
+    .then(response => {
+        if (response.status === 403 || response.status === 404) return null;
+        if (!response.ok) throw new Error('长轮询失败');
+        const retryAfter = parseInt(response.headers.get('Retry-After') || '0', 10);
+        const body = response.status === 200 ? response.json() : null;
+        return Promise.resolve(body).then(event => ({ event, retryAfter }));
+    })
+    .then(result => {
+        if (!result) return;
+        let next = since;
+        if (result.event) {
+            handleNoteEvent(result.event);
+            if (result.event.type === 'deleted') return;
+            next = Math.max(since, result.event.version);
+        }
+        setTimeout(() => longPollNoteEvents(next), result.retryAfter * 1000);
+    })
+    .catch(() => {
+        setTimeout(() => longPollNoteEvents(since), 30000);
+    });
+}
+
+function subscribeNoteEvents() {
+    if (!window.noteKey) return;
+    if (!window.EventSource) {
+        longPollNoteEvents(noteVersion);
+        return;
+    }
+
+    const source = new EventSource(`/${window.noteKey}/events`);
+    source.addEventListener('note', (e) => {
+        const event = JSON.parse(e.data);
+        handleNoteEvent(event);
+        if (event.type === 'deleted') source.close();
+    });
+    source.onerror = () => {
+        // 服务器返回非 200（如超过连接数限制）时浏览器不会自动重连
+        if (source.readyState === EventSource.CLOSED) {
+            longPollNoteEvents(noteVersion);
+        }
+    };
+}
 // ==================== 漂浮目录功能 ====================
 
 function initFloatingTOC() {
@@ -0,0 +1,47 @@
+"""测试公共夹具
+
+应用使用相对路径 data/notes.db，并在第一次借出连接时建立数据库，因此整个测试会话
+切换到带 data/ 子目录的临时目录后再导入应用。不依赖应用的测试使用 database 夹具
+得到独立的临时数据库。
+"""
+
+import os
+
+import pytest
+
+from db import Database
+from migrations import apply_migrations
+
+
+@pytest.fixture(scope="session")
+def app_module(tmp_path_factory):
+    workdir = tmp_path_factory.mktemp("yonote")
+    (workdir / "data").mkdir()
+    previous = os.getcwd()
+    os.chdir(workdir)
+    import app as module
+
+    module.limiter.enabled = False
+    yield module
+    module.db.close_all()
+    os.chdir(previous)
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+@pytest.fixture
+def note_key(client):
+    """新建一条空笔记，返回 key"""
+    response = client.get("/")
+    assert response.status_code == 302
+    return response.headers["Location"].rsplit("/", 1)[-1].split("?", 1)[0]
+
+
+@pytest.fixture
+def database(tmp_path):
+    db = Database(str(tmp_path / "notes.db"), setup=apply_migrations)
+    yield db
+    db.close_all()
@@ -0,0 +1,113 @@
+"""/<key>/auto-save：全量与增量保存、乐观版本控制"""
+
+import sqlite3
+
+import pytest
+
+from notes import load_note_content
+
+
+def stored(app_module, key):
+    with app_module.db.connection() as conn:
+        note = conn.execute("SELECT * FROM notes WHERE key = ?", (key,)).fetchone()
+    return load_note_content(note), note["version"]
+
+
+def save(client, key, **body):
+    return client.post(f"/{key}/auto-save", json=body)
+
+
+@pytest.fixture
+def saved_note(client, note_key):
+    """已有内容 "中文笔记 a😀b" 的笔记，返回 (key, 版本号)"""
+    response = save(client, note_key, content="中文笔记 a😀b", base_version=0)
+    assert response.status_code == 200
+    return note_key, response.get_json()["version"]
+
+
+def test_legacy_full_save_without_version(app_module, client, note_key):
+    for text in ("first", "second"):
+        response = save(client, note_key, content=text)
+        assert response.status_code == 200
+    assert stored(app_module, note_key) == ("second", 2)
+    assert response.get_json()["version"] == 2
+
+
+def test_full_save_with_current_version(app_module, client, saved_note):
+    key, version = saved_note
+    response = save(client, key, content="updated", base_version=version)
+    assert response.status_code == 200
+    assert response.get_json()["version"] == version + 1
+    assert stored(app_module, key) == ("updated", version + 1)
+
+
+def test_stale_base_version_is_a_conflict(app_module, client, saved_note):
+    key, version = saved_note
+    response = save(client, key, content="from another tab", base_version=version - 1)
+    assert response.status_code == 409
+    assert response.get_json()["version"] == version
+    assert stored(app_module, key) == ("中文笔记 a😀b", version)
+
+
+def test_patch_with_cjk_and_surrogate_pairs(app_module, client, saved_note):
+    key, version = saved_note
+    # "中文笔记 a😀b"：笔记=2..4，😀=6..8
+    patch = [{"start": 6, "end": 8, "text": "🎉"}, {"start": 2, "end": 4, "text": "测试"}]
+    response = save(client, key, base_version=version, patch=patch, length=9)
+    assert response.status_code == 200
+    assert stored(app_module, key) == ("中文测试 a🎉b", version + 1)
+
+
+def test_patch_requires_base_version(client, saved_note):
+    key, _ = saved_note
+    response = save(client, key, patch=[{"start": 0, "end": 0, "text": "x"}])
+    assert response.status_code == 400
+
+
+def test_malformed_patch_is_rejected(app_module, client, saved_note):
+    key, version = saved_note
+    response = save(client, key, base_version=version, patch=[{"start": "0", "end": 1}])
+    assert response.status_code == 400
+    assert stored(app_module, key) == ("中文笔记 a😀b", version)
+
+
+@pytest.mark.parametrize(
+    "patch",
+    [
+        [{"start": 0, "end": 99, "text": ""}],
+        # 拆散 😀 的代理对
+        [{"start": 7, "end": 7, "text": "x"}],
+    ],
+)
+def test_patch_not_matching_server_text_is_a_conflict(app_module, client, saved_note, patch):
+    key, version = saved_note
+    response = save(client, key, base_version=version, patch=patch)
+    assert response.status_code == 409
+    assert response.get_json()["version"] == version
+    assert stored(app_module, key) == ("中文笔记 a😀b", version)
+
+
+def test_length_mismatch_is_a_conflict(app_module, client, saved_note):
+    key, version = saved_note
+    response = save(client, key, base_version=version, patch=[{"start": 0, "end": 0, "text": "x"}], length=3)
+    assert response.status_code == 409
+    assert stored(app_module, key) == ("中文笔记 a😀b", version)
+
+
+def test_conditional_update_losing_a_race(app_module, client, saved_note, monkeypatch):
+    key, version = saved_note
+    encrypt = app_module.encrypt_content
+
+    def encrypt_after_concurrent_write(content):
+        # 在读取版本之后、条件 UPDATE 之前，另一个连接抢先保存
+        other = sqlite3.connect("data/notes.db")
+        other.execute("UPDATE notes SET content = ?, version = version + 1 WHERE key = ?", (encrypt("winner"), key))
+        other.commit()
+        other.close()
+        return encrypt(content)
+
+    monkeypatch.setattr(app_module, "encrypt_content", encrypt_after_concurrent_write)
+    response = save(client, key, content="loser", base_version=version)
+    assert response.status_code == 409
+    assert response.get_json()["version"] == version + 1
+    assert stored(app_module, key) == ("winner", version + 1)
@@ -0,0 +1,82 @@
+"""delta.py：UTF-16 位置的增量补丁"""
+
+import pytest
+
+from delta import MAX_PATCH_OPS, PatchError, PatchMismatch, apply_patch, make_patch, utf16_length
+
+
+def test_utf16_length_counts_surrogate_pairs():
+    assert utf16_length("abc") == 3
+    assert utf16_length("中文") == 2
+    assert utf16_length("a😀b") == 4
+
+
+def test_apply_replaces_in_order():
+    # 第二个操作作用于第一个操作的结果
+    ops = [{"start": 0, "end": 5, "text": "Hi"}, {"start": 2, "end": 2, "text": "!"}]
+    assert apply_patch("hello world", ops) == "Hi! world"
+
+
+def test_apply_with_surrogate_pairs():
+    # "a😀b" 中 emoji 占两个码元：a=0, 😀=1..3, b=3
+    assert apply_patch("a😀b", [{"start": 1, "end": 3, "text": "x"}]) == "axb"
+    assert apply_patch("a😀b", [{"start": 3, "end": 3, "text": "🎉"}]) == "a😀🎉b"
+    assert apply_patch("😀😀", [{"start": 2, "end": 4, "text": ""}]) == "😀"
+
+
+def test_apply_with_cjk():
+    assert apply_patch("中文笔记", [{"start": 2, "end": 4, "text": "测试"}]) == "中文测试"
+    assert apply_patch("中文", [{"start": 2, "end": 2, "text": "😀内容"}]) == "中文😀内容"
+
+
+def test_splitting_a_surrogate_pair_is_a_mismatch():
+    with pytest.raises(PatchMismatch):
+        apply_patch("a😀b", [{"start": 2, "end": 2, "text": "x"}])
+
+
+@pytest.mark.parametrize(
+    "op",
+    [
+        {"start": 0, "end": 5, "text": ""},
+        {"start": 4, "end": 4, "text": "x"},
+        {"start": -1, "end": 0, "text": ""},
+        {"start": 2, "end": 1, "text": ""},
+    ],
+)
+def test_out_of_range_ops_are_a_mismatch(op):
+    with pytest.raises(PatchMismatch):
+        apply_patch("abc", [op])
+
+
+@pytest.mark.parametrize(
+    "ops",
+    [
+        {"start": 0, "end": 0, "text": ""},
+        ["not an op"],
+        [{"start": "0", "end": 1, "text": ""}],
+        [{"start": True, "end": 1, "text": ""}],
+        [{"start": 0, "end": 1, "text": 5}],
+        [{"end": 1, "text": ""}],
+        [{"start": 0, "end": 0, "text": ""}] * (MAX_PATCH_OPS + 1),
+    ],
+)
+def test_malformed_patches(ops):
+    with pytest.raises(PatchError) as excinfo:
+        apply_patch("abc", ops)
+    assert not isinstance(excinfo.value, PatchMismatch)
+
+
+@pytest.mark.parametrize(
+    ("old", "new"),
+    [
+        ("", "新内容"),
+        ("same", "same"),
+        ("hello world", "hello brave world"),
+        ("中文笔记内容", "中文内容"),
+        ("😀 a 😀", "😀 b 😀"),
+        ("aaaa", "aaaaaa"),
+        ("前缀😀后缀", "前缀🎉😀后缀"),
+    ],
+)
+def test_make_patch_round_trip(old, new):
+    assert apply_patch(old, make_patch(old, new)) == new
@@ -0,0 +1,42 @@
+"""没有 fcntl 的平台（Windows）上也能导入指标与备份模块"""
+
+import importlib.util
+import sys
+from pathlib import Path
+
+import pytest
+
+from config import Config
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def load_without_fcntl(monkeypatch, name):
+    # sys.modules 中为 None 的模块导入时抛出 ImportError；以新名字加载，不影响已导入的模块
+    monkeypatch.setitem(sys.modules, "fcntl", None)
+    spec = importlib.util.spec_from_file_location(f"{name}_without_fcntl", ROOT / f"{name}.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def metrics(monkeypatch):
+    return load_without_fcntl(monkeypatch, "metrics")
+
+
+@pytest.fixture
+def backup(monkeypatch):
+    return load_without_fcntl(monkeypatch, "backup")
+
+
+def test_metrics_falls_back_to_process_store(metrics, tmp_path):
+    assert metrics.fcntl is None
+    config = type("MetricsConfig", (Config,), {"METRICS_ENABLED": True, "METRICS_DIR": str(tmp_path)})
+    assert metrics.create_store(config) is None
+
+
+def test_backup_directory_lock_without_fcntl(backup, tmp_path):
+    assert backup.fcntl is None
+    with backup._directory_lock(str(tmp_path), blocking=False) as acquired:
+        assert acquired
@@ -0,0 +1,57 @@
+"""rendering.py：渲染缓存与分块预览"""
+
+import re
+
+import pytest
+
+from rendering import RenderCache, render_markdown_safe, split_blocks
+
+
+def test_cache_counts_utf8_bytes():
+    cache = RenderCache(max_bytes=30)
+    html = "<p>中文内容</p>"  # 11 个字符，19 字节
+    cache.put(b"a", html)
+    assert cache.stats()["bytes"] == 19
+    # 两条合计 38 字节超过容量，先放入的被淘汰
+    cache.put(b"b", html)
+    assert cache.get(b"a") is None
+    assert cache.get(b"b") == html
+
+
+def test_cache_skips_oversized_html():
+    cache = RenderCache(max_bytes=30)
+    cache.put(b"a", "<p>x</p>")
+    cache.put(b"b", "<p>" + "字" * 10 + "</p>")  # 17 个字符，37 字节
+    assert cache.get(b"b") is None
+    assert cache.get(b"a") == "<p>x</p>"
+
+
+def normalize(html):
+    # 块之间的空行数不影响显示
+    return re.sub(r"\n+", "\n", html).strip()
+
+
+@pytest.mark.parametrize(
+    ("content", "count"),
+    [
+        ("# 标题\n\n段落\n\n- a\n- b", 3),
+        ("- a\n\n- b\n\n    续行\n\n段落", 2),
+        ("```\ncode\n\nmore\n```\n\n段落", 2),
+        ("> a\n\n> b", 1),
+        ("> a\n>\n> b\n\n> c\n\n段落", 2),
+        ("段落\n> a\n\n> b", 1),
+        ("> a\n\nb", 2),
+        ("<div>\na\n\nb\n</div>\n\nc", 2),
+        ("<div>\n<div>\na\n\n</div>\nb\n\n</div>\n\nc", 2),
+        ('<div markdown="1">\n*a*\n\nb\n</div>', 1),
+        ("<table>\n<tr><td>a</td></tr>\n\n</table>\n\n# h", 2),
+        ("<div>\n\n```\nx\n\n```\n\n</div>\n\ne", 2),
+        ("<!-- a\n\nb -->\n\nc", 2),
+        ("<span>a</span>\n\nb", 2),
+    ],
+)
+def test_blocks_render_like_whole_document(content, count):
+    blocks = split_blocks(content)
+    assert len(blocks) == count
+    rendered = "\n".join(render_markdown_safe(block) for block in blocks)
+    assert normalize(rendered) == normalize(render_markdown_safe(content))
@@ -0,0 +1,176 @@
+"""revisions.py：补丁链、合并、快照与保留策略"""
+
+import types
+
+import pytest
+
+import revisions
+from config import Config
+from encryption import encrypt_content
+from revisions import DELTA, SNAPSHOT, RevisionStore
+
+KEY = "note"
+# 较长的公共正文，使补丁明显小于全文
+BODY = "".join(f"第 {i} 行：修订历史测试内容 line {i}\n" for i in range(40))
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_700_000_000
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(revisions, "time", types.SimpleNamespace(time=clock.time))
+    return clock
+
+
+def make_store(**overrides):
+    config = type("RevisionConfig", (Config,), overrides)
+    return RevisionStore(config)
+
+
+@pytest.fixture
+def note(database):
+    with database.connection() as conn:
+        database.execute_write(
+            conn,
+            "INSERT INTO notes (key, content, public, created_at, updated_at, encrypted) VALUES (?, ?, 0, 0, 0, 1)",
+            (KEY, encrypt_content("")),
+        )
+    return KEY
+
+
+def save(database, store, content, coalesce=True):
+    """与 app.write_note_content 相同：写事务外准备修订，在更新笔记的事务中记录，返回新版本号"""
+    with database.connection() as conn:
+        note = conn.execute("SELECT * FROM notes WHERE key = ?", (KEY,)).fetchone()
+        pending = store.prepare(note, content)
+
+        def write(c):
+            c.execute(
+                "UPDATE notes SET content = ?, version = version + 1 WHERE key = ?", (encrypt_content(content), KEY)
+            )
+            store.record(c, pending, coalesce)
+
+        database.run_write(conn, write)
+        return conn.execute("SELECT version FROM notes WHERE key = ?", (KEY,)).fetchone()["version"]
+
+
+def history(database, store):
+    """从旧到新的修订行"""
+    with database.connection() as conn:
+        rows = conn.execute(
+            "SELECT id, version, kind, chain_length FROM revisions WHERE key = ? ORDER BY id", (KEY,)
+        ).fetchall()
+    return [dict(row) for row in rows]
+
+
+def load(database, store, revision_id):
+    with database.connection() as conn:
+        return store.load(conn, KEY, revision_id)
+
+
+def assert_all_load(database, store, expected):
+    """每条修订都能还原为该版本保存的正文"""
+    for row in history(database, store):
+        assert load(database, store, row["id"]) == expected[row["version"]]
+
+
+def test_reconstruction_across_snapshot_boundaries(database, note, clock):
+    store = make_store(REVISION_COALESCE_WINDOW=0, REVISION_SNAPSHOT_EVERY=3)
+    expected = {}
+    for i in range(10):
+        clock.now += 60
+        content = BODY + f"第 {i} 次修改 😀\n"
+        expected[save(database, store, content)] = content
+
+    rows = history(database, store)
+    assert [row["kind"] for row in rows] == [SNAPSHOT, DELTA, DELTA] * 3 + [SNAPSHOT]
+    assert [row["chain_length"] for row in rows] == [0, 1, 2] * 3 + [0]
+    assert_all_load(database, store, expected)
+
+
+def test_saves_within_window_are_coalesced(database, note, clock):
+    store = make_store(REVISION_COALESCE_WINDOW=300)
+    expected = {}
+    for i in range(3):
+        clock.now += 10
+        content = BODY + f"草稿 {i}\n"
+        expected[save(database, store, content)] = content
+    # 第一次保存建立快照，窗口内的后续保存合并进去
+    rows = history(database, store)
+    assert len(rows) == 1
+    assert rows[0]["version"] == 3
+    assert load(database, store, rows[0]["id"]) == expected[3]
+
+    clock.now += 600
+    for i in range(3):
+        clock.now += 10
+        content = BODY + f"第二轮 {i}\n"
+        expected[save(database, store, content)] = content
+    rows = history(database, store)
+    assert [row["kind"] for row in rows] == [SNAPSHOT, DELTA]
+    assert rows[-1]["version"] == 6
+    assert_all_load(database, store, expected)
+
+
+def test_large_deletion_is_not_coalesced(database, note, clock):
+    store = make_store(REVISION_COALESCE_WINDOW=300)
+    save(database, store, BODY)
+    clock.now += 10
+    save(database, store, BODY[:100])
+    rows = history(database, store)
+    # 删掉一半以上的内容单独成为一条修订，误删前的正文仍可还原
+    assert len(rows) == 2
+    assert load(database, store, rows[0]["id"]) == BODY
+    assert load(database, store, rows[1]["id"]) == BODY[:100]
+
+
+def test_coalesced_delta_becomes_snapshot_when_patch_outgrows_content(database, note, clock):
+    store = make_store(REVISION_COALESCE_WINDOW=300)
+    original = "a" * 1000
+    save(database, store, original)
+    clock.now += 600
+    save(database, store, original + "x")
+    assert [row["kind"] for row in history(database, store)] == [SNAPSHOT, DELTA]
+
+    # 窗口内整体替换：合并后的补丁比正文还大，改存快照
+    clock.now += 10
+    replaced = "b" * 600
+    save(database, store, replaced)
+    rows = history(database, store)
+    assert [row["kind"] for row in rows] == [SNAPSHOT, SNAPSHOT]
+    assert rows[-1]["chain_length"] == 0
+    assert load(database, store, rows[0]["id"]) == original
+    assert load(database, store, rows[1]["id"]) == replaced
+
+
+def test_prune_keeps_base_snapshot_of_every_chain(database, note, clock):
+    store = make_store(REVISION_COALESCE_WINDOW=0, REVISION_SNAPSHOT_EVERY=3, REVISION_MAX_PER_NOTE=4)
+    expected = {}
+    for i in range(15):
+        clock.now += 60
+        content = BODY + f"版本 {i}\n"
+        expected[save(database, store, content)] = content
+        rows = history(database, store)
+        assert rows[0]["kind"] == SNAPSHOT
+        # 截断只发生在快照处，保留的修订数不超过上限加一条链的长度
+        assert len(rows) < 4 + 3
+        assert_all_load(database, store, expected)
+    assert history(database, store)[-1]["version"] == 15
+
+
+def test_prune_by_age_removes_whole_history(database, note, clock):
+    store = make_store(REVISION_COALESCE_WINDOW=0, REVISION_RETENTION_DAYS=1)
+    for i in range(3):
+        clock.now += 60
+        save(database, store, BODY + str(i))
+    with database.connection() as conn:
+        deleted = store.prune_expired(database, conn, now=clock.now + 2 * 86400)
+    assert deleted == 3
+    assert history(database, store) == []
@@ -0,0 +1,182 @@
+"""shared_state.py：速率限制计数、密码错误计数与锁定、过期状态清理"""
+
+import types
+
+import pytest
+
+import shared_state
+from config import Config
+from shared_state import EXPIRING_TABLES, LoginAttempts, SQLiteStorage, Sweeper
+
+KEY = "note"
+IP = "203.0.113.1"
+MAX_ATTEMPTS = 3
+LOCKOUT = 600
+WINDOW = 300
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_700_000_000
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(shared_state, "time", types.SimpleNamespace(time=clock.time))
+    return clock
+
+
+@pytest.fixture
+def conn(database):
+    with database.connection() as conn:
+        database.execute_write(
+            conn,
+            "INSERT INTO notes (key, content, public, created_at, updated_at, encrypted) VALUES (?, '', 0, 0, 0, 1)",
+            (KEY,),
+        )
+        yield conn
+
+
+@pytest.fixture
+def attempts(database):
+    return LoginAttempts(database, MAX_ATTEMPTS, LOCKOUT, WINDOW)
+
+
+def stored(database, key):
+    with database.connection() as conn:
+        row = conn.execute("SELECT value FROM counters WHERE name = ?", (SQLiteStorage.PREFIX + key,)).fetchone()
+    return row["value"] if row else None
+
+
+def test_storage_writes_through_without_interval(database, clock):
+    storage = SQLiteStorage(database=database, flush_interval=0)
+    assert storage.incr("a", 60) == 1
+    assert storage.incr("a", 60) == 2
+    assert stored(database, "a") == 2
+
+
+def test_storage_batches_increments(database, clock):
+    storage = SQLiteStorage(database=database, flush_interval=1)
+    # 新 key 立即写入，之后在间隔内只在本进程累积
+    assert storage.incr("a", 60) == 1
+    assert storage.incr("a", 60) == 2
+    assert storage.get("a") == 2
+    assert stored(database, "a") == 1
+    # 新 key 的写入在同一个事务中带上其他 key 累积的增量
+    assert storage.incr("b", 60) == 1
+    assert stored(database, "a") == 2
+    # 其他进程的计数在下次写入时合并
+    SQLiteStorage(database=database, flush_interval=0).incr("a", 60, amount=10)
+    clock.now += 1
+    assert storage.incr("a", 60) == 13
+    assert stored(database, "a") == 13
+    assert storage.get_expiry("a") == clock.now - 1 + 60
+
+
+def test_storage_window_expires(database, clock):
+    storage = SQLiteStorage(database=database, flush_interval=1)
+    storage.incr("a", 60)
+    storage.incr("a", 60)
+    clock.now += 60
+    assert storage.get("a") == 0
+    assert storage.incr("a", 60) == 1
+    assert stored(database, "a") == 1
+
+
+def test_storage_clear(database, clock):
+    storage = SQLiteStorage(database=database, flush_interval=1)
+    storage.incr("a", 60)
+    storage.incr("a", 60)
+    storage.clear("a")
+    assert storage.get("a") == 0
+    assert stored(database, "a") is None
+
+
+def note_row(conn, ip=IP):
+    return conn.execute(LoginAttempts.NOTE_QUERY, (ip, KEY)).fetchone()
+
+
+def test_failures_are_counted_within_window(conn, attempts, clock):
+    assert attempts.record_failure(conn, KEY, IP) == (1, 0)
+    clock.now += 10
+    assert attempts.record_failure(conn, KEY, IP) == (2, 0)
+    row = note_row(conn)
+    assert attempts.has_record(row)
+    assert attempts.remaining(row) == 0
+    # 未锁定时行的过期时间为最后一次错误后 window 秒
+    assert row["lockout_until"] == clock.now + WINDOW
+
+
+def test_counts_are_per_ip(conn, attempts, clock):
+    attempts.record_failure(conn, KEY, IP)
+    attempts.record_failure(conn, KEY, IP)
+    assert attempts.record_failure(conn, KEY, "198.51.100.7") == (1, 0)
+    assert not attempts.has_record(note_row(conn, "192.0.2.9"))
+
+
+def test_locks_at_max_attempts(conn, attempts, clock):
+    for _ in range(MAX_ATTEMPTS - 1):
+        attempts.record_failure(conn, KEY, IP)
+    assert attempts.record_failure(conn, KEY, IP) == (MAX_ATTEMPTS, clock.now + LOCKOUT)
+    assert attempts.remaining(note_row(conn)) == LOCKOUT
+    clock.now += 100
+    assert attempts.remaining(note_row(conn)) == LOCKOUT - 100
+
+
+def test_single_attempt_limit_locks_immediately(database, conn, clock):
+    strict = LoginAttempts(database, 1, LOCKOUT, WINDOW)
+    assert strict.record_failure(conn, KEY, IP) == (1, clock.now + LOCKOUT)
+
+
+def test_count_resets_after_window(conn, attempts, clock):
+    attempts.record_failure(conn, KEY, IP)
+    attempts.record_failure(conn, KEY, IP)
+    clock.now += WINDOW
+    assert attempts.record_failure(conn, KEY, IP) == (1, 0)
+
+
+def test_lock_expires(conn, attempts, clock):
+    for _ in range(MAX_ATTEMPTS):
+        attempts.record_failure(conn, KEY, IP)
+    clock.now += LOCKOUT
+    assert attempts.remaining(note_row(conn)) == 0
+    # 锁定过期后重新从 1 开始计数
+    assert attempts.record_failure(conn, KEY, IP) == (1, 0)
+
+
+def test_clear(conn, attempts, clock):
+    for _ in range(MAX_ATTEMPTS):
+        attempts.record_failure(conn, KEY, IP)
+    attempts.clear(conn, KEY, IP)
+    row = note_row(conn)
+    assert not attempts.has_record(row)
+    assert attempts.remaining(row) == 0
+    assert attempts.record_failure(conn, KEY, IP) == (1, 0)
+
+
+# 每个需要清理的表：插入一行的语句，参数为 (编号, 过期时间)
+EXPIRING_ROWS = {
+    "counters": "INSERT INTO counters (name, value, expires_at) VALUES ('c' || ?, 1, ?)",
+    "lockouts": "INSERT INTO lockouts (key, ip_address, failures, locked_until) VALUES ('k' || ?, 'ip', 1, ?)",
+    "sessions": "INSERT INTO sessions (id, data, expires_at) VALUES ('s' || ?, '{}', ?)",
+}
+
+
+def test_sweeper_removes_expired_rows_from_every_table(database, clock):
+    assert set(EXPIRING_ROWS) == set(EXPIRING_TABLES)
+    config = type("SweepConfig", (Config,), {"STATE_SWEEP_BATCH_SIZE": 2})
+    now = clock.now
+    with database.connection() as conn:
+        for sql in EXPIRING_ROWS.values():
+            conn.executemany(sql, [(i, now - 1 - i) for i in range(5)])
+            conn.execute(sql, ("live", now + 60))
+        conn.commit()
+
+        # 每批 2 行，需要多批才能删完
+        assert Sweeper(database, config=config).sweep() == dict.fromkeys(EXPIRING_TABLES, 5)
+        for table in EXPIRING_TABLES:
+            assert conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] == 1  # noqa: S608
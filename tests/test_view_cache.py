@@ -0,0 +1,20 @@
+"""查看页的 ETag 与 304"""
+
+import time
+
+
+def test_unchanged_note_returns_304(client, note_key):
+    etag = client.get(f"/{note_key}").headers["ETag"]
+    response = client.get(f"/{note_key}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+
+def test_etag_changes_with_relative_time(client, note_key, monkeypatch):
+    etag = client.get(f"/{note_key}").headers["ETag"]
+    now = time.time()
+    # 两分钟后页面上的“最后更新”从秒变为分钟，缓存的页面不能再使用
+    monkeypatch.setattr(time, "time", lambda: now + 120)
+    response = client.get(f"/{note_key}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert "2分钟前" in response.get_data(as_text=True)
+    assert response.headers["ETag"] != etag